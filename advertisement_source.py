@@ -0,0 +1,642 @@
+"""
+广播数据源模块
+统一蓝牙扫描、抓包回放和合成数据三种广播来源，便于在没有蓝牙适配器的环境中
+测试、压测和离线重放整个定位流程
+"""
+import asyncio
+import json
+import math
+import random
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from ibeacon_parser import IBeaconParser
+
+
+# 检测回调 callback(device, advertisement_data)，与 BleakScanner 一致
+DetectionCallback = Callable[[object, object], None]
+
+SOURCE_TYPES = ('bleak', 'replay', 'synthetic')
+
+
+@dataclass
+class SourceDevice:
+    """广播设备信息（与 bleak BLEDevice 的常用属性一致）"""
+    address: str
+    name: Optional[str] = None
+
+
+@dataclass
+class Advertisement:
+    """广播数据（与 bleak AdvertisementData 的常用属性一致）"""
+    rssi: int
+    manufacturer_data: Dict[int, bytes] = field(default_factory=dict)
+    service_data: Dict[str, bytes] = field(default_factory=dict)
+    local_name: Optional[str] = None
+
+
+class AdvertisementSource:
+    """
+    广播数据源基类
+
+    接口与 BleakScanner 保持一致：构造时传入 detection_callback，
+    通过 start() / stop() 控制数据流。time() 返回数据源的时钟，
+    回放和合成数据源在加速模式下使用虚拟时间；消费者用 sleep() 按数据源时钟等待。
+    有限的数据源全部产生完毕后 finished 为 True，并调用 set_finished_callback() 设置的回调。
+    """
+
+    def __init__(self, detection_callback: DetectionCallback):
+        """
+        初始化数据源
+
+        Args:
+            detection_callback: 检测回调 callback(device, advertisement_data)
+        """
+        self.detection_callback = detection_callback
+        self._finished = False
+        self._finished_callback: Optional[Callable[[], None]] = None
+
+    async def start(self):
+        """开始产生广播数据"""
+        raise NotImplementedError
+
+    async def stop(self):
+        """停止产生广播数据"""
+        raise NotImplementedError
+
+    async def close(self):
+        """停止并释放数据源（例如关闭抓包文件），之后不能再次启动"""
+        await self.stop()
+
+    def time(self) -> float:
+        """数据源时钟（秒）"""
+        return time.monotonic()
+
+    def sleep(self, duration: float) -> Awaitable[None]:
+        """按数据源时钟等待 duration 秒（返回可等待对象）"""
+        return asyncio.sleep(duration)
+
+    def set_lockstep(self, enabled: bool):
+        """逐包消费者（事件流）存在时为 True：尽可能快的数据源每送达一条数据就让出事件循环"""
+
+    def hold(self):
+        """让数据源时钟停在当前数据（消费者提前结束等待时调用，只影响跟随消费者推进的数据源）"""
+
+    @property
+    def finished(self) -> bool:
+        """数据是否已全部产生（蓝牙适配器等无限数据源始终为 False）"""
+        return self._finished
+
+    def set_finished_callback(self, callback: Optional[Callable[[], None]]):
+        """设置数据全部产生后调用的回调 callback()"""
+        self._finished_callback = callback
+
+    def _finish(self):
+        """标记数据已全部产生并调用回调"""
+        self._finished = True
+        if self._finished_callback is not None:
+            self._finished_callback()
+
+
+class BleakSource(AdvertisementSource):
+    """真实蓝牙适配器数据源（BleakScanner）"""
+
+    def __init__(self, detection_callback: DetectionCallback):
+        super().__init__(detection_callback)
+        self._scanner = None
+
+    async def start(self):
+        # 延迟导入，回放和合成模式下不依赖蓝牙栈
+        from bleak import BleakScanner
+
+        self._scanner = BleakScanner(detection_callback=self.detection_callback)
+        await self._scanner.start()
+
+    async def stop(self):
+        if self._scanner is not None:
+            await self._scanner.stop()
+            self._scanner = None
+
+
+class _TaskSource(AdvertisementSource):
+    """
+    在后台任务中产生数据的数据源基类，支持实时和加速两种节奏
+
+    speed 为 0 时，消费者第一次调用 sleep() 后数据源改为跟随消费者的虚拟时间：
+    每次 sleep(duration) 把允许产生的时间推进 duration 秒，并等待这段时间内的数据全部送达，
+    扫描窗口因此与实时回放时一样覆盖各自的时间段，而不是在第一个窗口内送达全部数据。
+    从未调用 sleep() 时（例如只通过事件流逐包读取）尽可能快地产生数据。
+    """
+
+    # 加速模式下每产生多少条数据让出一次事件循环（有逐包消费者时每条都让出，消费者才不会只看到最后几条）
+    YIELD_EVERY = 256
+
+    def __init__(self, detection_callback: DetectionCallback, speed: float = 1.0):
+        """
+        Args:
+            detection_callback: 检测回调
+            speed: 回放速度倍数，1.0 为实时，0 表示尽可能快
+        """
+        super().__init__(detection_callback)
+        if speed < 0:
+            raise ValueError("speed 不能为负数")
+        self.speed = speed
+        self._task: Optional[asyncio.Task] = None
+        self._wall_start = 0.0
+        self._virtual_start = 0.0
+        self._virtual_now = 0.0
+        self._delivering = False
+        self._horizon: Optional[float] = None  # speed 为 0 时允许产生到的虚拟时间，None 表示不限
+        self._yield_every = self.YIELD_EVERY
+        self._advanced = asyncio.Event()  # 消费者推进了 _horizon
+        self._reached = asyncio.Event()  # 数据源已送达 _horizon 之前的全部数据
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._wall_start = time.monotonic()
+        self._virtual_start = self._virtual_now
+        self._task = asyncio.ensure_future(self._run())
+        self._task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        # stop() 取消的任务不算结束，再次 start() 后会继续产生数据
+        if not task.cancelled():
+            self._finish()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def time(self) -> float:
+        # 回调期间返回该条数据的虚拟时间：事件循环繁忙时积压的数据会集中送达，
+        # 按送达时刻计时会把它们的时间戳挤在一起
+        if self.speed == 0 or self._delivering:
+            return self._virtual_now
+        return self._virtual_start + (time.monotonic() - self._wall_start) * self.speed
+
+    def sleep(self, duration: float) -> Awaitable[None]:
+        # speed 为 0 时在调用时（而不是首次 await 时）就推进允许产生的时间，
+        # 与 ensure_future 一起使用时数据源不会抢先越过窗口
+        if self.speed != 0:
+            return asyncio.sleep(duration / self.speed)
+
+        task = self._task
+        if task is None or task.done():
+            return asyncio.sleep(0)
+
+        horizon = self._virtual_now + duration
+        self._horizon = horizon
+        self._reached.clear()
+        self._advanced.set()
+        return self._wait_reached(task, horizon)
+
+    def set_lockstep(self, enabled: bool):
+        self._yield_every = 1 if enabled else self.YIELD_EVERY
+
+    def hold(self):
+        if self._horizon is not None:
+            self._horizon = self._virtual_now
+
+    async def _wait_reached(self, task: asyncio.Task, horizon: float):
+        """等待数据源送达 horizon 之前的全部数据（或数据源结束）"""
+        reached = asyncio.ensure_future(self._reached.wait())
+        try:
+            await asyncio.wait({reached, task}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            # 提前结束的窗口（例如自适应扫描已达到目标）：数据源停在当前时间，
+            # 除非其他等待者已经重新推进了时间
+            if self._horizon == horizon:
+                self._horizon = self._virtual_now
+            raise
+        finally:
+            reached.cancel()
+        self._virtual_now = max(self._virtual_now, horizon)
+
+    async def _wait_until(self, virtual_time: float, count: int):
+        """按数据源节奏等待到指定虚拟时间"""
+        if self.speed == 0:
+            # 跟随消费者的虚拟时间：超出允许时间的数据等消费者推进后再送达
+            while self._horizon is not None and virtual_time > self._horizon:
+                self._advanced.clear()
+                self._reached.set()
+                await self._advanced.wait()
+            self._virtual_now = virtual_time
+            if count % self._yield_every == 0:
+                await asyncio.sleep(0)
+            return
+
+        self._virtual_now = virtual_time
+
+        delay = (virtual_time - self._virtual_start) / self.speed - (time.monotonic() - self._wall_start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _deliver(self, device, advertisement):
+        """以当前虚拟时间调用检测回调"""
+        self._delivering = True
+        try:
+            self.detection_callback(device, advertisement)
+        finally:
+            self._delivering = False
+
+    async def _run(self):
+        raise NotImplementedError
+
+
+class ReplaySource(_TaskSource):
+    """
+    抓包文件回放数据源
+
+    文件为 JSON Lines，每行一条广播（CaptureRecorder 生成的格式）:
+    {"t": 相对时间(秒), "address": ..., "name": ..., "rssi": ...,
+     "manufacturer_data": {"76": "0215..."}, "service_data": {"0000feaa-...": "00..."}}
+
+    stop() 后再次 start() 会从上次停止的位置继续回放。
+    """
+
+    def __init__(self, detection_callback: DetectionCallback, path: str,
+                 speed: float = 1.0, loop: bool = False):
+        """
+        Args:
+            detection_callback: 检测回调
+            path: 抓包文件路径
+            speed: 回放速度倍数，1.0 为实时，0 表示尽可能快
+            loop: 是否循环回放
+        """
+        super().__init__(detection_callback, speed)
+        self.path = path
+        self.loop = loop
+        self.records = self._load(path)
+        self._index = 0
+        self._offset = 0.0
+
+    @staticmethod
+    def _load(path: str) -> List[tuple]:
+        """读取抓包文件并预先解码为 (t, device, advertisement)"""
+        records = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                device = SourceDevice(address=item.get('address', ''), name=item.get('name'))
+                advertisement = Advertisement(
+                    rssi=item['rssi'],
+                    manufacturer_data={int(k): bytes.fromhex(v)
+                                       for k, v in item.get('manufacturer_data', {}).items()},
+                    service_data={k: bytes.fromhex(v)
+                                  for k, v in item.get('service_data', {}).items()},
+                    local_name=item.get('name')
+                )
+                records.append((float(item['t']), device, advertisement))
+        records.sort(key=lambda r: r[0])
+
+        # 时间归一化为从 0 开始
+        if records:
+            t0 = records[0][0]
+            records = [(t - t0, device, advertisement) for t, device, advertisement in records]
+        return records
+
+    async def _run(self):
+        if not self.records:
+            return
+
+        count = 0
+        while True:
+            while self._index < len(self.records):
+                t, device, advertisement = self.records[self._index]
+                count += 1
+                await self._wait_until(self._offset + t, count)
+                self._deliver(device, advertisement)
+                # 送达后才前进：在等待期间被 stop() 取消的这条数据，再次 start() 时仍会送达
+                self._index += 1
+
+            if not self.loop:
+                return
+            # 下一轮紧接上一轮的最后一条数据
+            self._index = 0
+            self._offset = self._virtual_now
+
+
+class SyntheticSource(_TaskSource):
+    """
+    合成广播数据源
+
+    根据配置的 beacon 位置和模拟标签位置，用路径损耗模型生成带高斯噪声的 iBeacon 广播，
+    可选混入非 iBeacon 噪声帧用于压测。
+    """
+
+    def __init__(self, detection_callback: DetectionCallback, beacons: List[dict],
+                 position: Optional[List[float]] = None,
+                 motion: str = 'static', radius: float = 2.0, period: float = 20.0,
+                 environment_factor: float = 2.5, tx_power: int = -59,
+                 rssi_noise: float = 2.0, advertising_rate: float = 10.0,
+                 noise_rate: float = 0.0, speed: float = 1.0,
+                 duration: Optional[float] = None, seed: Optional[int] = None):
+        """
+        Args:
+            detection_callback: 检测回调
+            beacons: beacon 配置列表（beacon_config.json 中的 beacons）
+            position: 模拟标签位置 [x, y, z]，默认为所有 beacon 的中心
+            motion: 'static' 静止，'circle' 在水平面内绕 position 做圆周运动
+            radius: 圆周运动半径（米）
+            period: 圆周运动周期（秒）
+            environment_factor: 路径损耗模型的环境衰减因子
+            tx_power: 1 米处信号强度（dBm）
+            rssi_noise: RSSI 高斯噪声标准差（dB）
+            advertising_rate: 每个 beacon 每秒广播次数
+            noise_rate: 每秒非 iBeacon 噪声帧数
+            speed: 速度倍数，1.0 为实时，0 表示尽可能快
+            duration: 产生数据的总时长（虚拟时间，从 0 开始计，秒），None 表示不限
+            seed: 随机种子
+        """
+        super().__init__(detection_callback, speed)
+        if not beacons:
+            raise ValueError("合成数据源至少需要一个 beacon")
+
+        self.beacons = beacons
+        positions = [b['position'] for b in beacons]
+        self.position = list(position) if position is not None else [
+            sum(p[i] for p in positions) / len(positions) for i in range(3)
+        ]
+        self.motion = motion
+        self.radius = radius
+        self.period = period
+        self.environment_factor = environment_factor
+        self.tx_power = tx_power
+        self.rssi_noise = rssi_noise
+        self.advertising_rate = advertising_rate
+        self.noise_rate = noise_rate
+        self.duration = duration
+        self.random = random.Random(seed)
+
+        # 预先构造每个 beacon 的设备信息和负载
+        self._templates = []
+        for i, beacon in enumerate(beacons):
+            payload = (IBeaconParser.PREFIX
+                       + bytes.fromhex(beacon['uuid'].replace('-', ''))
+                       + struct.pack('>HHb', beacon['major'], beacon['minor'], tx_power))
+            device = SourceDevice(address=f"SY:NT:00:00:{i // 256:02X}:{i % 256:02X}",
+                                  name=beacon.get('name'))
+            self._templates.append((beacon['position'], device,
+                                    {IBeaconParser.APPLE_COMPANY_ID: payload}))
+        self._noise_device = SourceDevice(address="SY:NT:FF:FF:FF:FF")
+        self._noise_data = {0x0006: bytes(range(1, 28))}
+
+    def tag_position(self, t: float) -> List[float]:
+        """返回虚拟时间 t 时模拟标签的位置"""
+        if self.motion == 'circle':
+            angle = 2 * math.pi * t / self.period
+            return [self.position[0] + self.radius * math.cos(angle),
+                    self.position[1] + self.radius * math.sin(angle),
+                    self.position[2]]
+        return self.position
+
+    def _rssi(self, beacon_position: List[float], tag: List[float]) -> int:
+        distance = max(math.dist(beacon_position, tag), 0.1)
+        rssi = self.tx_power - 10.0 * self.environment_factor * math.log10(distance)
+        return int(round(rssi + self.random.gauss(0.0, self.rssi_noise)))
+
+    async def _run(self):
+        # 每个 beacon 以随机相位广播，噪声帧作为额外的一路
+        interval = 1.0 / self.advertising_rate
+        start = self._virtual_now
+        schedule = [start + self.random.uniform(0, interval) for _ in self._templates]
+        noise_interval = 1.0 / self.noise_rate if self.noise_rate > 0 else None
+        next_noise = start if noise_interval else math.inf
+
+        count = 0
+        while True:
+            index = min(range(len(schedule)), key=schedule.__getitem__)
+            t = schedule[index]
+
+            if next_noise < t:
+                t = next_noise
+                next_noise += noise_interval
+                if self.duration is not None and t > self.duration:
+                    return
+                count += 1
+                await self._wait_until(t, count)
+                self._deliver(self._noise_device, Advertisement(
+                    rssi=-90, manufacturer_data=self._noise_data))
+                continue
+
+            if self.duration is not None and t > self.duration:
+                return
+
+            # 广播间隔加入少量抖动（BLE 规范的 advDelay）
+            schedule[index] = t + interval + self.random.uniform(0, 0.01)
+
+            count += 1
+            await self._wait_until(t, count)
+            beacon_position, device, manufacturer_data = self._templates[index]
+            self._deliver(device, Advertisement(
+                rssi=self._rssi(beacon_position, self.tag_position(t)),
+                manufacturer_data=manufacturer_data,
+                local_name=device.name
+            ))
+
+
+class CaptureRecorder:
+    """将检测回调收到的广播写入抓包文件（ReplaySource 可回放）"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 抓包文件路径（JSON Lines）
+        """
+        self.path = path
+        # 行缓冲：每条广播写完即交给操作系统，进程被中断时不会丢失缓冲区中的数据
+        self._file = open(path, 'w', encoding='utf-8', buffering=1)
+        self.set_clock(time.monotonic)
+
+    def __enter__(self) -> 'CaptureRecorder':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def set_clock(self, clock: Callable[[], float]):
+        """设置记录时间戳使用的时钟（通常为数据源的 time()）"""
+        self._clock = clock
+        self._start = clock()
+
+    def wrap(self, callback: DetectionCallback) -> DetectionCallback:
+        """返回先记录再调用原回调的新回调"""
+        def recording_callback(device, advertisement_data):
+            self.write(device, advertisement_data)
+            callback(device, advertisement_data)
+        return recording_callback
+
+    def write(self, device, advertisement_data):
+        """写入一条广播"""
+        item = {
+            't': round(self._clock() - self._start, 6),
+            'address': getattr(device, 'address', ''),
+            'name': getattr(device, 'name', None),
+            'rssi': advertisement_data.rssi,
+            'manufacturer_data': {str(k): bytes(v).hex()
+                                  for k, v in advertisement_data.manufacturer_data.items()},
+            'service_data': {k: bytes(v).hex()
+                             for k, v in (advertisement_data.service_data or {}).items()}
+        }
+        self._file.write(json.dumps(item) + '\n')
+
+    def flush(self):
+        """将已记录的数据写入磁盘"""
+        if not self._file.closed:
+            self._file.flush()
+
+    def close(self):
+        """关闭文件"""
+        if not self._file.closed:
+            self._file.close()
+
+
+class _RecordingSource(AdvertisementSource):
+    """在任意数据源外层记录抓包文件"""
+
+    def __init__(self, source: AdvertisementSource, recorder: CaptureRecorder):
+        super().__init__(source.detection_callback)
+        self.source = source
+        self.recorder = recorder
+
+    async def start(self):
+        await self.source.start()
+
+    async def stop(self):
+        try:
+            await self.source.stop()
+        finally:
+            # 数据源可能再次启动，这里只刷新不关闭，close() 时关闭文件
+            self.recorder.flush()
+
+    async def close(self):
+        try:
+            await self.source.close()
+        finally:
+            self.recorder.close()
+
+    def time(self) -> float:
+        return self.source.time()
+
+    def sleep(self, duration: float) -> Awaitable[None]:
+        return self.source.sleep(duration)
+
+    def set_lockstep(self, enabled: bool):
+        self.source.set_lockstep(enabled)
+
+    def hold(self):
+        self.source.hold()
+
+    @property
+    def finished(self) -> bool:
+        return self.source.finished
+
+    def set_finished_callback(self, callback: Optional[Callable[[], None]]):
+        self.source.set_finished_callback(callback)
+
+
+def create_source(spec: Optional[dict], detection_callback: DetectionCallback) -> AdvertisementSource:
+    """
+    根据配置创建数据源
+
+    Args:
+        spec: 数据源配置，例如
+              {"type": "bleak"}
+              {"type": "replay", "path": "capture.jsonl", "speed": 0, "loop": false}
+              {"type": "synthetic", "beacons": [...], "speed": 1.0, ...}
+              可选 "record": "out.jsonl" 同时记录抓包文件。None 表示使用蓝牙适配器
+        detection_callback: 检测回调 callback(device, advertisement_data)
+
+    Returns:
+        AdvertisementSource 对象
+    """
+    spec = dict(spec or {})
+    source_type = spec.pop('type', 'bleak')
+    record = spec.pop('record', None)
+
+    recorder = None
+    if record:
+        recorder = CaptureRecorder(record)
+        detection_callback = recorder.wrap(detection_callback)
+
+    if source_type == 'bleak':
+        source = BleakSource(detection_callback)
+    elif source_type == 'replay':
+        source = ReplaySource(detection_callback, **spec)
+    elif source_type == 'synthetic':
+        source = SyntheticSource(detection_callback, **spec)
+    else:
+        raise ValueError(f"未知的数据源类型: {source_type}")
+
+    if recorder is not None:
+        recorder.set_clock(source.time)
+        return _RecordingSource(source, recorder)
+    return source
+
+
+def add_source_arguments(parser):
+    """
+    为命令行工具添加数据源参数
+
+    Args:
+        parser: argparse.ArgumentParser
+    """
+    group = parser.add_argument_group('数据源')
+    group.add_argument('--source', choices=SOURCE_TYPES,
+                       help='广播数据源: bleak(蓝牙适配器) / replay(抓包回放) / synthetic(合成数据)')
+    group.add_argument('--replay-file', metavar='FILE',
+                       help='回放的抓包文件（--source replay）')
+    group.add_argument('--speed', type=float,
+                       help='回放/合成速度倍数，1.0 为实时，0 表示尽可能快')
+    group.add_argument('--record', metavar='FILE',
+                       help='同时将收到的广播记录到抓包文件')
+    group.add_argument('--source-config', metavar='FILE', default='beacon_config.json',
+                       help='合成数据源使用的 beacon 配置文件（默认: beacon_config.json）')
+
+
+def source_spec_from_args(args, config: Optional[dict] = None) -> dict:
+    """
+    合并配置文件中的 "source" 项和命令行参数，生成 create_source 所需的配置
+
+    Args:
+        args: add_source_arguments 添加过参数的解析结果，None 表示只使用配置文件
+        config: 已加载的 beacon 配置，None 时按需从 --source-config 读取
+
+    Returns:
+        数据源配置字典
+    """
+    spec = dict(config.get('source', {})) if config else {}
+
+    if args is not None:
+        if args.source:
+            spec['type'] = args.source
+        if args.replay_file:
+            spec['path'] = args.replay_file
+        if args.speed is not None:
+            spec['speed'] = args.speed
+        if args.record:
+            spec['record'] = args.record
+
+    if spec.get('type') == 'replay' and 'path' not in spec:
+        raise ValueError("回放数据源需要指定 --replay-file")
+
+    if spec.get('type') == 'synthetic' and 'beacons' not in spec:
+        if config is None:
+            with open(args.source_config, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        spec['beacons'] = config['beacons']
+        spec.setdefault('environment_factor', config.get('environment_factor', 2.5))
+
+    return spec
@@ -8,12 +8,13 @@ from ibeacon_parser import IBeaconParser
 import os
 from datetime import datetime
 import argparse
+from advertisement_source import add_source_arguments, source_spec_from_args
 
 
 class BeaconMonitor:
     """Beacon 持续监控器"""
 
-    def __init__(self, name_prefix=None, scan_duration=3.0, interval=2.0):
+    def __init__(self, name_prefix=None, scan_duration=3.0, interval=2.0, source=None):
         """
         初始化监控器
 
@@ -21,11 +22,12 @@ class BeaconMonitor:
             name_prefix: 设备名称前缀过滤
             scan_duration: 每次扫描时长（秒）
             interval: 扫描间隔（秒）
+            source: 广播数据源配置（见 advertisement_source.create_source），None 表示蓝牙适配器
         """
         self.name_prefix = name_prefix
         self.scan_duration = scan_duration
         self.interval = interval
-        self.scanner = IBeaconScanner(environment_factor=2.5)
+        self.scanner = IBeaconScanner(environment_factor=2.5, source=source)
 
         self.scan_count = 0
         self.detection_history = {}  # {beacon_key: {'name': ..., 'history': [...]}}
@@ -83,7 +85,8 @@ class BeaconMonitor:
             current_beacons.append({
                 'key': beacon_key,
                 'name': name,
-                'rssi': beacon_data.rssi,
+                'rssi': data['rssi'],
+                'packets': data['stats']['count'],
                 'distance': data['distance'],
                 'tx_power': beacon_data.tx_power
             })
@@ -160,7 +163,7 @@ class BeaconMonitor:
             for i, beacon in enumerate(current_beacons, 1):
                 signal_bar = self._get_signal_bar(beacon['rssi'])
                 print(f"{i}. {beacon['name']}")
-                print(f"   RSSI: {beacon['rssi']} dBm {signal_bar}")
+                print(f"   RSSI: {beacon['rssi']:.1f} dBm {signal_bar} ({beacon['packets']} 包)")
                 print(f"   距离: {beacon['distance']:.2f}m")
                 print(f"   TxPower: {beacon['tx_power']} dBm")
                 print()
@@ -232,7 +235,8 @@ class BeaconMonitor:
         await asyncio.sleep(1)
 
         try:
-            while True:
+            # 回放/合成数据源全部送达后结束
+            while not self.scanner.finished:
                 # 执行扫描
                 current_beacons = await self.scan_once()
 
@@ -242,11 +246,16 @@ class BeaconMonitor:
                 # 等待下次扫描
                 await asyncio.sleep(self.interval)
 
+            print("\n✓ 数据源已全部回放")
+            self._show_final_summary()
+
         except KeyboardInterrupt:
             print("\n\n" + "=" * 80)
             print("✓ 监控已停止")
             print("=" * 80)
             self._show_final_summary()
+        finally:
+            await self.scanner.close()
 
     def _show_final_summary(self):
         """显示最终汇总"""
@@ -308,12 +317,15 @@ async def main():
         help='扫描间隔（秒），默认 2.0'
     )
 
+    add_source_arguments(parser)
+
     args = parser.parse_args()
 
     monitor = BeaconMonitor(
         name_prefix=args.prefix,
         scan_duration=args.scan,
-        interval=args.interval
+        interval=args.interval,
+        source=source_spec_from_args(args)
     )
 
     await monitor.run()
@@ -0,0 +1,279 @@
+"""
+RSSI 指纹定位模块
+离线在已知位置采集各 beacon 的 RSSI 向量生成指纹地图（radio map），
+在线定位时用 KD 树做加权 k 近邻查询，不依赖路径损耗模型和三边测量
+"""
+import argparse
+import asyncio
+import json
+import os
+import numpy as np
+from scipy.spatial import cKDTree
+from typing import Dict, List, Optional, Tuple
+from ibeacon_parser import IBeaconData
+
+
+# 参考点或在线测量中未收到的 beacon 以该 RSSI 填充
+MISSING_RSSI = -100.0
+
+
+class RadioMap:
+    """
+    指纹地图
+
+    每个参考点保存位置 (x, y, z) 和按 beacons 顺序排列的 RSSI 向量。
+    文件由两部分组成：<path>.npy 为结构化数组（position float32×3，rssi float32×N），
+    加载时使用内存映射，参考点很多时也能立即打开；<path>.json 保存 beacon 列表。
+    """
+
+    def __init__(self, beacons: List[dict], records: Optional[np.ndarray] = None):
+        """
+        初始化指纹地图
+
+        Args:
+            beacons: beacon 列表 [{uuid, major, minor, name}, ...]，决定 RSSI 向量的列顺序
+            records: 已有的参考点结构化数组，None 表示空地图
+        """
+        self.beacons = [
+            {'uuid': b['uuid'], 'major': b['major'], 'minor': b['minor'], 'name': b.get('name')}
+            for b in beacons
+        ]
+        self.keys = [IBeaconData.make_key(b['uuid'], b['major'], b['minor']) for b in self.beacons]
+        self.columns = {key: column for column, key in enumerate(self.keys)}
+        self.dtype = np.dtype([('position', np.float32, (3,)),
+                               ('rssi', np.float32, (len(self.beacons),))])
+        self._records = records if records is not None else np.zeros(0, dtype=self.dtype)
+        self._pending: List[tuple] = []
+
+    @staticmethod
+    def paths(path: str) -> Tuple[str, str]:
+        """返回 (数组文件, beacon 列表文件) 路径"""
+        base = path[:-4] if path.endswith('.npy') else path
+        return base + '.npy', base + '.json'
+
+    @property
+    def records(self) -> np.ndarray:
+        """全部参考点（结构化数组）"""
+        if self._pending:
+            added = np.array(self._pending, dtype=self.dtype)
+            self._records = np.concatenate([np.asarray(self._records), added])
+            self._pending = []
+        return self._records
+
+    @property
+    def positions(self) -> np.ndarray:
+        """参考点位置 (M, 3)"""
+        return self.records['position']
+
+    @property
+    def rssi(self) -> np.ndarray:
+        """参考点 RSSI 矩阵 (M, N)"""
+        return self.records['rssi']
+
+    def vector(self, rssi_by_key: Dict[int, float], missing_rssi: float = MISSING_RSSI) -> np.ndarray:
+        """
+        把 {IBeaconData.key: rssi} 转换为按地图 beacon 顺序排列的 RSSI 向量
+
+        Args:
+            rssi_by_key: 各 beacon 的 RSSI，不在地图中的 beacon 被忽略
+            missing_rssi: 未收到的 beacon 的填充值
+
+        Returns:
+            RSSI 向量 (N,)
+        """
+        vector = np.full(len(self.keys), missing_rssi, dtype=np.float32)
+        for key, rssi in rssi_by_key.items():
+            column = self.columns.get(key)
+            if column is not None:
+                vector[column] = rssi
+        return vector
+
+    def add(self, position, rssi_by_key: Dict[int, float], missing_rssi: float = MISSING_RSSI):
+        """
+        添加一个参考点
+
+        Args:
+            position: 参考点位置 [x, y, z]
+            rssi_by_key: 该位置测得的 {IBeaconData.key: rssi}
+            missing_rssi: 未收到的 beacon 的填充值
+        """
+        self._pending.append((np.asarray(position, dtype=np.float32),
+                              self.vector(rssi_by_key, missing_rssi)))
+
+    def save(self, path: str):
+        """
+        保存到 <path>.npy 和 <path>.json
+
+        Args:
+            path: 文件路径（可带或不带 .npy 后缀）
+        """
+        array_path, meta_path = self.paths(path)
+        records = np.ascontiguousarray(self.records)
+        np.save(array_path, records)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'beacons': self.beacons, 'count': len(records)}, f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'RadioMap':
+        """
+        加载指纹地图
+
+        Args:
+            path: 文件路径（可带或不带 .npy 后缀）
+            mmap: 是否以只读内存映射方式打开数组文件
+
+        Returns:
+            RadioMap 对象
+        """
+        array_path, meta_path = cls.paths(path)
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        records = np.load(array_path, mmap_mode='r' if mmap else None)
+        radio_map = cls(meta['beacons'], records)
+        if records.dtype != radio_map.dtype:
+            raise ValueError(f"指纹地图格式与 beacon 列表不一致: {array_path}")
+        return radio_map
+
+    @classmethod
+    def open(cls, path: str, beacons: List[dict]) -> 'RadioMap':
+        """文件存在时加载（用于继续采集），否则以 beacons 创建空地图"""
+        array_path, meta_path = cls.paths(path)
+        if os.path.exists(array_path) and os.path.exists(meta_path):
+            return cls.load(path, mmap=False)
+        return cls(beacons)
+
+    def __len__(self) -> int:
+        return len(self._records) + len(self._pending)
+
+
+class FingerprintLocator:
+    """
+    加权 k 近邻指纹定位
+
+    在 RSSI 向量空间中对参考点建立 KD 树，查询最近的 k 个参考点，
+    以 RSSI 距离的倒数为权重对它们的位置加权平均。
+    """
+
+    def __init__(self, radio_map: RadioMap, k: int = 4, missing_rssi: float = MISSING_RSSI,
+                 leafsize: int = 16):
+        """
+        初始化定位器
+
+        Args:
+            radio_map: 指纹地图
+            k: 近邻数量
+            missing_rssi: 在线测量中未收到的 beacon 的填充值（应与采集时一致）
+            leafsize: KD 树叶节点大小
+        """
+        if len(radio_map) == 0:
+            raise ValueError("指纹地图为空")
+        self.radio_map = radio_map
+        self.k = min(k, len(radio_map))
+        self.missing_rssi = missing_rssi
+        self.positions = np.asarray(radio_map.positions, dtype=np.float64)
+        self.tree = cKDTree(np.asarray(radio_map.rssi, dtype=np.float64), leafsize=leafsize)
+
+    def locate(self, rssi_vector: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+        """
+        根据 RSSI 向量估算位置
+
+        Args:
+            rssi_vector: 按地图 beacon 顺序排列的 RSSI 向量 (N,)，也可以是 (T, N) 批量查询
+            k: 近邻数量，None 时使用初始化时的值
+
+        Returns:
+            估算位置 [x, y, z]；批量查询时为 (T, 3)
+        """
+        k = self.k if k is None else min(k, len(self.positions))
+        distances, indices = self.tree.query(rssi_vector, k=k)
+        if k == 1:
+            return self.positions[indices]
+
+        weights = 1.0 / (distances + 1e-6)
+        weights /= weights.sum(axis=-1, keepdims=True)
+        return np.einsum('...k,...kj->...j', weights, self.positions[indices])
+
+    def locate_scan(self, scanned_beacons: Dict[int, dict]) -> Optional[np.ndarray]:
+        """
+        根据扫描结果（IBeaconScanner.snapshot / scan 的返回值）估算位置
+
+        Args:
+            scanned_beacons: {IBeaconData.key: {'rssi': ..., ...}}
+
+        Returns:
+            估算位置 [x, y, z]，没有收到地图中的任何 beacon 时返回 None
+        """
+        rssi_by_key = {key: data['rssi'] for key, data in scanned_beacons.items()
+                       if key in self.radio_map.columns}
+        if not rssi_by_key:
+            return None
+        return self.locate(self.radio_map.vector(rssi_by_key, self.missing_rssi))
+
+
+async def survey(config_file: str, output: str, position: List[float], duration: float,
+                 repeat: int, source=None):
+    """
+    在一个已知位置采集参考点并追加到指纹地图
+
+    每个扫描窗口（duration 秒）内各 beacon 的 RSSI 中位数作为一个参考点，共采集 repeat 个。
+
+    Args:
+        config_file: beacon 配置文件
+        output: 指纹地图路径
+        position: 当前采集位置 [x, y, z]
+        duration: 每个参考点的扫描时长（秒）
+        repeat: 参考点数量
+        source: 广播数据源配置（见 advertisement_source.create_source）
+    """
+    from ibeacon_scanner import IBeaconScanner
+
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    radio_map = RadioMap.open(output, config['beacons'])
+    scanner = IBeaconScanner(environment_factor=config['environment_factor'], source=source)
+
+    print(f"采集位置: {position}，共 {repeat} 个参考点，每个 {duration} 秒")
+    async with scanner:
+        for i in range(repeat):
+            beacons = await scanner.scan(duration=duration)
+            rssi_by_key = {key: data['rssi'] for key, data in beacons.items()
+                           if key in radio_map.columns}
+            radio_map.add(position, rssi_by_key)
+            print(f"  参考点 {i + 1}/{repeat}: 收到 {len(rssi_by_key)}/{len(radio_map.keys)} 个 beacon")
+
+    radio_map.save(output)
+    print(f"✓ 指纹地图已保存: {RadioMap.paths(output)[0]}（共 {len(radio_map)} 个参考点）")
+
+
+def main():
+    """命令行入口：采集参考点"""
+    from advertisement_source import add_source_arguments, source_spec_from_args
+
+    parser = argparse.ArgumentParser(description='RSSI 指纹地图采集工具')
+    parser.add_argument('-c', '--config', type=str, default='beacon_config.json',
+                        help='配置文件路径（默认: beacon_config.json）')
+    parser.add_argument('-o', '--output', type=str, default='radio_map',
+                        help='指纹地图路径（默认: radio_map，生成 radio_map.npy / radio_map.json）')
+    parser.add_argument('-p', '--position', type=float, nargs=3, required=True,
+                        metavar=('X', 'Y', 'Z'), help='当前采集位置（米）')
+    parser.add_argument('-t', '--duration', type=float, default=2.0,
+                        help='每个参考点的扫描时长（秒，默认: 2.0）')
+    parser.add_argument('-n', '--repeat', type=int, default=5,
+                        help='在该位置采集的参考点数量（默认: 5）')
+    add_source_arguments(parser)
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    source = source_spec_from_args(args, config)
+    if source.get('type') == 'synthetic':
+        # 合成数据源模拟标签位于采集位置
+        source['position'] = args.position
+        source['motion'] = 'static'
+
+    asyncio.run(survey(args.config, args.output, args.position, args.duration, args.repeat, source))
+
+
+if __name__ == '__main__':
+    main()
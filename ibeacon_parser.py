@@ -1,20 +1,122 @@
 """
 iBeacon 数据解析模块
-解析 BLE 广播数据中的 iBeacon 格式信息
+解析 BLE 广播数据中的 iBeacon 格式信息，并通过帧格式注册表支持 AltBeacon、Eddystone-UID
 """
 import struct
-from dataclasses import dataclass
-from typing import Optional
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from lru import LRUCache
+
+
+# 批量解析结果的结构化数组类型
+IBEACON_DTYPE = np.dtype([
+    ('uuid', np.uint8, (16,)),
+    ('major', np.uint16),
+    ('minor', np.uint16),
+    ('tx_power', np.int8),
+    ('rssi', np.int16),
+])
+
+# UUID 驻留表 {uuid_bytes: (uuid_bytes, key_base)}，同一 UUID 只保留一份
+_UUID_INTERN: Dict[bytes, Tuple[bytes, int]] = {}
+_UUID_INTERN_MAX = 4096
+
+
+def _intern_uuid(uuid_bytes: bytes) -> Tuple[bytes, int]:
+    """
+    驻留 UUID 字节串并返回 (驻留后的 bytes, 标识键高位)
+
+    Args:
+        uuid_bytes: 16 字节 UUID
+
+    Returns:
+        (uuid_bytes, key_base)，key_base 为 UUID 整数左移 32 位
+    """
+    entry = _UUID_INTERN.get(uuid_bytes)
+    if entry is None:
+        if len(_UUID_INTERN) >= _UUID_INTERN_MAX:
+            _UUID_INTERN.clear()
+        entry = (uuid_bytes, int.from_bytes(uuid_bytes, 'big') << 32)
+        _UUID_INTERN[uuid_bytes] = entry
+    return entry
+
+
+@lru_cache(maxsize=1024)
+def format_uuid(uuid_bytes: bytes) -> str:
+    """将 16 字节 UUID 格式化为带连字符的大写字符串"""
+    h = uuid_bytes.hex().upper()
+    return f"{h[0:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}"
 
 
-@dataclass
 class IBeaconData:
-    """iBeacon 数据结构"""
-    uuid: str
-    major: int
-    minor: int
-    tx_power: int
-    rssi: int
+    """
+    iBeacon 数据结构
+
+    UUID 以 16 字节原始数据保存（同一 UUID 共享一个对象），
+    带连字符的字符串形式只在访问 uuid 属性时生成。
+    key 为预先计算好的 (uuid, major, minor) 整数标识，可直接用作字典键。
+    """
+
+    __slots__ = ('uuid_bytes', 'major', 'minor', 'tx_power', 'rssi', 'key', 'frame')
+
+    def __init__(self, uuid_bytes: bytes, major: int, minor: int,
+                 tx_power: int, rssi: int, frame: str = 'ibeacon'):
+        self.uuid_bytes, key_base = _intern_uuid(bytes(uuid_bytes))
+        self.major = major
+        self.minor = minor
+        self.tx_power = tx_power
+        self.rssi = rssi
+        self.key = key_base | (major << 16) | minor
+        self.frame = frame  # 帧格式: ibeacon / altbeacon / eddystone_uid
+
+    def with_rssi(self, rssi: int) -> 'IBeaconData':
+        """返回标识相同、RSSI 不同的新记录（不重新驻留 UUID、不重新计算 key）"""
+        clone = object.__new__(IBeaconData)
+        clone.uuid_bytes = self.uuid_bytes
+        clone.major = self.major
+        clone.minor = self.minor
+        clone.tx_power = self.tx_power
+        clone.rssi = rssi
+        clone.key = self.key
+        clone.frame = self.frame
+        return clone
+
+    @property
+    def uuid(self) -> str:
+        """带连字符的 UUID 字符串"""
+        return format_uuid(self.uuid_bytes)
+
+    @staticmethod
+    def make_key(uuid: Union[str, bytes], major: int, minor: int) -> int:
+        """
+        根据 UUID、Major、Minor 计算整数标识键（与 IBeaconData.key 一致）
+
+        Args:
+            uuid: UUID 字符串（可带连字符）或 16 字节原始数据
+            major: Major 值
+            minor: Minor 值
+
+        Returns:
+            整数标识键
+        """
+        if isinstance(uuid, str):
+            uuid = bytes.fromhex(uuid.replace('-', ''))
+        return (int.from_bytes(uuid, 'big') << 32) | (major << 16) | minor
+
+    def __eq__(self, other):
+        if not isinstance(other, IBeaconData):
+            return NotImplemented
+        return (self.key == other.key and self.tx_power == other.tx_power
+                and self.rssi == other.rssi and self.frame == other.frame)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"IBeaconData(uuid={self.uuid!r}, major={self.major}, minor={self.minor}, "
+                f"tx_power={self.tx_power}, rssi={self.rssi})")
 
     def __str__(self):
         return (f"UUID: {self.uuid}, Major: {self.major}, Minor: {self.minor}, "
@@ -29,6 +131,12 @@ class IBeaconParser:
     # iBeacon 类型标识
     IBEACON_TYPE = 0x02
     IBEACON_LENGTH = 0x15
+    # 帧前缀（type + length），一次前缀比较即可排除非 iBeacon 数据
+    PREFIX = bytes([IBEACON_TYPE, IBEACON_LENGTH])
+    # iBeacon 负载长度（type + length + UUID + Major + Minor + TxPower）
+    IBEACON_PAYLOAD_SIZE = 23
+    # Major(2) + Minor(2) + TxPower(1)
+    _TAIL = struct.Struct('>HHb')
 
     @staticmethod
     def parse(manufacturer_data: dict, rssi: int) -> Optional[IBeaconData]:
@@ -42,49 +150,329 @@ class IBeaconParser:
         Returns:
             IBeaconData 对象，如果不是 iBeacon 数据则返回 None
         """
-        # 检查是否包含 Apple 公司数据
-        if IBeaconParser.APPLE_COMPANY_ID not in manufacturer_data:
+        data = manufacturer_data.get(IBeaconParser.APPLE_COMPANY_ID)
+        if data is None or not data.startswith(IBeaconParser.PREFIX):
             return None
 
-        data = manufacturer_data[IBeaconParser.APPLE_COMPANY_ID]
+        return IBeaconParser.decode(data, rssi)
 
-        # iBeacon 数据格式验证
+    @staticmethod
+    def decode(data: bytes, rssi: int) -> Optional[IBeaconData]:
+        """
+        解码已确认前缀的 iBeacon 制造商数据
+
+        Args:
+            data: Apple 制造商数据（以 0x02 0x15 开头）
+            rssi: 信号强度
+
+        Returns:
+            IBeaconData 对象，长度不足时返回 None
+        """
         # 最小长度：2字节(type+length) + 16字节(UUID) + 2字节(Major) + 2字节(Minor) + 1字节(TxPower) = 23字节
-        if len(data) < 23:
+        if len(data) < IBeaconParser.IBEACON_PAYLOAD_SIZE:
             return None
 
+        # Major / Minor (大端序) 与 TxPower (有符号) 一次解析
+        major, minor, tx_power = IBeaconParser._TAIL.unpack_from(data, 18)
+
+        return IBeaconData(
+            uuid_bytes=data[2:18],
+            major=major,
+            minor=minor,
+            tx_power=tx_power,
+            rssi=rssi
+        )
+
+    @staticmethod
+    def parse_batch(buffer: Union[bytes, bytearray, memoryview],
+                    offsets: Sequence[int],
+                    rssi: Sequence[int]) -> np.ndarray:
+        """
+        批量解析 iBeacon 数据（用于回放抓包或网关批量数据）
+
+        所有负载位于同一个缓冲区中，直接在 memoryview 上按偏移量读取，
+        不会为每条记录创建 bytes 或 Python 对象。
+
+        Args:
+            buffer: 包含多条 Apple 制造商数据的连续缓冲区
+            offsets: 每条负载在缓冲区中的起始偏移（指向 type 字节 0x02）
+            rssi: 每条负载对应的信号强度
+
+        Returns:
+            IBEACON_DTYPE 结构化数组，只包含有效的 iBeacon 记录
+        """
+        raw = np.frombuffer(memoryview(buffer), dtype=np.uint8)
+        offsets = np.asarray(offsets, dtype=np.intp)
+        rssi = np.asarray(rssi, dtype=np.int16)
+
+        if offsets.shape != rssi.shape:
+            raise ValueError("offsets 与 rssi 长度不一致")
+
+        size = IBeaconParser.IBEACON_PAYLOAD_SIZE
+
+        # 越界的偏移直接丢弃
+        in_range = (offsets >= 0) & (offsets + size <= raw.size)
+        offsets = offsets[in_range]
+        rssi = rssi[in_range]
 
         # 检查 iBeacon 类型标识
-        if data[0] != IBeaconParser.IBEACON_TYPE or data[1] != IBeaconParser.IBEACON_LENGTH:
+        valid = ((raw[offsets] == IBeaconParser.IBEACON_TYPE) &
+                 (raw[offsets + 1] == IBeaconParser.IBEACON_LENGTH))
+        offsets = offsets[valid]
+
+        # 按字段直接从缓冲区取值，不生成 (N, 23) 的负载副本；
+        # UUID 通过 16 字节滑动窗口视图取出，只写入结果数组
+        result = np.empty(len(offsets), dtype=IBEACON_DTYPE)
+        if len(offsets) == 0:
+            return result
+        result['uuid'] = np.lib.stride_tricks.sliding_window_view(raw, 16)[offsets + 2]
+        # Major / Minor 为大端序
+        result['major'] = (raw[offsets + 18].astype(np.uint16) << 8) | raw[offsets + 19]
+        result['minor'] = (raw[offsets + 20].astype(np.uint16) << 8) | raw[offsets + 21]
+        result['tx_power'] = raw[offsets + 22].view(np.int8)
+        result['rssi'] = rssi[valid]
+
+        return result
+
+
+class AltBeaconParser:
+    """AltBeacon 数据解析器（任意公司 ID 的制造商数据）"""
+
+    # Beacon Code
+    PREFIX = b'\xbe\xac'
+    # Beacon Code(2) + Beacon ID(20) + Reference RSSI(1) + 保留(1)
+    PAYLOAD_SIZE = 24
+
+    @staticmethod
+    def decode(data: bytes, rssi: int) -> Optional[IBeaconData]:
+        """
+        解码 AltBeacon 制造商数据
+
+        Beacon ID 按 16 字节 ID1 + 2 字节 ID2 + 2 字节 ID3 映射为 uuid/major/minor，
+        Reference RSSI 为 1 米处信号强度，直接作为 tx_power。
+
+        Args:
+            data: 制造商数据（以 0xBE 0xAC 开头）
+            rssi: 信号强度
+
+        Returns:
+            IBeaconData 对象，长度不足时返回 None
+        """
+        if len(data) < AltBeaconParser.PAYLOAD_SIZE:
+            return None
+
+        major, minor, tx_power = IBeaconParser._TAIL.unpack_from(data, 18)
+
+        return IBeaconData(
+            uuid_bytes=data[2:18],
+            major=major,
+            minor=minor,
+            tx_power=tx_power,
+            rssi=rssi,
+            frame='altbeacon'
+        )
+
+
+class EddystoneUIDParser:
+    """Eddystone-UID 数据解析器（服务数据）"""
+
+    SERVICE_UUID = '0000feaa-0000-1000-8000-00805f9b34fb'
+    # UID 帧类型
+    PREFIX = b'\x00'
+    # 帧类型(1) + TxPower(1) + Namespace(10) + Instance(6)，末尾 2 字节保留可省略
+    PAYLOAD_SIZE = 18
+    # Eddystone 的 TxPower 为 0 米处功率，换算到 1 米约减 41 dB
+    TX_POWER_1M_OFFSET = 41
+
+    @staticmethod
+    def decode(data: bytes, rssi: int) -> Optional[IBeaconData]:
+        """
+        解码 Eddystone-UID 服务数据
+
+        Namespace(10) + Instance(6) 合并为 16 字节 uuid，major/minor 固定为 0。
+
+        Args:
+            data: 服务数据（以帧类型 0x00 开头）
+            rssi: 信号强度
+
+        Returns:
+            IBeaconData 对象，长度不足时返回 None
+        """
+        if len(data) < EddystoneUIDParser.PAYLOAD_SIZE:
             return None
 
-        try:
-            # 解析 UUID (16 字节，从索引 2 开始)
-            uuid_bytes = data[2:18]
-            uuid = '-'.join([
-                uuid_bytes[0:4].hex().upper(),
-                uuid_bytes[4:6].hex().upper(),
-                uuid_bytes[6:8].hex().upper(),
-                uuid_bytes[8:10].hex().upper(),
-                uuid_bytes[10:16].hex().upper()
-            ])
-            
-            # 解析 Major (2 字节，大端序)
-            major = struct.unpack('>H', data[18:20])[0]
-
-            # 解析 Minor (2 字节，大端序)
-            minor = struct.unpack('>H', data[20:22])[0]
-
-            # 解析 TxPower (1 字节，有符号整数)
-            tx_power = struct.unpack('b', data[22:23])[0]
-
-            return IBeaconData(
-                uuid=uuid,
-                major=major,
-                minor=minor,
-                tx_power=tx_power,
-                rssi=rssi
-            )
-        except Exception as e:
-            print(f"解析 iBeacon 数据时出错: {e}")
+        tx_power = struct.unpack_from('b', data, 1)[0] - EddystoneUIDParser.TX_POWER_1M_OFFSET
+
+        return IBeaconData(
+            uuid_bytes=data[2:18],
+            major=0,
+            minor=0,
+            tx_power=tx_power,
+            rssi=rssi,
+            frame='eddystone_uid'
+        )
+
+
+FrameDecoder = Callable[[bytes, int], Optional[IBeaconData]]
+
+
+class BeaconFrameRegistry:
+    """
+    Beacon 帧格式注册表
+
+    按公司 ID（制造商数据）或服务 UUID（服务数据）预先建立分发表，
+    每个候选格式只做一次前缀比较，不匹配的广播包直接丢弃。
+    """
+
+    def __init__(self):
+        # 指定公司 ID 的解码器 {company_id: ((prefix, decoder), ...)}
+        self._specific: Dict[int, Tuple[Tuple[bytes, FrameDecoder], ...]] = {}
+        # 适用于任意公司 ID 的解码器（如 AltBeacon）
+        self._wildcard_decoders: Tuple[Tuple[bytes, FrameDecoder], ...] = ()
+        # 分发表 {company_id: ((prefix, decoder), ...)}，已合并通配解码器
+        self._manufacturer_table: Dict[int, Tuple[Tuple[bytes, FrameDecoder], ...]] = {}
+        # {service_uuid: ((prefix, decoder), ...)}
+        self._service_table: Dict[str, Tuple[Tuple[bytes, FrameDecoder], ...]] = {}
+
+    def register_manufacturer(self, prefix: bytes, decoder: FrameDecoder,
+                              company_id: Optional[int] = None):
+        """
+        注册制造商数据解码器
+
+        Args:
+            prefix: 帧前缀
+            decoder: 解码函数 decoder(data, rssi) -> Optional[IBeaconData]
+            company_id: 公司 ID，None 表示适用于任意公司 ID
+        """
+        entry = (bytes(prefix), decoder)
+        if company_id is None:
+            self._wildcard_decoders += (entry,)
+        else:
+            self._specific[company_id] = self._specific.get(company_id, ()) + (entry,)
+        self._manufacturer_table = {
+            cid: entries + self._wildcard_decoders
+            for cid, entries in self._specific.items()
+        }
+
+    def register_service(self, service_uuid: str, prefix: bytes, decoder: FrameDecoder):
+        """
+        注册服务数据解码器
+
+        Args:
+            service_uuid: 服务 UUID（128 位小写字符串）
+            prefix: 帧前缀
+            decoder: 解码函数 decoder(data, rssi) -> Optional[IBeaconData]
+        """
+        key = service_uuid.lower()
+        self._service_table[key] = self._service_table.get(key, ()) + ((bytes(prefix), decoder),)
+
+    def match(self, manufacturer_data: dict,
+              service_data: Optional[dict] = None) -> Optional[Tuple[bytes, FrameDecoder]]:
+        """
+        查找第一个前缀匹配的帧
+
+        Args:
+            manufacturer_data: BLE 制造商数据字典 {company_id: bytes}
+            service_data: BLE 服务数据字典 {service_uuid: bytes}
+
+        Returns:
+            (原始数据, 解码函数)，没有匹配的格式时返回 None
+        """
+        table = self._manufacturer_table
+        wildcard = self._wildcard_decoders
+        for company_id, data in manufacturer_data.items():
+            for prefix, decoder in table.get(company_id, wildcard):
+                if data.startswith(prefix):
+                    return data, decoder
+
+        if service_data:
+            service_table = self._service_table
+            for service_uuid, data in service_data.items():
+                entries = service_table.get(service_uuid)
+                if entries:
+                    for prefix, decoder in entries:
+                        if data.startswith(prefix):
+                            return data, decoder
+
+        return None
+
+    def parse(self, manufacturer_data: dict, rssi: int,
+              service_data: Optional[dict] = None) -> Optional[IBeaconData]:
+        """
+        解析任意已注册格式的 beacon 数据
+
+        Args:
+            manufacturer_data: BLE 制造商数据字典 {company_id: bytes}
+            rssi: 信号强度
+            service_data: BLE 服务数据字典 {service_uuid: bytes}
+
+        Returns:
+            IBeaconData 对象，不匹配任何格式时返回 None
+        """
+        matched = self.match(manufacturer_data, service_data)
+        if matched is None:
+            return None
+        data, decoder = matched
+        return decoder(data, rssi)
+
+    @staticmethod
+    def default() -> 'BeaconFrameRegistry':
+        """创建包含 iBeacon、AltBeacon、Eddystone-UID 的注册表"""
+        registry = BeaconFrameRegistry()
+        registry.register_manufacturer(IBeaconParser.PREFIX, IBeaconParser.decode,
+                                       company_id=IBeaconParser.APPLE_COMPANY_ID)
+        registry.register_manufacturer(AltBeaconParser.PREFIX, AltBeaconParser.decode)
+        registry.register_service(EddystoneUIDParser.SERVICE_UUID,
+                                  EddystoneUIDParser.PREFIX, EddystoneUIDParser.decode)
+        return registry
+
+
+class IBeaconParseCache(LRUCache):
+    """
+    Beacon 负载解析缓存
+
+    同一个 beacon 每秒会重复广播完全相同的负载，只有 RSSI 不同。
+    以原始负载为键缓存解析出的标识 (uuid, major, minor, tx_power)，
+    命中时只附加新的 RSSI，超出容量时按 LRU 淘汰。
+    帧格式匹配由 BeaconFrameRegistry 完成，不匹配的广播包不计入命中/未命中。
+    """
+
+    def __init__(self, maxsize: int = 256, registry: Optional[BeaconFrameRegistry] = None):
+        """
+        初始化缓存
+
+        Args:
+            maxsize: 最大缓存条目数
+            registry: 帧格式注册表，默认支持 iBeacon、AltBeacon、Eddystone-UID
+        """
+        super().__init__(maxsize)
+        self.registry = registry if registry is not None else BeaconFrameRegistry.default()
+
+    def parse(self, manufacturer_data: dict, rssi: int,
+              service_data: Optional[dict] = None) -> Optional[IBeaconData]:
+        """
+        解析 beacon 数据（与 BeaconFrameRegistry.parse 接口一致）
+
+        Args:
+            manufacturer_data: BLE 制造商数据字典 {company_id: bytes}
+            rssi: 信号强度
+            service_data: BLE 服务数据字典 {service_uuid: bytes}
+
+        Returns:
+            IBeaconData 对象，如果不是已注册格式的 beacon 数据则返回 None
+        """
+        matched = self.registry.match(manufacturer_data, service_data)
+        if matched is None:
             return None
+
+        data, decoder = matched
+        payload = data if isinstance(data, bytes) else bytes(data)
+
+        template = self._lookup(payload)
+        if template is not None:
+            return template.with_rssi(rssi)
+
+        beacon_data = decoder(payload, rssi)
+        if beacon_data is not None:
+            self._store(payload, beacon_data)
+        return beacon_data
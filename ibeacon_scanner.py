@@ -1,111 +1,726 @@
 """
 iBeacon 扫描模块
-使用 bleak 扫描附近的 iBeacon 设备
+使用 bleak（或回放/合成数据源）扫描附近的 iBeacon 设备
 """
 import asyncio
-from bleak import BleakScanner
-from typing import Dict, Callable, Optional
-from ibeacon_parser import IBeaconParser, IBeaconData
+import time
+from functools import lru_cache
+from typing import Awaitable, Dict, Callable, Iterable, Optional, Set, Tuple
+from ibeacon_parser import IBeaconData, IBeaconParseCache
+from advertisement_source import AdvertisementSource, create_source
 import math
+import numpy as np
+
+
+# RSSI / TxPower 均为 int8 取值，查找表覆盖完整的 256 x 256 空间
+_INT8_MIN = -128
+_INT8_SIZE = 256
+
+
+@lru_cache(maxsize=8)
+def _distance_table(n: float) -> Tuple[np.ndarray, list]:
+    """
+    构建指定环境衰减因子下的距离查找表
+
+    Args:
+        n: 环境衰减因子
+
+    Returns:
+        (table, flat_list)：table[tx_power + 128, rssi + 128] 为距离，
+        flat_list 为按 (tx_power + 128) * 256 + (rssi + 128) 展开的 Python 列表（标量查找更快）
+    """
+    values = np.arange(_INT8_MIN, _INT8_MIN + _INT8_SIZE, dtype=np.float64)
+    table = np.power(10.0, (values[:, None] - values[None, :]) / (10.0 * n))
+    table[:, -_INT8_MIN] = -1.0  # rssi == 0 为无效信号
+    table.flags.writeable = False
+    return table, table.ravel().tolist()
+
+
+class _SharedInstanceMethod:
+    """
+    方法描述符：通过实例访问时是普通方法，通过类访问时绑定到该类共享的默认实例
+
+    estimate_distance 原先是 staticmethod，DistanceEstimator.estimate_distance(rssi, tx_power, n)
+    这种类级调用借此继续可用（默认实例的 environment_factor 为 2.5，与原先 n 的默认值一致）。
+    """
+
+    def __init__(self, func: Callable):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            instance = owner._shared_instance()
+        return self.func.__get__(instance, owner)
 
 
 class DistanceEstimator:
-    """RSSI 距离估算器"""
+    """
+    RSSI 距离估算器
+
+    RSSI 和 TxPower 都是小整数，对给定的环境衰减因子预先计算全部 (tx_power, rssi) 组合的距离，
+    标量估算为 O(1) 查表，数组估算为一次 NumPy gather。
+    修改 environment_factor 时自动切换到对应的查找表（最近使用的表会被缓存）。
+    非整数 RSSI（如窗口中位数）按公式直接计算。
+
+    estimate_distance 也可以像原先的静态方法一样通过类调用，此时使用共享的默认实例。
+    """
+
+    def __init__(self, environment_factor: float = 2.5):
+        """
+        初始化距离估算器
+
+        Args:
+            environment_factor: 环境衰减因子 (2~4，室内一般 2.5~3.5)
+        """
+        self.environment_factor = environment_factor
+
+    @property
+    def environment_factor(self) -> float:
+        return self._n
+
+    @environment_factor.setter
+    def environment_factor(self, n: float):
+        self._n = n
+        self._table, self._flat = _distance_table(n)
 
-    @staticmethod
-    def estimate_distance(rssi: int, tx_power: int, n: float = 2.5) -> float:
+    @classmethod
+    def _shared_instance(cls) -> 'DistanceEstimator':
+        """类级调用使用的默认实例（按需创建，每个类一个）"""
+        instance = cls.__dict__.get('_shared')
+        if instance is None:
+            instance = cls()
+            cls._shared = instance
+        return instance
+
+    @_SharedInstanceMethod
+    def estimate_distance(self, rssi: float, tx_power: int, n: Optional[float] = None) -> float:
         """
         根据 RSSI 和 TxPower 估算距离
 
-        改进的距离估算公式，增加了近距离和远距离的校准
+        公式: d = 10 ^ ((TxPower - RSSI) / (10 * n))
 
         Args:
             rssi: 当前接收信号强度
             tx_power: 1米处的信号强度（通常等于 TxPower）
-            n: 环境衰减因子 (2~4，室内一般 2.5~3.5)
+            n: 环境衰减因子 (2~4，室内一般 2.5~3.5)，None 表示使用 environment_factor
 
         Returns:
             估算距离（米）
         """
+        if n is None or n == self._n:
+            flat = self._flat
+        else:
+            flat = _distance_table(n)[1]
+
+        if type(rssi) is int and type(tx_power) is int:
+            ri = rssi - _INT8_MIN
+            ti = tx_power - _INT8_MIN
+            if 0 <= ri < _INT8_SIZE and 0 <= ti < _INT8_SIZE:
+                return flat[ti * _INT8_SIZE + ri]
+
         if rssi == 0:
             return -1.0  # 无效信号
 
         # 基础路径损耗模型
-        ratio = (tx_power - rssi) / (10.0 * n)
-        distance = math.pow(10, ratio)
+        ratio = (tx_power - rssi) / (10.0 * (self._n if n is None else n))
+        return math.pow(10, ratio)
+
+    def estimate_array(self, rssi, tx_power, n: Optional[float] = None) -> np.ndarray:
+        """
+        批量估算距离
+
+        Args:
+            rssi: RSSI 数组
+            tx_power: TxPower 数组或标量（可广播）
+            n: 环境衰减因子，None 表示使用 environment_factor
+
+        Returns:
+            距离数组，rssi 为 0 的位置为 -1.0
+        """
+        rssi = np.asarray(rssi)
+        tx_power = np.asarray(tx_power)
+        n = self._n if n is None else n
+
+        if (np.issubdtype(rssi.dtype, np.integer) and np.issubdtype(tx_power.dtype, np.integer)
+                and rssi.size and rssi.min() >= _INT8_MIN and rssi.max() < _INT8_MIN + _INT8_SIZE
+                and tx_power.min() >= _INT8_MIN and tx_power.max() < _INT8_MIN + _INT8_SIZE):
+            table = self._table if n == self._n else _distance_table(n)[0]
+            return table[tx_power.astype(np.intp) - _INT8_MIN, rssi.astype(np.intp) - _INT8_MIN]
+
+        distance = np.power(10.0, (tx_power - rssi) / (10.0 * n))
+        return np.where(rssi == 0, -1.0, distance)
+
+
+class RssiSampleWindow:
+    """
+    单个 beacon 的 RSSI 采样环形缓冲区
+
+    以定长 NumPy 数组保存最近 capacity 个 (timestamp, rssi) 采样，
+    窗口统计量（中位数、截尾均值、百分位数、采样数、包速率）直接在数组上计算。
+    """
+
+    # 可用于估算距离的 RSSI 统计量
+    STATISTICS = ('median', 'trimmed_mean', 'percentile', 'mean', 'last')
+
+    def __init__(self, capacity: int = 128):
+        """
+        初始化采样窗口
+
+        Args:
+            capacity: 最多保留的采样数
+        """
+        if capacity <= 0:
+            raise ValueError("capacity 必须大于 0")
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.rssi = np.zeros(capacity, dtype=np.float64)
+        self._next = 0  # 下一个写入位置
+        self.size = 0
+
+    def add(self, timestamp: float, rssi: int):
+        """添加一个采样（覆盖最旧的采样）"""
+        i = self._next
+        self.timestamps[i] = timestamp
+        self.rssi[i] = rssi
+        self._next = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def samples(self, since: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        返回时间顺序的采样
+
+        Args:
+            since: 只返回时间戳不早于 since 的采样，None 表示全部
+
+        Returns:
+            (timestamps, rssi) 两个数组
+        """
+        if self.size < self.capacity:
+            timestamps = self.timestamps[:self.size]
+            rssi = self.rssi[:self.size]
+        else:
+            order = np.roll(np.arange(self.capacity), -self._next)
+            timestamps = self.timestamps[order]
+            rssi = self.rssi[order]
+
+        if since is not None:
+            mask = timestamps >= since
+            timestamps = timestamps[mask]
+            rssi = rssi[mask]
+        return timestamps, rssi
+
+    def statistics(self, since: Optional[float] = None, trim: float = 0.1,
+                   percentile: float = 75.0) -> Optional[dict]:
+        """
+        计算窗口统计量
+
+        Args:
+            since: 窗口起始时间，None 表示全部采样
+            trim: 截尾均值两端各去掉的比例
+            percentile: 百分位数（RSSI 较高的百分位受多径衰落影响较小）
+
+        Returns:
+            统计量字典，窗口内没有采样时返回 None
+        """
+        timestamps, rssi = self.samples(since)
+        count = len(rssi)
+        if count == 0:
+            return None
+
+        ordered = np.sort(rssi)
+        cut = int(count * trim)
+        trimmed = ordered[cut:count - cut] if count - 2 * cut > 0 else ordered
+
+        span = timestamps[-1] - timestamps[0]
+        rate = (count - 1) / span if span > 0 else 0.0
+
+        return {
+            'count': count,
+            'rate': float(rate),
+            'median': float(np.median(ordered)),
+            'trimmed_mean': float(trimmed.mean()),
+            'percentile': float(np.percentile(ordered, percentile)),
+            'mean': float(ordered.mean()),
+            'std': float(ordered.std()),
+            'last': float(rssi[-1]),
+            'first_timestamp': float(timestamps[0]),
+            'last_timestamp': float(timestamps[-1])
+        }
+
+    def clear(self):
+        """清空采样"""
+        self._next = 0
+        self.size = 0
+
+
+class ScanTarget:
+    """
+    自适应扫描的提前结束条件
+
+    统计本次扫描中每个目标 beacon 的采样数，当足够多的 beacon 达到目标采样数时触发事件。
+    """
+
+    def __init__(self, min_samples: int, targets: Optional[Iterable[int]] = None,
+                 min_beacons: Optional[int] = None):
+        """
+        Args:
+            min_samples: 每个 beacon 需要的采样数
+            targets: 目标 beacon 的 key 集合，None 表示任意 beacon
+            min_beacons: 需要达到采样数的 beacon 数量，None 表示全部目标（无目标时为 1）
+        """
+        self.min_samples = min_samples
+        self.targets = frozenset(targets) if targets is not None else None
+        if min_beacons is None:
+            min_beacons = len(self.targets) if self.targets else 1
+        if self.targets is not None:
+            min_beacons = min(min_beacons, len(self.targets))
+        self.min_beacons = max(min_beacons, 1)
+        self.counts: Dict[int, int] = {}
+        self.satisfied = 0
+        self.done = asyncio.Event()
+
+    def add(self, key: int):
+        """记录一个采样"""
+        if self.targets is not None and key not in self.targets:
+            return
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        if count == self.min_samples:
+            self.satisfied += 1
+            if self.satisfied >= self.min_beacons:
+                self.done.set()
+
+
+class AdvertisementStream:
+    """
+    逐包推送的广播事件流
+
+    检测回调以非阻塞方式写入有界队列，消费者通过 async for 读取。
+    队列满时按溢出策略处理，慢速消费者不会阻塞 BLE 回调：
+    - drop_oldest：丢弃队列中最旧的事件
+    - drop_newest：丢弃新到达的事件
+    - coalesce：同一 beacon 尚未被消费的事件只保留最新一条
+
+    有限的回放/合成数据源送达全部数据或扫描会话停止时事件流关闭，
+    队列中剩余的事件读完后 async for 结束。
+    """
 
-        return distance
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+    COALESCE = 'coalesce'
+    OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+    def __init__(self, scanner: 'IBeaconScanner', maxsize: int = 256,
+                 overflow: str = DROP_OLDEST):
+        """
+        初始化事件流
+
+        Args:
+            scanner: 事件来源扫描器
+            maxsize: 队列容量
+            overflow: 溢出策略（drop_oldest / drop_newest / coalesce）
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow}")
+        if maxsize <= 0:
+            raise ValueError("maxsize 必须大于 0")
+
+        self.scanner = scanner
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._pending: Dict[int, dict] = {}  # coalesce 模式下 {key: 最新事件}
+        self._opened = False
+        self._owns_session = False
+        self._closed = False
+
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def put(self, event: dict):
+        """
+        写入一个事件（由检测回调调用，不会阻塞）
+
+        Args:
+            event: {beacon_data, distance, timestamp}
+        """
+        if self._closed:
+            return
+        self.received += 1
+
+        if self.overflow == self.COALESCE:
+            key = event['beacon_data'].key
+            if key in self._pending:
+                self._pending[key] = event
+                self.coalesced += 1
+                return
+            if self.queue.full():
+                self.dropped += 1
+                return
+            self._pending[key] = event
+            self.queue.put_nowait(key)
+            return
+
+        if self.queue.full():
+            self.dropped += 1
+            if self.overflow == self.DROP_NEWEST:
+                return
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Optional[dict]:
+        """等待并返回下一个事件，事件流已关闭且没有剩余事件时返回 None"""
+        if self._closed and self.queue.empty():
+            return None
+        item = await self.queue.get()
+        if item is None:
+            return None
+        if self.overflow == self.COALESCE:
+            item = self._pending.pop(item)
+        self.delivered += 1
+        return item
+
+    def close(self):
+        """关闭事件流（数据源结束或扫描会话停止时由扫描器调用），不再接收新事件"""
+        if self._closed:
+            return
+        self._closed = True
+        if self.queue.empty():
+            # 唤醒正在等待的消费者；队列非空时消费者读完剩余事件后自然结束
+            self.queue.put_nowait(None)
+
+    async def open(self):
+        """注册到扫描器，必要时启动扫描会话"""
+        if self._opened:
+            return
+        self._opened = True
+        self._owns_session = not self.scanner.running
+        self.scanner._streams.add(self)
+        await self.scanner.start()
+        self.scanner._scanner.set_lockstep(True)
+
+    async def aclose(self):
+        """注销事件流，如果扫描会话由本流启动且没有其他流则停止会话"""
+        if not self._opened:
+            return
+        self._opened = False
+        self.scanner._streams.discard(self)
+        if not self.scanner._streams and self.scanner._scanner is not None:
+            self.scanner._scanner.set_lockstep(False)
+        if self._owns_session and not self.scanner._streams:
+            await self.scanner.stop()
+
+    def stats(self) -> dict:
+        """返回事件流统计信息"""
+        return {
+            'received': self.received,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'queued': self.queue.qsize()
+        }
+
+    def __aiter__(self) -> 'AdvertisementStream':
+        return self
+
+    async def __anext__(self) -> dict:
+        if not self._opened:
+            await self.open()
+        event = await self.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    async def __aenter__(self) -> 'AdvertisementStream':
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
 
 
 class IBeaconScanner:
-    """iBeacon 扫描器"""
+    """
+    iBeacon 扫描器
 
-    def __init__(self, environment_factor: float = 2.5):
+    支持两种用法：
+    - scan(duration)：单次扫描一个时间窗口
+    - start() 启动长期扫描会话，随后按任意频率调用 snapshot(window)
+      获取最近 window 秒内检测到的 beacon，避免反复启停适配器造成的延迟和漏包
+    - stream() 逐包读取解析后的广播事件
+    """
+
+    def __init__(self, environment_factor: float = 2.5, source: Optional[dict] = None,
+                 sample_capacity: int = 128, rssi_statistic: str = 'median'):
         """
         初始化扫描器
 
         Args:
             environment_factor: 环境衰减因子
+            source: 广播数据源配置（见 advertisement_source.create_source），None 表示蓝牙适配器
+            sample_capacity: 每个 beacon 保留的 RSSI 采样数
+            rssi_statistic: 窗口结果估算距离使用的 RSSI 统计量
+                            （median / trimmed_mean / percentile / mean / last）
         """
+        if rssi_statistic not in RssiSampleWindow.STATISTICS:
+            raise ValueError(f"未知的 RSSI 统计量: {rssi_statistic}")
+
         self.environment_factor = environment_factor
-        self.distance_estimator = DistanceEstimator()
-        self.beacons: Dict[tuple, dict] = {}  # {(uuid, major, minor): {data, distance}}
+        self.source = source
+        self.sample_capacity = sample_capacity
+        self.rssi_statistic = rssi_statistic
+        self.distance_estimator = DistanceEstimator(environment_factor)
+        self.beacons: Dict[int, dict] = {}  # {IBeaconData.key: 最新一包 {data, distance}}
+        self.samples: Dict[int, RssiSampleWindow] = {}  # {IBeaconData.key: RSSI 采样窗口}
+        self.parse_cache = IBeaconParseCache()
+        self._scanner: Optional[AdvertisementSource] = None  # 数据源，创建后在多次启停间复用
+        self._scanning = False
+        self._streams: Set[AdvertisementStream] = set()
+        self._scan_target: Optional[ScanTarget] = None  # 自适应扫描的提前结束条件
+        self._last_timestamp = -math.inf  # 最新一包的时间戳
+
+    def _detection_callback(self, device, advertisement_data):
+        """BLE 设备检测回调"""
+        # 解析 iBeacon 数据
+        beacon_data = self.parse_cache.parse(
+            advertisement_data.manufacturer_data,
+            advertisement_data.rssi,
+            advertisement_data.service_data
+        )
+
+        if beacon_data:
+            # 估算距离
+            distance = self.distance_estimator.estimate_distance(
+                beacon_data.rssi,
+                beacon_data.tx_power,
+                self.environment_factor
+            )
 
-    async def scan(self, duration: float = 5.0) -> Dict[tuple, dict]:
+            # 存储 beacon 数据
+            timestamp = self.time()
+            self._last_timestamp = timestamp
+            event = {
+                'beacon_data': beacon_data,
+                'distance': distance,
+                'timestamp': timestamp
+            }
+            self.beacons[beacon_data.key] = event
+
+            # 记录 RSSI 采样
+            window = self.samples.get(beacon_data.key)
+            if window is None:
+                window = self.samples[beacon_data.key] = RssiSampleWindow(self.sample_capacity)
+            window.add(timestamp, beacon_data.rssi)
+
+            if self._scan_target is not None:
+                self._scan_target.add(beacon_data.key)
+                if self._scan_target.done.is_set():
+                    # 虚拟时间停在达到目标的这一包，剩余数据留给下一个窗口
+                    self._scanner.hold()
+
+            # 推送到事件流
+            for stream in self._streams:
+                stream.put(event)
+
+    def time(self) -> float:
+        """扫描时钟（回放/合成数据源加速时为虚拟时间）"""
+        if self._scanner is not None:
+            return self._scanner.time()
+        return time.monotonic()
+
+    def sleep(self, duration: float) -> Awaitable[None]:
+        """
+        按扫描时钟等待 duration 秒（返回可等待对象）
+
+        回放/合成数据源以尽可能快的速度（speed 为 0）运行时，
+        数据源随调用者推进虚拟时间，等待结束时这段时间内的广播都已送达
+        """
+        if self._scanner is not None:
+            return self._scanner.sleep(duration)
+        return asyncio.sleep(duration)
+
+    @property
+    def finished(self) -> bool:
+        """有限的回放/合成数据源是否已全部送达"""
+        return self._scanner is not None and self._scanner.finished
+
+    @property
+    def running(self) -> bool:
+        """扫描会话是否在运行"""
+        return self._scanning
+
+    async def start(self):
+        """启动长期扫描会话（已在运行时不做任何操作）"""
+        if self._scanning:
+            return
+
+        self.beacons.clear()
+        self.samples.clear()
+        if self._scanner is None:
+            self._scanner = create_source(self.source, detection_callback=self._detection_callback)
+            self._scanner.set_finished_callback(self._close_streams)
+        self._scanning = True
+        await self._scanner.start()
+
+    async def stop(self):
+        """停止扫描会话"""
+        if not self._scanning:
+            return
+
+        self._scanning = False
+        await self._scanner.stop()
+        self._close_streams()
+
+    def _close_streams(self):
+        """结束所有事件流（数据源送达全部数据或会话停止）"""
+        for stream in list(self._streams):
+            stream.close()
+
+    async def close(self):
+        """停止扫描会话并释放数据源（关闭抓包记录文件等），再次 start() 时重新创建数据源"""
+        await self.stop()
+        if self._scanner is not None:
+            scanner, self._scanner = self._scanner, None
+            await scanner.close()
+
+    async def __aenter__(self) -> 'IBeaconScanner':
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def snapshot(self, window: Optional[float] = None) -> Dict[int, dict]:
+        """
+        获取滑动时间窗口内检测到的 beacon
+
+        每个 beacon 使用窗口内的全部 RSSI 采样，距离由 rssi_statistic 指定的统计量估算。
+
+        Args:
+            window: 时间窗口（秒），None 表示使用缓冲区中的全部采样
+
+        Returns:
+            iBeacon 字典 {IBeaconData.key: {beacon_data, distance, timestamp, rssi, stats}}
+            beacon_data 为最新一包，rssi 为窗口统计量，stats 为 RssiSampleWindow.statistics()
+        """
+        cutoff = None if window is None else self.time() - window
+
+        result = {}
+        for key, latest in self.beacons.items():
+            if cutoff is not None and latest['timestamp'] < cutoff:
+                continue
+
+            stats = self.samples[key].statistics(since=cutoff)
+            if stats is None:
+                continue
+
+            beacon_data = latest['beacon_data']
+            rssi = stats[self.rssi_statistic]
+            result[key] = {
+                'beacon_data': beacon_data,
+                'distance': self.distance_estimator.estimate_distance(
+                    rssi, beacon_data.tx_power, self.environment_factor
+                ),
+                'timestamp': latest['timestamp'],
+                'rssi': rssi,
+                'stats': stats
+            }
+        return result
+
+    def stream(self, maxsize: int = 256,
+               overflow: str = AdvertisementStream.DROP_OLDEST) -> AdvertisementStream:
+        """
+        创建逐包广播事件流
+
+        用法:
+            async with scanner.stream(maxsize=64, overflow='coalesce') as events:
+                async for event in events:
+                    ...
+
+        也可以直接 async for，首次迭代时自动启动扫描会话。
+
+        Args:
+            maxsize: 队列容量
+            overflow: 溢出策略（drop_oldest / drop_newest / coalesce）
+
+        Returns:
+            AdvertisementStream 异步迭代器，事件格式与 snapshot() 的值相同
+        """
+        return AdvertisementStream(self, maxsize=maxsize, overflow=overflow)
+
+    async def scan(self, duration: float = 5.0, min_samples: int = 0,
+                   targets: Optional[Iterable[int]] = None,
+                   min_beacons: Optional[int] = None) -> Dict[int, dict]:
         """
         扫描 iBeacon 设备
 
+        扫描会话已在运行时不会重启适配器，只等待窗口结束后返回该窗口内的结果。
+
+        min_samples > 0 时为自适应扫描：当 targets 中的 beacon（或其中 min_beacons 个）
+        都收到 min_samples 个采样时立即结束窗口，duration 只作为超时时间。
+
         Args:
-            duration: 扫描持续时间（秒）
+            duration: 扫描持续时间（秒），自适应扫描时为超时时间
+            min_samples: 每个 beacon 的目标采样数，0 表示固定时长扫描
+            targets: 目标 beacon 的 key 集合，None 表示任意 beacon
+            min_beacons: 需要达到目标采样数的 beacon 数量，None 表示全部目标
 
         Returns:
-            扫描到的 iBeacon 字典 {(uuid, major, minor): {beacon_data, distance}}
+            扫描到的 iBeacon 字典 {IBeaconData.key: {beacon_data, distance}}
         """
-        self.beacons.clear()
+        was_running = self.running
+        if not was_running:
+            await self.start()
 
-        def detection_callback(device, advertisement_data):
-            """BLE 设备检测回调"""
-            # 解析 iBeacon 数据
-            beacon_data = IBeaconParser.parse(
-                advertisement_data.manufacturer_data,
-                advertisement_data.rssi
-            )
+        # 窗口从最新一包之后开始：回放/合成数据源落后于时钟时，
+        # 积压的数据时间戳早于当前时钟，但仍属于本次窗口
+        window_start = min(self.time(), math.nextafter(self._last_timestamp, math.inf))
+        try:
+            if min_samples > 0:
+                self._scan_target = ScanTarget(min_samples, targets, min_beacons)
+                # 用 asyncio.wait 而不是 wait_for：目标恰好达成时 wait_for 可能吞掉外部的取消
+                waiter = asyncio.ensure_future(self._scan_target.done.wait())
+                sleeper = asyncio.ensure_future(self.sleep(duration))
+                try:
+                    await asyncio.wait({waiter, sleeper}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                    sleeper.cancel()
+                    self._scan_target = None
+            else:
+                await self.sleep(duration)
+        finally:
+            if not was_running:
+                await self.stop()
 
-            if beacon_data:
-                # 估算距离
-                distance = self.distance_estimator.estimate_distance(
-                    beacon_data.rssi,
-                    beacon_data.tx_power,
-                    self.environment_factor
-                )
-
-                # 存储 beacon 数据
-                key = (beacon_data.uuid, beacon_data.major, beacon_data.minor)
-                self.beacons[key] = {
-                    'beacon_data': beacon_data,
-                    'distance': distance,
-                    'timestamp': asyncio.get_event_loop().time()
-                }
-
-        # 执行扫描
-        scanner = BleakScanner(detection_callback=detection_callback)
-        await scanner.start()
-        await asyncio.sleep(duration)
-        await scanner.stop()
-
-        return self.beacons
-
-    async def scan_continuous(self, callback: Callable[[Dict[tuple, dict]], None],
+        if not was_running:
+            return self.snapshot()
+        return self.snapshot(self.time() - window_start)
+
+    async def scan_continuous(self, callback: Callable[[Dict[int, dict]], None],
                              interval: float = 1.0):
         """
         持续扫描 iBeacon
 
+        在同一个扫描会话中每隔 interval 秒回调一次最近 interval 秒的结果，
+        两次回调之间不会停止扫描。
+
         Args:
             callback: 扫描结果回调函数
             interval: 扫描间隔（秒）
         """
-        while True:
-            beacons = await self.scan(duration=interval)
-            if beacons:
-                callback(beacons)
-            await asyncio.sleep(0.1)  # 短暂暂停避免 CPU 占用过高
+        owns_session = not self.running
+        await self.start()
+        try:
+            while not self.finished:
+                await self.sleep(interval)
+                beacons = self.snapshot(interval)
+                if beacons:
+                    callback(beacons)
+        finally:
+            if owns_session:
+                await self.stop()
@@ -0,0 +1,75 @@
+"""
+LRU 缓存基类
+解析缓存、beacon 子集分解缓存和求解结果缓存共用的有界 LRU 存储与命中统计
+"""
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """
+    有界 LRU 缓存基类
+
+    条目保存在 OrderedDict 中，最近使用的在末尾，超出 maxsize 时淘汰最久未使用的条目，
+    并统计命中、未命中和淘汰次数。子类通过 _lookup() / _store() 读写条目。
+    """
+
+    def __init__(self, maxsize: int):
+        """
+        初始化缓存
+
+        Args:
+            maxsize: 最大缓存条目数
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize 必须大于 0")
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable) -> Optional[Any]:
+        """查询条目并记录命中/未命中，命中时标记为最近使用，未命中返回 None"""
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: Hashable, value: Any):
+        """写入条目（标记为最近使用），超出容量时淘汰最久未使用的条目"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def hit_rate(self) -> float:
+        """缓存命中率 (0~1)"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        """返回缓存统计信息"""
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate
+        }
+
+    def clear(self):
+        """清空缓存与统计"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,12 +1,18 @@
 """
 iBeacon 室内 3D 定位系统主程序
 """
+import argparse
 import asyncio
 import json
 import numpy as np
-from typing import Dict
+from typing import Dict, Optional
 from ibeacon_scanner import IBeaconScanner
-from positioning_3d import Position3D, KalmanFilter3D
+from ibeacon_parser import IBeaconData
+from advertisement_source import add_source_arguments, source_spec_from_args
+from positioning_3d import (Position3D, KalmanFilter3D, ConstantVelocityKalmanFilter3D,
+                            AnchorSubsetCache, SolveCache, AnchorIndex, FixQuality, GridLocator, ParticleFilter3D,
+                            RangeExtendedKalmanFilter3D)
+from fingerprint import RadioMap, FingerprintLocator
 from visualizer_3d import Visualizer3D
 import signal
 import sys
@@ -15,44 +21,125 @@ import sys
 class IBeaconPositioningSystem:
     """iBeacon 定位系统主类"""
 
-    def __init__(self, config_file: str = 'beacon_config.json'):
+    # outlier_rejection 为 auto 时启用 RANSAC 所需的最少 beacon 数
+    RANSAC_MIN_BEACONS = 5
+
+    def __init__(self, config_file: str = 'beacon_config.json', source_args=None):
         """
         初始化定位系统
 
         Args:
             config_file: 配置文件路径
+            source_args: 命令行数据源参数（add_source_arguments 的解析结果），
+                         None 表示只使用配置文件中的 "source" 项
         """
         # 加载配置
         with open(config_file, 'r', encoding='utf-8') as f:
             self.config = json.load(f)
 
+        # 广播数据源：命令行参数优先于配置文件
+        source = None
+        if source_args is not None or 'source' in self.config:
+            source = source_spec_from_args(source_args, self.config)
+
         # 初始化组件
         self.scanner = IBeaconScanner(
-            environment_factor=self.config['environment_factor']
+            environment_factor=self.config['environment_factor'],
+            source=source,
+            rssi_statistic=self.config.get('rssi_statistic', 'median')
         )
         self.position_calculator = Position3D()
-        self.kalman_filter = KalmanFilter3D(
-            process_variance=1e-3,
-            measurement_variance=1.5
-        )
+        # 平滑模型：static（位置不变）或 constant_velocity（匀速，减小移动目标的滞后）
+        if self.config.get('kalman_model', 'static') == 'constant_velocity':
+            self.kalman_filter = ConstantVelocityKalmanFilter3D(
+                process_noise=self.config.get('kalman_process_noise', 0.5),
+                measurement_variance=1.5
+            )
+        else:
+            self.kalman_filter = KalmanFilter3D(
+                process_variance=1e-3,
+                measurement_variance=1.5
+            )
+        self.last_fix_time = None
 
         # 构建 beacon 位置映射
         self.beacon_positions = {}
-        self.beacon_map = {}  # {(uuid, major, minor): {'name': ..., 'position': ...}}
+        self.beacon_map = {}  # {IBeaconData.key: {'name': ..., 'position': ..., 'index': ...}}
 
-        for beacon in self.config['beacons']:
-            key = (beacon['uuid'], beacon['major'], beacon['minor'])
+        for index, beacon in enumerate(self.config['beacons']):
+            key = IBeaconData.make_key(beacon['uuid'], beacon['major'], beacon['minor'])
             position = np.array(beacon['position'])
             name = beacon['name']
 
             self.beacon_map[key] = {
                 'name': name,
-                'position': position
+                'position': position,
+                'index': index
             }
             self.beacon_positions[name] = position
 
-        # 初始化可视化器
+        # beacon 子集分解缓存（位掩码的第 i 位对应配置中的第 i 个 beacon）
+        self.anchor_cache = AnchorSubsetCache(
+            np.array([beacon['position'] for beacon in self.config['beacons']], dtype=np.float64),
+            maxsize=self.config.get('anchor_cache_size', 64)
+        )
+
+        # 量化求解结果缓存：静止时连续几次的子集和距离几乎相同，命中时不调用优化器
+        self.solve_cache = None
+        if self.config.get('solve_cache_size', 256) > 0:
+            self.solve_cache = SolveCache(
+                resolution=self.config.get('solve_cache_resolution', 0.05),
+                maxsize=self.config.get('solve_cache_size', 256),
+                ttl=self.config.get('solve_cache_ttl', 5.0),
+                clock=self.scanner.time
+            )
+
+        # beacon 空间索引：以上一个位置为中心只使用附近的 beacon（大型场所）
+        self.anchor_index = AnchorIndex(self.anchor_cache.anchors)
+        self.beacon_keys = [IBeaconData.make_key(beacon['uuid'], beacon['major'], beacon['minor'])
+                            for beacon in self.config['beacons']]  # 第 i 个 beacon 的 key
+        self.anchor_reach = self.config.get('anchor_reach', 30.0)
+
+        # 定位模式：trilateration（路径损耗 + 三边测量）、grid（网格似然）、
+        # fingerprint（指纹地图 k 近邻），或逐包更新的 particle（粒子滤波）/ ekf（距离域扩展卡尔曼滤波）
         room_size = self.config.get('room_size', [20, 15, 5])
+        self.positioning_mode = self.config.get('positioning_mode', 'trilateration')
+        self.fingerprint_locator = None
+        self.grid_locator = None
+        self.range_tracker = None
+        if self.positioning_mode == 'grid':
+            self.grid_locator = GridLocator(
+                self.anchor_cache.anchors,
+                room_size,
+                resolution=self.config.get('grid_resolution', 0.5),
+                fine_resolution=self.config.get('grid_fine_resolution', 0.1),
+                sigma=self.config.get('grid_sigma', 1.0)
+            )
+        elif self.positioning_mode == 'fingerprint':
+            self.fingerprint_locator = FingerprintLocator(
+                RadioMap.load(self.config.get('radio_map', 'radio_map')),
+                k=self.config.get('fingerprint_k', 4)
+            )
+        elif self.positioning_mode == 'particle':
+            self.range_tracker = ParticleFilter3D(
+                self.anchor_cache.anchors,
+                room_size,
+                num_particles=self.config.get('particle_count', 5000),
+                process_noise=self.config.get('particle_process_noise', 0.5),
+                range_sigma=self.config.get('particle_range_sigma', 1.5)
+            )
+        elif self.positioning_mode == 'ekf':
+            self.range_tracker = RangeExtendedKalmanFilter3D(
+                self.anchor_cache.anchors,
+                process_noise=self.config.get('ekf_process_noise', 0.5),
+                range_sigma=self.config.get('ekf_range_sigma', 0.3),
+                rssi_sigma=self.config.get('ekf_rssi_sigma', 4.0),
+                room_size=room_size
+            )
+        elif self.positioning_mode != 'trilateration':
+            raise ValueError(f"未知的定位模式: {self.positioning_mode}")
+
+        # 初始化可视化器
         self.visualizer = Visualizer3D(
             beacon_positions=self.beacon_positions,
             room_size=tuple(room_size)
@@ -61,6 +148,7 @@ class IBeaconPositioningSystem:
         # 运行状态
         self.running = True
         self.current_position = None
+        self.current_quality = None
 
     def _process_scan_results(self, scanned_beacons: Dict):
         """
@@ -69,8 +157,8 @@ class IBeaconPositioningSystem:
         Args:
             scanned_beacons: 扫描到的 beacon 数据
         """
-        # 匹配扫描到的 beacon 与配置的 beacon
-        matched_beacons = []
+        # 匹配扫描到的 beacon 与配置的 beacon（按配置顺序排列，与 anchor_cache 的子集一致）
+        matched = []
         beacon_distances = {}
 
         for key, data in scanned_beacons.items():
@@ -80,41 +168,263 @@ class IBeaconPositioningSystem:
                 distance = data['distance']
                 name = beacon_info['name']
 
-                matched_beacons.append((position, distance))
+                matched.append((beacon_info['index'], position, distance))
                 beacon_distances[name] = distance
 
-                print(f"  {name}: {distance:.2f}m (RSSI: {data['beacon_data'].rssi}dBm)")
+                print(f"  {name}: {distance:.2f}m (RSSI: {data['rssi']:.1f}dBm, "
+                      f"{data['stats']['count']} 包, {data['stats']['rate']:.1f} 包/秒)")
+
+        if self.fingerprint_locator is not None:
+            # 指纹定位直接使用各 beacon 的 RSSI，不需要三边测量
+            self._update_position(self.fingerprint_locator.locate_scan(scanned_beacons),
+                                  beacon_distances)
+            return
 
         # 检查是否有足够的 beacon
         min_beacons = self.config.get('min_beacons_required', 3)
-        if len(matched_beacons) < min_beacons:
-            print(f"⚠ 检测到的 beacon 数量不足 ({len(matched_beacons)}/{min_beacons})，无法定位")
+        matched = self._select_anchors(matched, min_beacons)
+        if len(matched) < min_beacons:
+            print(f"⚠ 检测到的 beacon 数量不足 ({len(matched)}/{min_beacons})，无法定位")
             return
 
-        # 过滤异常值
-        filtered_beacons = self.position_calculator.filter_outliers(
-            matched_beacons,
-            max_distance=50.0
-        )
+        matched.sort(key=lambda item: item[0])
+        matched_beacons = [(position, distance) for _, position, distance in matched]
+
+        # 过滤异常值：ransac 在最小 beacon 子集上投票剔除多径等造成的异常距离，
+        # range 只剔除超出 (0, 50) 米的距离；auto（默认）在至少 RANSAC_MIN_BEACONS 个 beacon 时使用 ransac。
+        # beacon 较少时最小子集几乎就是全部 beacon，投票没有冗余，干净数据上反而会丢掉部分定位
+        outlier_rejection = self.config.get('outlier_rejection', 'auto')
+        if outlier_rejection == 'auto':
+            outlier_rejection = 'ransac' if len(matched_beacons) >= self.RANSAC_MIN_BEACONS else 'range'
+        if outlier_rejection == 'ransac':
+            filtered_beacons, keep = self.position_calculator.ransac_filter(
+                matched_beacons,
+                threshold=self.config.get('ransac_threshold'),
+                time_budget=self.config.get('ransac_time_budget', 0.002),
+                return_mask=True
+            )
+        else:
+            filtered_beacons, keep = self.position_calculator.filter_outliers(
+                matched_beacons,
+                max_distance=50.0,
+                return_mask=True
+            )
 
         if len(filtered_beacons) < min_beacons:
             print(f"⚠ 过滤后的 beacon 数量不足 ({len(filtered_beacons)}/{min_beacons})，无法定位")
             return
 
-        # 计算位置（使用最小二乘法）
-        raw_position = self.position_calculator.least_squares_3d(filtered_beacons)
+        subset_indices = [index for (index, _, _), kept in zip(matched, keep) if kept]
+        filtered_distances = [distance for _, distance in filtered_beacons]
+        subset_mask = AnchorSubsetCache.mask_of(subset_indices)
+
+        if self.grid_locator is not None:
+            # 网格似然定位：整个房间一次广播计算，耗时固定
+            raw_position = self.grid_locator.locate(
+                filtered_distances, subset_indices, estimate=self.config.get('grid_estimate', 'argmax')
+            )
+            quality = None
+            if raw_position is not None and len(subset_indices) >= 3:
+                quality = self.anchor_cache.quality(subset_mask, filtered_distances, raw_position)
+            self._update_position(raw_position, beacon_distances, quality)
+            return
+
+        # 计算位置（使用最小二乘法，几何条件良好时直接使用线性解；
+        # 以滤波器的预测位置热启动，结果发散时自动冷启动）。
+        # 少于 3 个 beacon（min_beacons_required 小于 3）时没有线性解和几何精度因子，
+        # 限时求解退化为加权平均，否则无法定位
+        prediction = self.kalman_filter.predict(self._time_since_last_fix())
+        trilaterable = len(subset_indices) >= 3
+        linear_solution = None
+        if trilaterable:
+            linear_solution = self.anchor_cache.linear_solve(
+                subset_mask, filtered_distances, return_condition=True
+            )
+
+        # 求解前用预测位置（尚无预测时用线性解）评估几何精度因子，
+        # 几何太差、结果反正会被丢弃时跳过求解和显示更新
+        max_hdop = self.config.get('max_hdop')
+        if max_hdop is not None and trilaterable:
+            probe = prediction if prediction is not None else linear_solution[0]
+            predicted_quality = self.anchor_cache.quality(subset_mask, filtered_distances, probe)
+            if predicted_quality.hdop > max_hdop:
+                print(f"⚠ 几何精度因子过大 (HDOP {predicted_quality.hdop:.1f} > {max_hdop})，跳过本次定位")
+                return
+
+        warm_prediction = prediction if self.config.get('warm_start', True) else None
+        time_budget = self.config.get('time_budget')
+
+        def solve():
+            if time_budget is not None:
+                # 限时求解：按几何条件和剩余预算选择算法，超时返回目前最好的结果
+                result = self.position_calculator.solve_with_deadline(
+                    filtered_beacons,
+                    time_budget,
+                    prediction=warm_prediction,
+                    solver=self.config.get('solver', 'nelder_mead'),
+                    linear_fast_path=self.config.get('linear_fast_path', True),
+                    linear_solution=linear_solution
+                )
+                if result.truncated:
+                    print(f"⚠ 求解超出时间预算 ({time_budget * 1000:.1f}ms)，"
+                          f"使用 {result.method} 目前最好的结果")
+                return result
+            return self.position_calculator.warm_start_3d(
+                filtered_beacons,
+                warm_prediction,
+                linear_fast_path=self.config.get('linear_fast_path', True),
+                solver=self.config.get('solver', 'nelder_mead'),
+                linear_solution=linear_solution,
+                return_result=True
+            )
+
+        # 超出时间预算被截断的结果不写入缓存
+        if self.solve_cache is not None:
+            raw_position = self.solve_cache.solve(subset_mask, filtered_distances, solve)
+        else:
+            result = solve()
+            raw_position = None if result is None else result.position
+        quality = None
+        if raw_position is not None and trilaterable:
+            quality = self.anchor_cache.quality(subset_mask, filtered_distances, raw_position)
+        self._update_position(raw_position, beacon_distances, quality)
+
+    def _select_anchors(self, matched, min_beacons: int):
+        """
+        以上一个位置为中心，从检测到的 beacon 中选出交给求解器的 beacon：
+        剔除超出 anchor_reach 的远处 beacon，最多保留 max_anchors 个最近的 beacon
+
+        Args:
+            matched: [(beacon 编号, 位置, 距离), ...]
+            min_beacons: 定位所需的最少 beacon 数量
+
+        Returns:
+            筛选后的列表；剩余数量不足（例如标签已移动到其他区域、跟丢）时原样返回
+        """
+        if self.current_position is None or not matched:
+            return matched
+
+        keep = self.anchor_index.select(
+            [index for index, _, _ in matched],
+            self.current_position,
+            max_anchors=self.config.get('max_anchors', 8),
+            reach=self.anchor_reach
+        )
+        if keep.all():
+            return matched
+
+        selected = [item for item, kept in zip(matched, keep) if kept]
+        if len(selected) < min_beacons:
+            return matched
+        return selected
+
+    def _scan_targets(self):
+        """自适应扫描等待的 beacon：已定位时只等待 anchor_reach 范围内的 beacon"""
+        if self.current_position is not None:
+            indices = self.anchor_index.within(self.current_position, self.anchor_reach)
+            if len(indices):
+                return [self.beacon_keys[index] for index in indices]
+        return self.beacon_map.keys()
+
+    def _time_since_last_fix(self) -> float:
+        """距上一次定位的时间（秒，数据源时钟），尚未定位时为 0"""
+        if self.last_fix_time is None:
+            return 0.0
+        return self.scanner.time() - self.last_fix_time
+
+    def _update_position(self, raw_position, beacon_distances: Dict[str, float],
+                         quality: Optional[FixQuality] = None):
+        """
+        平滑新的位置估算并更新显示
+
+        Args:
+            raw_position: 定位算法给出的位置，None 表示本次无法定位
+            beacon_distances: {beacon 名称: 距离}，用于可视化
+            quality: 本次定位的质量，残差超过 max_residual_rms 时丢弃本次定位
+        """
+        if quality is not None:
+            self.current_quality = quality
+            max_residual_rms = self.config.get('max_residual_rms')
+            if max_residual_rms is not None and quality.residual_rms > max_residual_rms:
+                print(f"⚠ 残差过大 ({quality.residual_rms:.2f}m > {max_residual_rms}m)，丢弃本次定位")
+                return
 
         if raw_position is not None:
             # 使用卡尔曼滤波平滑位置
-            smoothed_position = self.kalman_filter.update(raw_position)
+            dt = self._time_since_last_fix()
+            self.last_fix_time = self.scanner.time()
+            smoothed_position = self.kalman_filter.update(raw_position, dt)
             self.current_position = smoothed_position
 
             print(f"📍 估算位置: X={smoothed_position[0]:.2f}m, "
                   f"Y={smoothed_position[1]:.2f}m, Z={smoothed_position[2]:.2f}m")
+            if quality is not None:
+                sigma = np.sqrt(quality.covariance.diagonal())
+                print(f"   GDOP {quality.gdop:.1f} (HDOP {quality.hdop:.1f}, VDOP {quality.vdop:.1f}), "
+                      f"残差 RMS {quality.residual_rms:.2f}m, "
+                      f"σ ±{sigma[0]:.2f}/{sigma[1]:.2f}/{sigma[2]:.2f}m")
 
             # 更新可视化
             self.visualizer.update(smoothed_position, beacon_distances)
 
+    async def _run_range_tracker(self, update_interval: float):
+        """
+        逐包跟踪模式（particle / ekf）：每收到一包广播就用该 beacon 的测量更新一次跟踪器，
+        不需要凑齐 min_beacons_required 个 beacon，每 update_interval 秒输出并显示一次位置
+
+        Args:
+            update_interval: 位置输出间隔（秒，数据源时钟）
+        """
+        tracker = self.range_tracker
+        # ekf 可以直接以 RSSI 作为观测（噪声在 dB 域近似高斯）
+        use_rssi = (self.positioning_mode == 'ekf'
+                    and self.config.get('ekf_measurement', 'range') == 'rssi')
+        environment_factor = self.config['environment_factor']
+        last_timestamp = None
+        next_update = None
+        beacon_distances = {}
+
+        # coalesce：处理跟不上时同一 beacon 只保留最新一包
+        async with self.scanner.stream(maxsize=len(self.beacon_map),
+                                       overflow='coalesce') as events:
+            async for event in events:
+                if not self.running:
+                    break
+
+                beacon_data = event['beacon_data']
+                beacon_info = self.beacon_map.get(beacon_data.key)
+                if beacon_info is None:
+                    continue
+                # 离当前估算位置太远的 beacon 不可能收到，视为误检
+                if not self.anchor_index.select([beacon_info['index']], tracker.estimated_position,
+                                                reach=self.anchor_reach)[0]:
+                    continue
+
+                timestamp = event['timestamp']
+                if last_timestamp is not None:
+                    tracker.propagate(timestamp - last_timestamp)
+                last_timestamp = timestamp
+
+                distance = event['distance']
+                if use_rssi:
+                    position = tracker.update_rssi(beacon_info['index'], beacon_data.rssi,
+                                                   beacon_data.tx_power, environment_factor)
+                else:
+                    position = tracker.update_range(beacon_info['index'], distance)
+                beacon_distances[beacon_info['name']] = distance
+
+                if next_update is None:
+                    next_update = timestamp + update_interval
+                elif timestamp >= next_update:
+                    next_update = timestamp + update_interval
+                    self.current_position = position.copy()
+                    spread = tracker.spread()
+                    print(f"\n{'='*60}")
+                    print(f"📍 估算位置: X={position[0]:.2f}m, Y={position[1]:.2f}m, Z={position[2]:.2f}m "
+                          f"(±{spread[0]:.2f}/{spread[1]:.2f}/{spread[2]:.2f}m, "
+                          f"{len(beacon_distances)} 个 beacon)")
+                    self.visualizer.update(position, beacon_distances)
+
     async def run(self):
         """运行定位系统"""
         print("=" * 60)
@@ -122,20 +432,48 @@ class IBeaconPositioningSystem:
         print("=" * 60)
         print(f"配置的 Beacon 数量: {len(self.beacon_map)}")
         print(f"环境衰减因子: {self.config['environment_factor']}")
-        print(f"扫描间隔: {self.config['scan_interval']}秒")
+        # 滑动窗口长度与位置更新间隔相互独立
+        scan_window = self.config.get('scan_window', self.config.get('scan_interval', 1.0))
+        update_interval = self.config.get('update_interval', scan_window)
+
+        # 自适应扫描：每个配置的 beacon 收到足够采样后立即结束窗口，scan_window 作为超时
+        adaptive = self.config.get('adaptive_scan') or {}
+        min_samples = adaptive.get('min_samples', 0)
+        min_beacons = adaptive.get('min_beacons')
+
+        print(f"扫描窗口: {scan_window}秒")
+        if min_samples > 0:
+            print(f"自适应扫描: 每个 beacon {min_samples} 个采样"
+                  f"（至少 {min_beacons or len(self.beacon_map)} 个 beacon）")
+        else:
+            print(f"更新间隔: {update_interval}秒")
         print("按 Ctrl+C 停止程序")
         print("=" * 60)
         print()
 
-        scan_interval = self.config.get('scan_interval', 1.0)
-
         try:
-            while self.running:
-                print(f"\n{'='*60}")
-                print("🔍 正在扫描 iBeacon...")
+            # 扫描会话在整个运行期间保持开启
+            await self.scanner.start()
+            print("🔍 扫描会话已启动")
+
+            if self.range_tracker is not None:
+                await self._run_range_tracker(update_interval)
+
+            # 有限的回放/合成数据源送达全部数据后，处理完最后一个窗口即结束
+            while self.running and not self.scanner.finished:
+                if min_samples > 0:
+                    beacons = await self.scanner.scan(
+                        duration=scan_window,
+                        min_samples=min_samples,
+                        targets=self._scan_targets(),
+                        min_beacons=min_beacons
+                    )
+                else:
+                    await self.scanner.sleep(update_interval)
+                    # 获取最近 scan_window 秒内的 beacon
+                    beacons = self.scanner.snapshot(scan_window)
 
-                # 扫描 beacon
-                beacons = await self.scanner.scan(duration=scan_interval)
+                print(f"\n{'='*60}")
 
                 if beacons:
                     print(f"✓ 检测到 {len(beacons)} 个 iBeacon:")
@@ -143,12 +481,10 @@ class IBeaconPositioningSystem:
                 else:
                     print("⚠ 未检测到任何 iBeacon")
 
-                # 短暂暂停
-                await asyncio.sleep(0.1)
-
         except KeyboardInterrupt:
             print("\n\n正在停止...")
         finally:
+            await self.scanner.close()
             self.stop()
 
     def stop(self):
@@ -169,11 +505,17 @@ def signal_handler(sig, frame):
 
 async def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='iBeacon 室内 3D 定位系统')
+    parser.add_argument('-c', '--config', type=str, default='beacon_config.json',
+                        help='配置文件路径（默认: beacon_config.json）')
+    add_source_arguments(parser)
+    args = parser.parse_args()
+
     # 注册信号处理器
     signal.signal(signal.SIGINT, signal_handler)
 
     # 创建并运行系统
-    system = IBeaconPositioningSystem('beacon_config.json')
+    system = IBeaconPositioningSystem(args.config, source_args=args)
 
     try:
         await system.run()
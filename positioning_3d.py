@@ -2,14 +2,90 @@
 3D 定位算法模块
 使用三边测量（Trilateration）和优化方法计算 3D 位置
 """
+import itertools
+import math
+import time
 import numpy as np
 from scipy.optimize import minimize
-from typing import List, Tuple, Optional
+from scipy.spatial import cKDTree
+from typing import Callable, Iterable, List, NamedTuple, Tuple, Optional
+
+from lru import LRUCache
+
+
+class SolveResult(NamedTuple):
+    """迭代求解结果"""
+    position: np.ndarray  # 估算位置 [x, y, z]
+    iterations: int       # 迭代次数
+    cost: float           # 最终加权误差 sum(w * (||x - p|| - d)^2)
+    converged: bool       # 是否收敛
+
+
+class BatchSolveResult(NamedTuple):
+    """多标签批量求解结果"""
+    positions: np.ndarray  # (T, 3) 估算位置，无法求解的标签为 NaN
+    valid: np.ndarray      # (T,) 是否有足够的 beacon 完成求解
+    iterations: int        # 批量迭代次数
+    cost: np.ndarray       # (T,) 最终加权误差
+    converged: np.ndarray  # (T,) 是否收敛
+
+
+class RobustSelection(NamedTuple):
+    """RANSAC beacon 筛选结果"""
+    inliers: np.ndarray             # (N,) 每个 beacon 是否为内点
+    position: Optional[np.ndarray]  # 得分最好的假设位置，未进行假设检验时为 None
+    hypotheses: int                 # 检验的假设数量
+    cost: float                     # 最好假设的截断残差代价
+
+
+class FixQuality(NamedTuple):
+    """定位质量"""
+    gdop: float              # 几何精度因子 sqrt(trace((H^T H)^-1))，H 为 beacon 指向位置的单位向量
+    hdop: float              # 水平精度因子（x、y）
+    vdop: float              # 垂直精度因子（z），位置在共面 beacon 的平面内时为 inf
+    residual_rms: float      # 加权残差 RMS（米）
+    covariance: np.ndarray   # 位置协方差估计 (3, 3)，不可观测方向的方差为 inf
+
+
+class StrategyResult(NamedTuple):
+    """限时求解结果（Position3D.solve_with_deadline）"""
+    position: Optional[np.ndarray]  # 估算位置，无法定位时为 None
+    method: str                     # 使用的算法：weighted / linear / gauss_newton / nelder_mead
+    iterations: int                 # 迭代次数
+    cost: float                     # 加权误差 sum(w * (||x - p|| - d)^2)
+    converged: bool                 # 是否收敛
+    truncated: bool                 # 是否因时间预算用完而提前结束
+    elapsed: float                  # 耗时（秒）
+
+
+class _DeadlineExceeded(Exception):
+    """迭代求解超过截止时刻"""
 
 
 class Position3D:
     """3D 位置计算器"""
 
+    # 线性解作为最终结果所允许的最大条件数（超过时仅作为初始值）
+    LINEAR_MAX_CONDITION = 100.0
+    # 可选的迭代求解后端
+    SOLVERS = ('nelder_mead', 'gauss_newton')
+    # 各后端默认的最大迭代次数
+    MAX_ITERATIONS = {'nelder_mead': 1000, 'gauss_newton': 50}
+    # 预测位置足够接近时（加权残差 RMS 不超过 WARM_START_RADIUS 米）使用的收紧迭代次数
+    WARM_START_RADIUS = 0.5
+    WARM_MAX_ITERATIONS = {'nelder_mead': 80, 'gauss_newton': 5}
+    # Nelder-Mead 的位置收敛容差（米）；热启动使用较松的 WARM_XATOL，
+    # 否则单纯形收缩到 1e-8 需要 100 次以上迭代，收紧的迭代次数内永远无法判定收敛
+    NELDER_MEAD_XATOL = 1e-8
+    WARM_XATOL = 1e-4
+    # 各迭代后端一次定位的典型耗时（秒），solve_with_deadline 据此选择能在剩余预算内完成的后端，
+    # 可按部署硬件调整
+    SOLVER_COST = {'gauss_newton': 0.0005, 'nelder_mead': 0.005}
+    # RANSAC：相对残差 |r - d| / (d + 0.5) 不超过该值的 beacon 视为内点
+    RANSAC_THRESHOLD = 0.35
+    # 热启动结果的加权残差 RMS 超过该值（米）时视为发散，改用冷启动
+    DIVERGENCE_RMS = 1.0
+
     @staticmethod
     def trilateration_3d(beacons: List[Tuple[np.ndarray, float]]) -> Optional[np.ndarray]:
         """
@@ -29,28 +105,355 @@ class Position3D:
         # 使用最小二乘法优化
         return Position3D.least_squares_3d(beacons)
 
+    @staticmethod
+    def linear_system(positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        构建线性化三边测量的设计矩阵
+
+        将每个球面方程 ||x - p_i||^2 = d_i^2 减去参考 beacon（第 0 个）的方程，得到
+        2 (p_i - p_0) · y = (||p_i - c||^2 - ||p_0 - c||^2) - (d_i^2 - d_0^2)，其中 y = x - c，
+        c 为所有 beacon 的中心。设计矩阵只与 beacon 位置有关。
+
+        Args:
+            positions: beacon 位置数组 (N, 3)
+
+        Returns:
+            (A, centered)：设计矩阵 (N-1, 3) 和以中心为原点的 beacon 位置 (N, 3)
+        """
+        centered = positions - positions.mean(axis=0)
+        A = 2.0 * (centered[1:] - centered[0])
+        return A, centered
+
+    @staticmethod
+    def linear_least_squares_3d(beacons: List[Tuple[np.ndarray, float]],
+                                return_condition: bool = False):
+        """
+        线性化最小二乘三边测量（闭式解）
+
+        用 lstsq 求解 linear_system 得到的线性方程组，耗时为微秒级。
+        当 beacon 共面时，垂直于该平面的分量无法确定，取 beacon 中心所在平面。
+
+        Args:
+            beacons: [(position, distance), ...] 列表
+            return_condition: 是否同时返回设计矩阵的条件数（秩不足时为 inf）
+
+        Returns:
+            估算的 3D 位置 [x, y, z]，beacon 少于 3 个时返回 None；
+            return_condition 为 True 时返回 (position, condition)
+        """
+        if len(beacons) < 3:
+            return (None, np.inf) if return_condition else None
+
+        positions = np.array([b[0] for b in beacons], dtype=np.float64)
+        distances = np.array([b[1] for b in beacons], dtype=np.float64)
+
+        A, centered = Position3D.linear_system(positions)
+        norms = np.einsum('ij,ij->i', centered, centered)
+        squared = distances * distances
+        b = (norms[1:] - norms[0]) - (squared[1:] - squared[0])
+
+        solution, _, rank, singular = np.linalg.lstsq(A, b, rcond=None)
+        position = solution + positions.mean(axis=0)
+
+        if not return_condition:
+            return position
+
+        condition = singular[0] / singular[-1] if rank == 3 and singular[-1] > 0 else np.inf
+        return position, condition
+
+    @staticmethod
+    def range_weights(distances: np.ndarray) -> np.ndarray:
+        """距离倒数权重 1 / (d + 0.5)：距离越近的 beacon 权重越大"""
+        return 1.0 / (distances + 0.5)
+
+    @staticmethod
+    def weighted_cost(positions: np.ndarray, distances: np.ndarray, position: np.ndarray) -> float:
+        """
+        计算加权距离误差 sum(w * (||x - p|| - d)^2)
+
+        Args:
+            positions: beacon 位置数组 (N, 3)
+            distances: 测量距离数组 (N,)
+            position: 待评估位置 [x, y, z]
+
+        Returns:
+            加权误差
+        """
+        ranges = np.linalg.norm(position - positions, axis=1)
+        residuals = ranges - distances
+        return float(np.dot(Position3D.range_weights(distances), residuals * residuals))
+
+    @staticmethod
+    def residual_rms(positions: np.ndarray, distances: np.ndarray, position: np.ndarray) -> float:
+        """
+        计算加权残差 RMS sqrt(sum(w * r^2) / sum(w))，单位为米
+
+        Args:
+            positions: beacon 位置数组 (N, 3)
+            distances: 测量距离数组 (N,)
+            position: 待评估位置 [x, y, z]
+
+        Returns:
+            加权残差 RMS
+        """
+        cost = Position3D.weighted_cost(positions, distances, position)
+        return float(np.sqrt(cost / Position3D.range_weights(distances).sum()))
+
+    @staticmethod
+    def fix_quality(positions: np.ndarray, distances: np.ndarray, position: np.ndarray,
+                    range_variance: float = 0.25) -> FixQuality:
+        """
+        计算定位质量：精度因子、加权残差 RMS 和协方差
+
+        精度因子只与 beacon 相对位置的几何有关，可以在求解前用预测位置评估。
+        协方差按距离噪声方差 sigma^2 * (d + 0.5)（与 range_weights 一致）线性化得到，
+        sigma^2 取加权残差方差（beacon 多于 3 个时）和 range_variance 中的较大者。
+
+        Args:
+            positions: beacon 位置数组 (N, 3)
+            distances: 测量距离数组 (N,)
+            position: 评估位置 [x, y, z]（求解结果或预测位置）
+            range_variance: 距离噪声方差 sigma^2 的下限（米）
+
+        Returns:
+            FixQuality
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        distances = np.asarray(distances, dtype=np.float64)
+        diff = np.asarray(position, dtype=np.float64) - positions
+        ranges = np.maximum(np.sqrt(np.einsum('ij,ij->i', diff, diff)), 1e-9)
+        units = diff / ranges[:, None]
+        weights = Position3D.range_weights(distances)
+
+        residuals = ranges - distances
+        cost = float(weights @ (residuals * residuals))
+        residual_rms = float(np.sqrt(cost / weights.sum()))
+        variance = range_variance
+        if len(distances) > 3:
+            variance = max(cost / (len(distances) - 3), range_variance)
+
+        dop = Position3D._symmetric_pinv(units.T @ units)
+        covariance = variance * Position3D._symmetric_pinv((units * weights[:, None]).T @ units)
+        diagonal = dop.diagonal()
+        return FixQuality(float(np.sqrt(diagonal.sum())), float(np.sqrt(diagonal[0] + diagonal[1])),
+                          float(np.sqrt(diagonal[2])), residual_rms, covariance)
+
+    @staticmethod
+    def _symmetric_pinv(matrix: np.ndarray) -> np.ndarray:
+        """
+        3×3 对称半正定矩阵的伪逆，退化方向（例如位置在共面 beacon 的平面内时的法向）涉及的对角元为 inf
+
+        Args:
+            matrix: 对称半正定矩阵 (3, 3)
+        """
+        eigenvalues, vectors = np.linalg.eigh(matrix)
+        finite = eigenvalues > 1e-9 * max(eigenvalues[-1], 1e-12)
+        inverse = (vectors[:, finite] / eigenvalues[finite]) @ vectors[:, finite].T
+        degenerate = (vectors[:, ~finite] ** 2).sum(axis=1) > 1e-12
+        np.fill_diagonal(inverse, np.where(degenerate, np.inf, inverse.diagonal()))
+        return inverse
+
+    @staticmethod
+    def _anchor_plane(positions: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        beacon 共面时返回 (平面上一点, 朝上的单位法向)，不共面时返回 None
+
+        Args:
+            positions: beacon 位置数组 (N, 3)
+        """
+        center = positions.mean(axis=0)
+        _, singular, vt = np.linalg.svd(positions - center)
+        if len(singular) < 3 or singular[2] > 1e-9 * max(singular[0], 1.0):
+            return None
+        return center, (vt[2] if vt[2][2] >= 0 else -vt[2])
+
+    @staticmethod
+    def _leave_anchor_plane(positions: np.ndarray, distances: np.ndarray, guess: np.ndarray,
+                            offset: float = 0.1) -> np.ndarray:
+        """
+        beacon 共面、当前点位于该平面上且平面不是法向上的极小值时，把当前点沿法向（朝上）移开一点
+
+        平面上误差函数关于法向对称、梯度为零。法向二阶导数与 sum(w * (r - d) / r) 同号，
+        为负时平面上的点是鞍点，基于梯度的方法需要先离开平面；为正时最优解就在平面上。
+
+        Args:
+            positions: beacon 位置数组 (N, 3)
+            distances: 测量距离数组 (N,)
+            guess: 当前位置
+            offset: 移开的距离（米）
+
+        Returns:
+            调整后的位置（无需调整时原样返回）
+        """
+        plane = Position3D._anchor_plane(positions)
+        if plane is None:
+            return guess
+
+        center, normal = plane
+        if abs(np.dot(guess - center, normal)) > 1e-6:
+            return guess
+
+        ranges = np.maximum(np.linalg.norm(guess - positions, axis=1), 1e-12)
+        curvature = np.dot(Position3D.range_weights(distances), (ranges - distances) / ranges)
+        if curvature >= 0:
+            return guess
+        return guess + offset * normal
+
+    @staticmethod
+    def _levenberg_marquardt(positions: np.ndarray, distances: np.ndarray, x: np.ndarray,
+                             max_iterations: int, tolerance: float,
+                             deadline: Optional[float] = None) -> SolveResult:
+        """gauss_newton_3d 的迭代主体，从 x 出发最多迭代 max_iterations 次，到 deadline 时停止"""
+        sqrt_weights = np.sqrt(Position3D.range_weights(distances))
+
+        diff = x - positions
+        ranges = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+        residuals = sqrt_weights * (ranges - distances)
+        cost = float(residuals @ residuals)
+
+        damping = 1e-3
+        converged = False
+        iterations = 0
+
+        while iterations < max_iterations:
+            # 只接受使误差下降的步长，x 始终是目前最好的点，到时间后可以直接返回
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            iterations += 1
+
+            jacobian = (sqrt_weights / np.maximum(ranges, 1e-12))[:, None] * diff
+            gradient = jacobian.T @ residuals
+            hessian = jacobian.T @ jacobian
+
+            # 阻尼缩放取对角线并设下限，保证 beacon 共面等秩不足情况下方程可解
+            diagonal = np.diag(hessian)
+            scaling = np.maximum(diagonal, 1e-3 * diagonal.sum() + 1e-9)
+            step = np.linalg.solve(hessian + damping * np.diag(scaling), -gradient)
+
+            # 线性化模型预测的误差下降已可以忽略：x 已是最优点（到容差为止）。
+            # 否则在最优点附近浮点误差会让每个微小步长都被拒绝，直到阻尼上限才判定收敛
+            if -float(gradient @ step) <= tolerance * (1.0 + cost):
+                converged = True
+                break
+
+            candidate = x + step
+            candidate_diff = candidate - positions
+            candidate_ranges = np.sqrt(np.einsum('ij,ij->i', candidate_diff, candidate_diff))
+            candidate_residuals = sqrt_weights * (candidate_ranges - distances)
+            candidate_cost = float(candidate_residuals @ candidate_residuals)
+
+            if candidate_cost <= cost:
+                improvement = cost - candidate_cost
+                x, diff, ranges = candidate, candidate_diff, candidate_ranges
+                residuals, cost = candidate_residuals, candidate_cost
+                damping = max(damping * 0.3, 1e-12)
+                if improvement <= tolerance * (1.0 + cost) or np.dot(step, step) <= tolerance * tolerance:
+                    converged = True
+                    break
+            else:
+                damping *= 10.0
+                if damping > 1e10:
+                    # 无法继续下降，当前点即为局部最优
+                    converged = True
+                    break
+
+        return SolveResult(x, iterations, cost, converged)
+
+    @staticmethod
+    def gauss_newton_3d(positions: np.ndarray, distances: np.ndarray,
+                        initial_guess: np.ndarray, max_iterations: int = 50,
+                        tolerance: float = 1e-10, deadline: Optional[float] = None) -> SolveResult:
+        """
+        Levenberg-Marquardt（阻尼 Gauss-Newton）求解加权距离误差
+
+        残差 r_i = sqrt(w_i) (||x - p_i|| - d_i) 与解析雅可比
+        J_i = sqrt(w_i) (x - p_i) / ||x - p_i|| 都以数组运算计算，通常几次迭代即可收敛。
+        beacon 共面时先在平面上求解，若平面上的解是法向鞍点再离开平面继续迭代。
+
+        Args:
+            positions: beacon 位置数组 (N, 3)
+            distances: 测量距离数组 (N,)
+            initial_guess: 初始位置 [x, y, z]
+            max_iterations: 最大迭代次数
+            tolerance: 相对误差变化或步长小于该值时认为收敛
+            deadline: 截止时刻（time.perf_counter() 的值），到时返回目前最好的结果，None 表示不限
+
+        Returns:
+            SolveResult
+        """
+        x = np.array(initial_guess, dtype=np.float64)
+        result = Position3D._levenberg_marquardt(positions, distances, x, max_iterations, tolerance,
+                                                 deadline)
+
+        moved = Position3D._leave_anchor_plane(positions, distances, result.position)
+        remaining = max_iterations - result.iterations
+        if moved is result.position or remaining <= 0:
+            return result
+        if deadline is not None and time.perf_counter() >= deadline:
+            return result
+
+        second = Position3D._levenberg_marquardt(positions, distances, moved, remaining, tolerance,
+                                                 deadline)
+        best = second if second.cost <= result.cost else result
+        return best._replace(iterations=result.iterations + second.iterations)
+
     @staticmethod
     def least_squares_3d(beacons: List[Tuple[np.ndarray, float]],
-                        initial_guess: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+                        initial_guess: Optional[np.ndarray] = None,
+                        linear_fast_path: bool = False,
+                        solver: str = 'nelder_mead',
+                        return_result: bool = False,
+                        max_iterations: Optional[int] = None,
+                        linear_solution: Optional[Tuple[np.ndarray, float]] = None,
+                        deadline: Optional[float] = None,
+                        xatol: Optional[float] = None):
         """
         使用最小二乘法优化计算 3D 位置
 
         Args:
             beacons: [(position, distance), ...] 列表
-            initial_guess: 初始猜测位置，如果为 None 则使用加权平均位置
+            initial_guess: 初始猜测位置，如果为 None 则使用线性化最小二乘解
+            linear_fast_path: 几何条件良好（满秩且条件数不超过 LINEAR_MAX_CONDITION）时
+                              直接返回线性解，跳过迭代优化
+            solver: 迭代求解后端，'nelder_mead' 或 'gauss_newton'（Levenberg-Marquardt）
+            return_result: 为 True 时返回 SolveResult（含迭代次数和最终误差）
+            max_iterations: 最大迭代次数，None 时使用 MAX_ITERATIONS 中该后端的默认值
+            linear_solution: 预先求好的线性解 (position, condition)（如 AnchorSubsetCache.linear_solve），
+                             None 时现场计算
+            deadline: 截止时刻（time.perf_counter() 的值），到时停止迭代并返回目前最好的结果，
+                      None 表示只受 max_iterations 限制
+            xatol: Nelder-Mead 的位置收敛容差（米），None 时使用 NELDER_MEAD_XATOL
 
         Returns:
-            优化后的 3D 位置 [x, y, z]
+            优化后的 3D 位置 [x, y, z]；return_result 为 True 时返回 SolveResult
         """
         if len(beacons) < 3:
             return None
+        if solver not in Position3D.SOLVERS:
+            raise ValueError(f"未知的求解后端: {solver}")
+        if max_iterations is None:
+            max_iterations = Position3D.MAX_ITERATIONS[solver]
+        if xatol is None:
+            xatol = Position3D.NELDER_MEAD_XATOL
 
-        # 如果没有提供初始猜测，使用加权平均作为更好的初始值
+        positions = np.array([b[0] for b in beacons], dtype=np.float64)
+        distances = np.array([b[1] for b in beacons], dtype=np.float64)
+
+        # 如果没有提供初始猜测，使用线性化最小二乘解作为初始值
         if initial_guess is None:
-            initial_guess = Position3D.weighted_position(beacons)
-            if initial_guess is None:
-                positions = np.array([b[0] for b in beacons])
-                initial_guess = np.mean(positions, axis=0)
+            if linear_solution is None:
+                linear_solution = Position3D.linear_least_squares_3d(beacons, return_condition=True)
+            initial_guess, condition = linear_solution
+            if linear_fast_path and condition <= Position3D.LINEAR_MAX_CONDITION:
+                if return_result:
+                    cost = Position3D.weighted_cost(positions, distances, initial_guess)
+                    return SolveResult(initial_guess, 0, cost, True)
+                return initial_guess
+
+        if solver == 'gauss_newton':
+            result = Position3D.gauss_newton_3d(positions, distances, initial_guess,
+                                                max_iterations=max_iterations, deadline=deadline)
+            return result if return_result else result.position
 
         def error_function(pos):
             """
@@ -66,34 +469,521 @@ class Position3D:
                 error += weight * (calculated_distance - measured_distance) ** 2
             return error
 
-        # 使用 scipy.optimize.minimize 进行优化
-        result = minimize(
-            error_function,
-            initial_guess,
-            method='Nelder-Mead',
-            options={'maxiter': 1000, 'xatol': 1e-8, 'fatol': 1e-8}
-        )
+        if deadline is not None:
+            # 记录目前最好的点，超过截止时刻时从目标函数中抛出异常中止优化
+            best = [np.inf, np.array(initial_guess, dtype=np.float64)]
+            iterations = [0]
+            unlimited_error_function = error_function
+
+            def error_function(pos):
+                if time.perf_counter() >= deadline:
+                    raise _DeadlineExceeded
+                error = unlimited_error_function(pos)
+                if error < best[0]:
+                    best[0], best[1] = error, np.array(pos)
+                return error
+
+            def count_iterations(_):
+                iterations[0] += 1
+
+            try:
+                result = minimize(
+                    error_function,
+                    initial_guess,
+                    method='Nelder-Mead',
+                    callback=count_iterations,
+                    options={'maxiter': max_iterations, 'xatol': xatol, 'fatol': 1e-8}
+                )
+            except _DeadlineExceeded:
+                if not np.isfinite(best[0]):
+                    best[0] = Position3D.weighted_cost(positions, distances, best[1])
+                truncated = SolveResult(best[1], iterations[0], float(best[0]), False)
+                return truncated if return_result else truncated.position
+        else:
+            # 使用 scipy.optimize.minimize 进行优化
+            result = minimize(
+                error_function,
+                initial_guess,
+                method='Nelder-Mead',
+                options={'maxiter': max_iterations, 'xatol': xatol, 'fatol': 1e-8}
+            )
+
+        # 即使优化不完全成功，也返回最佳结果
+        if return_result:
+            return SolveResult(result.x, int(result.nit), float(result.fun), bool(result.success))
+        return result.x
+
+    @staticmethod
+    def warm_start_3d(beacons: List[Tuple[np.ndarray, float]],
+                      prediction: Optional[np.ndarray],
+                      linear_fast_path: bool = False,
+                      solver: str = 'nelder_mead',
+                      warm_radius: Optional[float] = None,
+                      divergence_rms: Optional[float] = None,
+                      return_result: bool = False,
+                      linear_solution: Optional[Tuple[np.ndarray, float]] = None,
+                      deadline: Optional[float] = None):
+        """
+        以跟踪器的预测位置为初始值求解（连续定位时相邻两次结果高度相关）
+
+        预测位置的加权残差 RMS 不超过 warm_radius 时使用 WARM_MAX_ITERATIONS 收紧的迭代次数；
+        否则仍从预测位置出发但使用默认迭代次数。Nelder-Mead 热启动的收敛容差为 WARM_XATOL，
+        预测足够好时能在收紧的迭代次数内收敛（converged 为 True）。结果残差 RMS 超过 divergence_rms 时
+        视为发散，改用线性解冷启动，返回两者中误差较小的一个。
+
+        Args:
+            beacons: [(position, distance), ...] 列表
+            prediction: 跟踪器的预测位置，None 时等同于 least_squares_3d（冷启动）
+            linear_fast_path: 同 least_squares_3d，几何条件良好时直接返回线性解
+            solver: 迭代求解后端，'nelder_mead' 或 'gauss_newton'
+            warm_radius: 判断预测足够接近的残差 RMS（米），None 时使用 WARM_START_RADIUS
+            divergence_rms: 判断发散的残差 RMS（米），None 时使用 DIVERGENCE_RMS
+            return_result: 为 True 时返回 SolveResult（迭代次数包含冷启动部分）
+            linear_solution: 预先求好的线性解 (position, condition)，None 时按需现场计算
+            deadline: 截止时刻（time.perf_counter() 的值），到时返回目前最好的结果，且不再冷启动
+
+        Returns:
+            优化后的 3D 位置 [x, y, z]；return_result 为 True 时返回 SolveResult
+        """
+        if prediction is None or len(beacons) < 3:
+            return Position3D.least_squares_3d(beacons, linear_fast_path=linear_fast_path,
+                                               solver=solver, return_result=return_result,
+                                               linear_solution=linear_solution, deadline=deadline)
+        if solver not in Position3D.SOLVERS:
+            raise ValueError(f"未知的求解后端: {solver}")
+        if warm_radius is None:
+            warm_radius = Position3D.WARM_START_RADIUS
+        if divergence_rms is None:
+            divergence_rms = Position3D.DIVERGENCE_RMS
+
+        positions = np.array([b[0] for b in beacons], dtype=np.float64)
+        distances = np.array([b[1] for b in beacons], dtype=np.float64)
+
+        if linear_fast_path:
+            if linear_solution is None:
+                linear_solution = Position3D.linear_least_squares_3d(beacons, return_condition=True)
+            linear, condition = linear_solution
+            if condition <= Position3D.LINEAR_MAX_CONDITION:
+                if return_result:
+                    cost = Position3D.weighted_cost(positions, distances, linear)
+                    return SolveResult(linear, 0, cost, True)
+                return linear
+
+        prediction = np.asarray(prediction, dtype=np.float64)
+        plane = Position3D._anchor_plane(positions)
+        if plane is not None:
+            # beacon 共面时误差关于平面镜像对称，与冷启动一致取平面上方的解
+            center, normal = plane
+            height = np.dot(prediction - center, normal)
+            if height < 0:
+                prediction = prediction - 2.0 * height * normal
+        if Position3D.residual_rms(positions, distances, prediction) <= warm_radius:
+            max_iterations = Position3D.WARM_MAX_ITERATIONS[solver]
+        else:
+            max_iterations = Position3D.MAX_ITERATIONS[solver]
+
+        result = Position3D.least_squares_3d(beacons, initial_guess=prediction, solver=solver,
+                                             return_result=True, max_iterations=max_iterations,
+                                             deadline=deadline, xatol=Position3D.WARM_XATOL)
+        total_weight = Position3D.range_weights(distances).sum()
+        expired = deadline is not None and time.perf_counter() >= deadline
+        if np.sqrt(result.cost / total_weight) > divergence_rms and not expired:
+            cold = Position3D.least_squares_3d(beacons, solver=solver, return_result=True,
+                                               linear_solution=linear_solution, deadline=deadline)
+            iterations = result.iterations + cold.iterations
+            result = (cold if cold.cost < result.cost else result)._replace(iterations=iterations)
+
+        return result if return_result else result.position
+
+    @staticmethod
+    def solve_with_deadline(beacons: List[Tuple[np.ndarray, float]], time_budget: float = 0.002,
+                            prediction: Optional[np.ndarray] = None, solver: str = 'nelder_mead',
+                            linear_fast_path: bool = True,
+                            linear_solution: Optional[Tuple[np.ndarray, float]] = None) -> StrategyResult:
+        """
+        按 beacon 数量、几何条件和时间预算选择算法并限时求解
+
+        选择顺序：
+        1. beacon 少于 3 个：加权平均（weighted_position）
+        2. 线性解满秩且条件数不超过 LINEAR_MAX_CONDITION：直接使用线性解
+        3. 否则迭代求解：优先使用 solver，其典型耗时（SOLVER_COST）超过剩余预算时改用更快的后端；
+           有预测位置时热启动（warm_start_3d）。到截止时刻仍未收敛时停止迭代，返回目前最好的结果
+           （迭代结果不如线性解时返回线性解）。
+        单次定位的最坏耗时约为 time_budget 加一次迭代（或一次目标函数计算）的时间。
+
+        Args:
+            beacons: [(position, distance), ...] 列表
+            time_budget: 时间预算（秒）
+            prediction: 跟踪器的预测位置，None 表示冷启动
+            solver: 预算充足时优先使用的迭代后端
+            linear_fast_path: 是否允许几何条件良好时直接使用线性解
+            linear_solution: 预先求好的线性解 (position, condition)，None 时现场计算
+
+        Returns:
+            StrategyResult
+        """
+        start = time.perf_counter()
+        deadline = start + time_budget
+        if solver not in Position3D.SOLVERS:
+            raise ValueError(f"未知的求解后端: {solver}")
+
+        def finish(position, method, iterations=0, cost=np.nan, converged=True, truncated=False):
+            return StrategyResult(position, method, iterations, float(cost), converged, truncated,
+                                  time.perf_counter() - start)
+
+        if len(beacons) < 3:
+            position = Position3D.weighted_position(beacons)
+            return finish(position, 'weighted', converged=position is not None)
+
+        positions = np.array([b[0] for b in beacons], dtype=np.float64)
+        distances = np.array([b[1] for b in beacons], dtype=np.float64)
+        if linear_solution is None:
+            linear_solution = Position3D.linear_least_squares_3d(beacons, return_condition=True)
+        linear, condition = linear_solution
+        linear_cost = Position3D.weighted_cost(positions, distances, linear)
+
+        if linear_fast_path and condition <= Position3D.LINEAR_MAX_CONDITION:
+            return finish(linear, 'linear', cost=linear_cost)
 
-        if result.success:
-            return result.x
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return finish(linear, 'linear', cost=linear_cost, converged=False, truncated=True)
+
+        # 预算不够时按典型耗时从高到低降级，最快的后端总是可用（超时即截断）
+        method = solver
+        for candidate in sorted(Position3D.SOLVERS, key=Position3D.SOLVER_COST.get, reverse=True):
+            if Position3D.SOLVER_COST[method] <= remaining:
+                break
+            if Position3D.SOLVER_COST[candidate] < Position3D.SOLVER_COST[method]:
+                method = candidate
+
+        if prediction is not None:
+            result = Position3D.warm_start_3d(beacons, prediction, solver=method, return_result=True,
+                                              linear_solution=linear_solution, deadline=deadline)
         else:
-            # 即使优化不完全成功，也返回最佳结果
-            return result.x
+            result = Position3D.least_squares_3d(beacons, solver=method, return_result=True,
+                                                 linear_solution=linear_solution, deadline=deadline)
+
+        truncated = not result.converged and time.perf_counter() >= deadline
+        if linear_cost < result.cost:
+            return finish(linear, 'linear', result.iterations, linear_cost, False, truncated)
+        return finish(result.position, method, result.iterations, result.cost, result.converged, truncated)
+
+    @staticmethod
+    def _batch_evaluate(anchors: np.ndarray, distances: np.ndarray, sqrt_weights: np.ndarray,
+                        points: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """批量计算 (差向量, 距离, 加权残差, 加权误差)，被掩码掉的 beacon 权重为 0"""
+        diff = points[:, None, :] - anchors[None, :, :]
+        ranges = np.sqrt(np.einsum('tij,tij->ti', diff, diff))
+        residuals = sqrt_weights * (ranges - distances)
+        return diff, ranges, residuals, np.einsum('ti,ti->t', residuals, residuals)
+
+    @staticmethod
+    def _batch_levenberg_marquardt(anchors: np.ndarray, distances: np.ndarray,
+                                   sqrt_weights: np.ndarray, x: np.ndarray, active: np.ndarray,
+                                   max_iterations: int, tolerance: float,
+                                   centers: Optional[np.ndarray] = None,
+                                   normals: Optional[np.ndarray] = None):
+        """
+        batch_solve 的迭代主体：所有标签同时迭代，每个标签独立维护阻尼与收敛状态
+
+        normals 中非零的行表示该标签的可见 beacon 共面（centers 为平面上一点）。
+        这类标签收敛在平面上且法向曲率为负（鞍点）时，沿法向移开一次后继续迭代，
+        与 gauss_newton_3d 的处理一致。
+
+        Returns:
+            (positions, cost, iterations, converged)
+        """
+        num_tags = x.shape[0]
+        x = x.copy()
+        diff, ranges, residuals, cost = Position3D._batch_evaluate(anchors, distances, sqrt_weights, x)
+        damping = np.full(num_tags, 1e-3)
+        active = active.copy()
+        converged = np.zeros(num_tags, dtype=bool)
+        escapable = np.zeros(num_tags, dtype=bool) if normals is None else normals.any(axis=1)
+        plane_x, plane_cost = x.copy(), cost.copy()
+        identity = np.eye(3)
+        iterations = 0
+
+        while iterations < max_iterations and active.any():
+            iterations += 1
+            # 只对仍在迭代的标签计算，少数收敛慢的标签不会拖慢整批
+            idx = np.flatnonzero(active)
+            w = sqrt_weights[idx]
+            d = distances[idx]
+
+            jacobian = (w / np.maximum(ranges[idx], 1e-12))[:, :, None] * diff[idx]
+            gradient = np.einsum('tij,ti->tj', jacobian, residuals[idx])
+            hessian = np.einsum('tij,tik->tjk', jacobian, jacobian)
+            diagonal = np.einsum('tjj->tj', hessian)
+            scaling = np.maximum(diagonal, 1e-3 * diagonal.sum(axis=1, keepdims=True) + 1e-9)
+            lhs = hessian + damping[idx, None, None] * (scaling[:, :, None] * identity)
+            step = np.linalg.solve(lhs, -gradient[:, :, None])[:, :, 0]
+            # 线性化模型预测的误差下降可以忽略时即已收敛（与 _levenberg_marquardt 一致）
+            negligible = -np.einsum('tj,tj->t', gradient, step) <= tolerance * (1.0 + cost[idx])
+
+            candidate = x[idx] + step
+            c_diff, c_ranges, c_residuals, c_cost = Position3D._batch_evaluate(anchors, d, w, candidate)
+
+            accept = c_cost <= cost[idx]
+            improvement = cost[idx] - c_cost
+            accepted = idx[accept]
+            x[accepted] = candidate[accept]
+            diff[accepted] = c_diff[accept]
+            ranges[accepted] = c_ranges[accept]
+            residuals[accepted] = c_residuals[accept]
+            cost[accepted] = c_cost[accept]
+            damping[idx] = np.where(accept, np.maximum(damping[idx] * 0.3, 1e-12), damping[idx] * 10.0)
+
+            done = accept & ((improvement <= tolerance * (1.0 + c_cost))
+                             | (np.einsum('tj,tj->t', step, step) <= tolerance * tolerance))
+            # 无法继续下降，当前点即为局部最优
+            done |= negligible | (damping[idx] > 1e10)
+            done = idx[done]
+
+            escape = done[escapable[done]]
+            if len(escape):
+                on_plane = np.abs(np.einsum('tj,tj->t', x[escape] - centers[escape], normals[escape])) <= 1e-6
+                curvature = (sqrt_weights[escape] ** 2 * (ranges[escape] - distances[escape])
+                             / np.maximum(ranges[escape], 1e-12)).sum(axis=1)
+                escapable[escape] = False
+                escape = escape[on_plane & (curvature < 0)]
+                if len(escape):
+                    plane_x[escape] = x[escape]
+                    plane_cost[escape] = cost[escape]
+                    x[escape] += 0.1 * normals[escape]
+                    diff[escape], ranges[escape], residuals[escape], cost[escape] = Position3D._batch_evaluate(
+                        anchors, distances[escape], sqrt_weights[escape], x[escape])
+                    damping[escape] = 1e-3
+                    done = np.setdiff1d(done, escape, assume_unique=True)
+
+            converged[done] = True
+            active[done] = False
+
+        # 离开平面后没有得到更好的解时，退回平面上的解
+        # （未离开平面的标签 plane_cost 等于初始误差，不会优于当前解）
+        worse = plane_cost < cost
+        x[worse] = plane_x[worse]
+        cost[worse] = plane_cost[worse]
+        return x, cost, iterations, converged
+
+    @staticmethod
+    def batch_solve(distances: np.ndarray, mask: Optional[np.ndarray], anchors: np.ndarray,
+                    max_iterations: int = 50, tolerance: float = 1e-10,
+                    refine: bool = True) -> BatchSolveResult:
+        """
+        批量求解多个标签的位置（所有标签共用同一组 beacon）
+
+        先对所有标签做一次批量线性化最小二乘，再用批量 Levenberg-Marquardt 细化，
+        目标函数与 least_squares_3d 相同（权重 1/(d+0.5)）。每个标签可以只看到部分 beacon。
+
+        Args:
+            distances: 距离矩阵 (T, N)，T 为标签数，N 为 beacon 数
+            mask: 有效性掩码 (T, N)，None 表示全部有效（同时会忽略非正数和非有限的距离）
+            anchors: beacon 位置数组 (N, 3)
+            max_iterations: 细化的最大迭代次数
+            tolerance: 相对误差变化小于该值时认为收敛
+            refine: 是否进行迭代细化，False 时只返回线性解
+
+        Returns:
+            BatchSolveResult
+        """
+        distances = np.asarray(distances, dtype=np.float64)
+        anchors = np.asarray(anchors, dtype=np.float64)
+        num_tags = distances.shape[0]
+
+        valid_mask = np.isfinite(distances) & (distances > 0)
+        if mask is not None:
+            valid_mask &= np.asarray(mask, dtype=bool)
+        m = valid_mask.astype(np.float64)
+        d = np.where(valid_mask, distances, 0.0)
+        counts = m.sum(axis=1)
+        valid = counts >= 3
+        safe_counts = np.maximum(counts, 1.0)
+
+        # 每个标签以其可见 beacon 的中心为原点：q_ti = p_i - c_t
+        centers = (m @ anchors) / safe_counts[:, None]
+        q = anchors[None, :, :] - centers[:, None, :]
+        q_norm = np.einsum('tij,tij->ti', q, q)
+        squared = d * d
+
+        # 与 linear_system 相同，减去参考 beacon（第一个可见的 beacon）的方程消去 ||y||^2：
+        # 2 (q_i - q_r) · y = (|q_i|^2 - |q_r|^2) - (d_i^2 - d_r^2)。
+        # 线性解因此与 linear_least_squares_3d 一致，迭代从同一点出发，收敛到同一个局部最优
+        rows = np.arange(num_tags)
+        reference = np.argmax(valid_mask, axis=1)
+        a = q - q[rows, reference][:, None, :]
+        b = ((q_norm - q_norm[rows, reference][:, None])
+             - (squared - squared[rows, reference][:, None]))
+        normal = 4.0 * np.einsum('ti,tij,tik->tjk', m, a, a)
+        rhs = 2.0 * np.einsum('ti,tij,ti->tj', m, a, b)
+
+        # 很小的岭项：beacon 共面时垂直方向取中心平面（与 linear_least_squares_3d 一致）
+        scale = np.maximum(np.trace(normal, axis1=1, axis2=2), 1.0)
+        ridge = (1e-10 * scale)[:, None, None] * np.eye(3)
+        x = centers + np.linalg.solve(normal + ridge, rhs[:, :, None])[:, :, 0]
+
+        sqrt_weights = np.sqrt(m / (d + 0.5))
+        if not refine:
+            cost = Position3D._batch_evaluate(anchors, d, sqrt_weights, x)[3]
+            x[~valid] = np.nan
+            cost = np.where(valid, cost, np.nan)
+            return BatchSolveResult(x, valid, 0, cost, np.zeros(num_tags, dtype=bool))
+
+        # 可见 beacon 共面的标签记录平面法向（朝上），迭代中用于离开平面上的鞍点
+        eigenvalues, eigenvectors = np.linalg.eigh(normal)
+        normals = eigenvectors[:, :, 0]
+        normals = np.where(normals[:, 2:3] < 0, -normals, normals)
+        planar = eigenvalues[:, 0] <= 1e-9 * np.maximum(eigenvalues[:, 2], 1.0)
+
+        x, cost, iterations, converged = Position3D._batch_levenberg_marquardt(
+            anchors, d, sqrt_weights, x, valid, max_iterations, tolerance,
+            centers=centers, normals=np.where(planar[:, None], normals, 0.0))
+
+        x[~valid] = np.nan
+        cost = np.where(valid, cost, np.nan)
+        return BatchSolveResult(x, valid, iterations, cost, converged & valid)
 
     @staticmethod
     def filter_outliers(beacons: List[Tuple[np.ndarray, float]],
-                       max_distance: float = 50.0) -> List[Tuple[np.ndarray, float]]:
+                       max_distance: float = 50.0, return_mask: bool = False):
         """
         过滤异常距离值
 
         Args:
             beacons: beacon 列表
             max_distance: 最大合理距离（米）
+            return_mask: 是否同时返回每个 beacon 是否保留的列表
+
+        Returns:
+            过滤后的 beacon 列表；return_mask 为 True 时返回 (filtered, keep)
+        """
+        keep = [0 < dist < max_distance for _, dist in beacons]
+        filtered = [beacon for beacon, kept in zip(beacons, keep) if kept]
+        return (filtered, keep) if return_mask else filtered
+
+    @staticmethod
+    def ransac_filter(beacons: List[Tuple[np.ndarray, float]], threshold: Optional[float] = None,
+                      max_hypotheses: int = 256, batch_size: int = 64, time_budget: float = 0.002,
+                      max_distance: float = 50.0, return_mask: bool = False,
+                      return_result: bool = False, seed: Optional[int] = None):
+        """
+        RANSAC 方式剔除异常 beacon（例如多径导致 RSSI 偏高、距离偏小的 beacon）
+
+        在最小 beacon 子集（共面时为平面内 3 个，否则为 4 个）上线性求解出假设位置，
+        以截断的相对残差平方和（MSAC）给全部 beacon 打分，返回最好假设的内点。
+        假设按批向量化求解和打分，子集组合不超过 max_hypotheses 时全部枚举，否则随机抽样；
+        超过 time_budget 后不再生成新的批次。最终位置由调用方在内点上重新求解。
+
+        Args:
+            beacons: [(position, distance), ...] 列表
+            threshold: 内点的相对残差阈值，None 时使用 RANSAC_THRESHOLD
+            max_hypotheses: 最多检验的假设数量
+            batch_size: 每批假设数量
+            time_budget: 时间预算（秒）
+            max_distance: 最大合理距离（米），超出 (0, max_distance) 的 beacon 直接剔除
+            return_mask: 是否同时返回每个 beacon 是否保留的列表
+            return_result: 是否返回 RobustSelection（优先于 return_mask）
+            seed: 随机抽样的种子
+
+        Returns:
+            过滤后的 beacon 列表；return_mask 为 True 时返回 (filtered, keep)；
+            return_result 为 True 时返回 RobustSelection
+        """
+        deadline = time.perf_counter() + time_budget
+        threshold = Position3D.RANSAC_THRESHOLD if threshold is None else threshold
+
+        distances = np.array([d for _, d in beacons], dtype=np.float64)
+        valid = np.isfinite(distances) & (distances > 0) & (distances < max_distance)
+        inliers = valid.copy()
+        position, hypotheses, best_cost = None, 0, np.inf
+
+        candidates = np.flatnonzero(valid)
+        positions = np.array([p for p, _ in beacons], dtype=np.float64).reshape(-1, 3)
+        anchors, ranges = positions[candidates], distances[candidates]
+        plane = Position3D._anchor_plane(anchors) if len(candidates) >= 3 else None
+        minimal = 3 if plane is not None else 4
+
+        # 没有冗余 beacon 时无法投票
+        if len(candidates) > minimal:
+            total = math.comb(len(candidates), minimal)
+            rng = np.random.default_rng(seed)
+            if total <= max_hypotheses:
+                subsets = np.array(list(itertools.combinations(range(len(candidates)), minimal)))
+            else:
+                subsets = None
+
+            scale = 1.0 / (ranges + 0.5)
+            best_inliers = None
+            while hypotheses < min(total, max_hypotheses):
+                count = min(batch_size, min(total, max_hypotheses) - hypotheses)
+                if subsets is not None:
+                    batch = subsets[hypotheses:hypotheses + count]
+                else:
+                    batch = np.argsort(rng.random((count, len(candidates))), axis=1)[:, :minimal]
+                hypotheses += count
+
+                points = Position3D._minimal_solve(anchors, ranges, batch, plane)
+                diff = points[:, None, :] - anchors[None, :, :]
+                errors = (np.sqrt(np.einsum('hij,hij->hi', diff, diff)) - ranges) * scale
+                costs = np.minimum(errors * errors, threshold * threshold).sum(axis=1)
+
+                best = int(np.argmin(costs))
+                if costs[best] < best_cost:
+                    best_cost = float(costs[best])
+                    position = points[best]
+                    best_inliers = np.abs(errors[best]) <= threshold
+
+                if time.perf_counter() > deadline:
+                    break
+
+            if best_inliers is not None and best_inliers.sum() >= minimal:
+                inliers[:] = False
+                inliers[candidates[best_inliers]] = True
+
+        if return_result:
+            return RobustSelection(inliers, position, hypotheses, best_cost)
+        keep = inliers.tolist()
+        filtered = [beacon for beacon, kept in zip(beacons, keep) if kept]
+        return (filtered, keep) if return_mask else filtered
+
+    @staticmethod
+    def _minimal_solve(anchors: np.ndarray, distances: np.ndarray, subsets: np.ndarray,
+                       plane: Optional[Tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+        """
+        批量求解最小子集的线性化三边测量
+
+        Args:
+            anchors: beacon 位置 (N, 3)
+            distances: 测量距离 (N,)
+            subsets: (H, m) 子集编号，共面时 m = 3，否则 m = 4
+            plane: Position3D._anchor_plane 的结果，None 表示不共面
 
         Returns:
-            过滤后的 beacon 列表
+            (H, 3) 假设位置；共面时取平面上方的解
         """
-        return [(pos, dist) for pos, dist in beacons if 0 < dist < max_distance]
+        if plane is not None:
+            # 在平面坐标系中求二维解，再由距离确定离开平面的高度
+            center, normal = plane
+            basis = np.linalg.svd(np.eye(3) - np.outer(normal, normal))[0][:, :2]
+            coordinates = (anchors - center) @ basis
+        else:
+            coordinates = anchors
+
+        points = coordinates[subsets]                      # (H, m, k)
+        squared = distances[subsets] ** 2                  # (H, m)
+        norms = np.einsum('hij,hij->hi', points, points)   # (H, m)
+        A = 2.0 * (points[:, 1:] - points[:, :1])
+        b = (squared[:, :1] - squared[:, 1:]) + (norms[:, 1:] - norms[:, :1])
+        solution = np.einsum('hij,hj->hi', np.linalg.pinv(A), b)
+
+        if plane is None:
+            return solution
+
+        offsets = solution[:, None, :] - points
+        heights = squared - np.einsum('hij,hij->hi', offsets, offsets)
+        height = np.sqrt(np.maximum(heights.mean(axis=1), 0.0))
+        return center + solution @ basis.T + height[:, None] * normal
 
     @staticmethod
     def weighted_position(beacons: List[Tuple[np.ndarray, float]]) -> Optional[np.ndarray]:
@@ -121,45 +1011,1123 @@ class Position3D:
         return weighted_pos
 
 
-class KalmanFilter3D:
-    """简单的 3D 卡尔曼滤波器，用于平滑位置估算"""
+class AnchorSubset(NamedTuple):
+    """一组 beacon 子集的线性化三边测量分解（只与 beacon 位置有关）"""
+    indices: np.ndarray    # 子集中的 beacon 编号（升序）
+    positions: np.ndarray  # beacon 位置 (k, 3)
+    center: np.ndarray     # beacon 中心
+    pinv: np.ndarray       # 设计矩阵的伪逆 (3, k-1)
+    norm_diff: np.ndarray  # ||p_i - c||^2 - ||p_0 - c||^2，(k-1,)
+    condition: float       # 设计矩阵条件数，秩不足时为 inf
+    plane: Optional[Tuple[np.ndarray, np.ndarray]]  # beacon 共面时为 (平面上一点, 朝上的法向)
 
-    def __init__(self, process_variance: float = 1e-3, measurement_variance: float = 0.1):
+
+class AnchorSubsetCache(LRUCache):
+    """
+    beacon 子集分解缓存
+
+    beacon 位置在配置文件中固定，线性化三边测量的设计矩阵只取决于这次听到了哪些 beacon。
+    以 beacon 子集的位掩码为键缓存设计矩阵的伪逆，每次定位只需一次小的矩阵-向量乘法。
+    超出容量时按 LRU 淘汰。
+    """
+
+    def __init__(self, anchors: np.ndarray, maxsize: int = 64):
         """
-        初始化卡尔曼滤波器
+        初始化缓存
 
         Args:
-            process_variance: 过程噪声方差
-            measurement_variance: 测量噪声方差
+            anchors: 全部 beacon 位置 (N, 3)，位掩码的第 i 位对应第 i 个 beacon
+            maxsize: 最大缓存子集数
         """
-        self.process_variance = process_variance
-        self.measurement_variance = measurement_variance
-        self.estimated_position = None
-        self.estimation_error = np.eye(3)
+        super().__init__(maxsize)
+        self.anchors = np.array(anchors, dtype=np.float64).reshape(-1, 3)
+
+    @staticmethod
+    def mask_of(indices: Iterable[int]) -> int:
+        """由 beacon 编号生成位掩码"""
+        mask = 0
+        for index in indices:
+            mask |= 1 << int(index)
+        return mask
+
+    @staticmethod
+    def indices_of(mask: int) -> np.ndarray:
+        """由位掩码得到升序排列的 beacon 编号"""
+        indices = []
+        index = 0
+        while mask:
+            if mask & 1:
+                indices.append(index)
+            mask >>= 1
+            index += 1
+        return np.array(indices, dtype=np.intp)
 
-    def update(self, measured_position: np.ndarray) -> np.ndarray:
+    def subset(self, mask: int) -> AnchorSubset:
         """
-        更新滤波器
+        获取 beacon 子集的分解，未缓存时计算并加入缓存
 
         Args:
-            measured_position: 测量得到的位置
+            mask: beacon 子集位掩码（至少 3 个 beacon）
 
         Returns:
-            滤波后的位置
+            AnchorSubset
         """
-        if self.estimated_position is None:
-            # 第一次测量，直接使用测量值
-            self.estimated_position = measured_position.copy()
-            return self.estimated_position
+        entry = self._lookup(mask)
+        if entry is not None:
+            return entry
 
-        # 预测步骤
-        predicted_position = self.estimated_position
-        predicted_error = self.estimation_error + self.process_variance * np.eye(3)
+        indices = self.indices_of(mask)
+        if len(indices) < 3:
+            raise ValueError("beacon 子集至少需要 3 个 beacon")
+        if indices[-1] >= len(self.anchors):
+            raise ValueError(f"beacon 编号超出范围: {indices[-1]}")
 
-        # 更新步骤
-        measurement_cov = self.measurement_variance * np.eye(3)
-        kalman_gain = predicted_error @ np.linalg.inv(predicted_error + measurement_cov)
-        self.estimated_position = predicted_position + kalman_gain @ (measured_position - predicted_position)
-        self.estimation_error = (np.eye(3) - kalman_gain) @ predicted_error
+        positions = self.anchors[indices]
+        A, centered = Position3D.linear_system(positions)
+        norms = np.einsum('ij,ij->i', centered, centered)
 
-        return self.estimated_position
+        # 与 np.linalg.lstsq 相同的奇异值截断，结果与 linear_least_squares_3d 一致
+        u, singular, vt = np.linalg.svd(A, full_matrices=False)
+        cutoff = np.finfo(np.float64).eps * max(A.shape) * singular[0]
+        rank = int(np.count_nonzero(singular > cutoff))
+        inverse = np.zeros_like(singular)
+        inverse[:rank] = 1.0 / singular[:rank]
+        pinv = (vt.T * inverse) @ u.T
+        condition = singular[0] / singular[-1] if rank == 3 else np.inf
+
+        entry = AnchorSubset(indices, positions, positions.mean(axis=0), pinv,
+                             norms[1:] - norms[0], float(condition),
+                             Position3D._anchor_plane(positions))
+        self._store(mask, entry)
+        return entry
+
+    def linear_solve(self, mask: int, distances: np.ndarray, return_condition: bool = False):
+        """
+        线性化最小二乘三边测量（与 Position3D.linear_least_squares_3d 结果相同）
+
+        Args:
+            mask: beacon 子集位掩码
+            distances: 子集中各 beacon 的测量距离，按 beacon 编号升序排列
+            return_condition: 是否同时返回设计矩阵的条件数
+
+        Returns:
+            估算的 3D 位置；return_condition 为 True 时返回 (position, condition)
+        """
+        entry = self.subset(mask)
+        squared = np.asarray(distances, dtype=np.float64) ** 2
+        position = entry.center + entry.pinv @ (entry.norm_diff - (squared[1:] - squared[0]))
+        return (position, entry.condition) if return_condition else position
+
+    def quality(self, mask: int, distances: np.ndarray, position: np.ndarray,
+                range_variance: float = 0.25) -> FixQuality:
+        """
+        beacon 子集在给定位置的定位质量（见 Position3D.fix_quality）
+
+        beacon 共面且位置在该平面内时，法向不可观测，直接按缓存的平面给出 vdop = inf，
+        不依赖接近奇异的矩阵数值。
+
+        Args:
+            mask: beacon 子集位掩码
+            distances: 子集中各 beacon 的测量距离，按 beacon 编号升序排列
+            position: 评估位置（求解结果，或求解前的预测位置）
+            range_variance: 距离噪声方差的下限
+
+        Returns:
+            FixQuality
+        """
+        entry = self.subset(mask)
+        position = np.asarray(position, dtype=np.float64)
+        if entry.plane is not None:
+            center, normal = entry.plane
+            height = float((position - center) @ normal)
+            if abs(height) < 1e-6:
+                position = position - height * normal
+        return Position3D.fix_quality(entry.positions, distances, position, range_variance)
+
+
+class SolveCache(LRUCache):
+    """
+    量化求解结果缓存
+
+    静止或慢速移动时，连续几次定位的 beacon 子集和距离几乎相同。以 (子集位掩码, 按 resolution 量化的距离) 为键
+    缓存求解结果，命中时直接返回，不调用优化器。超出容量时按 LRU 淘汰，超过 ttl 的结果视为过期。
+    """
+
+    def __init__(self, resolution: float = 0.05, maxsize: int = 256, ttl: Optional[float] = 5.0,
+                 clock: Optional[Callable[[], float]] = None):
+        """
+        初始化缓存
+
+        Args:
+            resolution: 距离量化步长（米）
+            maxsize: 最大缓存条目数
+            ttl: 结果有效期（秒），None 表示不过期
+            clock: 时钟函数，默认 time.monotonic（回放/合成数据源可传入其虚拟时钟）
+        """
+        if resolution <= 0:
+            raise ValueError("resolution 必须大于 0")
+        super().__init__(maxsize)
+        self.resolution = resolution
+        self.ttl = ttl
+        self.clock = clock or time.monotonic
+        self.expirations = 0
+
+    def key(self, mask: int, distances) -> tuple:
+        """由子集位掩码和量化后的距离生成缓存键"""
+        quantized = np.rint(np.asarray(distances, dtype=np.float64) / self.resolution).astype(np.int64)
+        return mask, quantized.tobytes()
+
+    def get(self, mask: int, distances) -> Optional[np.ndarray]:
+        """
+        查询缓存
+
+        Args:
+            mask: beacon 子集位掩码
+            distances: 子集中各 beacon 的测量距离，按 beacon 编号升序排列
+
+        Returns:
+            缓存的位置（副本），未命中或已过期时返回 None
+        """
+        key = self.key(mask, distances)
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl is not None and self.clock() - entry[1] > self.ttl:
+            # 过期的结果按未命中处理
+            del self._entries[key]
+            self.expirations += 1
+
+        entry = self._lookup(key)
+        return None if entry is None else entry[0].copy()
+
+    def put(self, mask: int, distances, position: np.ndarray):
+        """
+        写入求解结果
+
+        Args:
+            mask: beacon 子集位掩码
+            distances: 子集中各 beacon 的测量距离
+            position: 求解得到的位置
+        """
+        self._store(self.key(mask, distances), (np.array(position, dtype=np.float64), self.clock()))
+
+    def solve(self, mask: int, distances, solver: Callable[[], object]) -> Optional[np.ndarray]:
+        """
+        命中时返回缓存结果，否则调用 solver() 求解并缓存
+
+        solver() 可以返回位置，也可以返回 SolveResult / StrategyResult：因时间预算被截断的结果
+        只用于本次定位，不写入缓存，避免一次慢迭代的结果在 ttl 内被附近的扫描反复使用。
+        用完迭代次数但没有被截断的结果（例如收紧迭代次数的热启动）照常缓存。结果为 None 时不缓存。
+
+        Args:
+            mask: beacon 子集位掩码
+            distances: 子集中各 beacon 的测量距离
+            solver: 无参数的求解函数
+
+        Returns:
+            位置
+        """
+        position = self.get(mask, distances)
+        if position is not None:
+            return position
+
+        result = solver()
+        if isinstance(result, (SolveResult, StrategyResult)):
+            position = result.position
+            cacheable = not getattr(result, 'truncated', False)
+        else:
+            position = result
+            cacheable = True
+        if position is not None and cacheable:
+            self.put(mask, distances, position)
+        return position
+
+    def stats(self) -> dict:
+        """返回缓存统计信息（另含过期次数 expirations）"""
+        stats = super().stats()
+        stats['expirations'] = self.expirations
+        return stats
+
+    def clear(self):
+        """清空缓存与统计"""
+        super().clear()
+        self.expirations = 0
+
+
+class AnchorIndex:
+    """
+    beacon 位置的空间索引（KD 树）
+
+    大型场所有成千上万个 beacon 时，以跟踪器的上一个位置为中心：
+    只把最近的若干个 beacon 交给求解器，并把离得太远、不可能收到的 beacon 当作误检剔除，
+    求解耗时与场所规模无关。
+    """
+
+    def __init__(self, anchors: np.ndarray, leafsize: int = 16):
+        """
+        初始化索引
+
+        Args:
+            anchors: 全部 beacon 位置 (N, 3)
+            leafsize: KD 树叶节点大小
+        """
+        self.anchors = np.array(anchors, dtype=np.float64).reshape(-1, 3)
+        self.tree = cKDTree(self.anchors, leafsize=leafsize)
+
+    def within(self, position: np.ndarray, radius: float) -> np.ndarray:
+        """
+        返回距离 position 不超过 radius 的 beacon 编号（升序）
+
+        Args:
+            position: 中心位置 [x, y, z]
+            radius: 半径（米）
+        """
+        return np.array(sorted(self.tree.query_ball_point(position, radius)), dtype=np.intp)
+
+    def nearest(self, position: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        返回距离 position 最近的 k 个 beacon
+
+        Args:
+            position: 中心位置 [x, y, z]
+            k: 数量
+
+        Returns:
+            (beacon 编号, 距离)，按距离升序
+        """
+        k = min(k, len(self.anchors))
+        distances, indices = self.tree.query(position, k=k)
+        return np.atleast_1d(indices), np.atleast_1d(distances)
+
+    def select(self, indices, position: Optional[np.ndarray], max_anchors: Optional[int] = None,
+               reach: Optional[float] = None) -> np.ndarray:
+        """
+        从检测到的 beacon 中选出交给求解器的 beacon
+
+        Args:
+            indices: 检测到的 beacon 编号
+            position: 跟踪器的上一个位置，None 表示尚未定位（全部保留）
+            max_anchors: 最多保留的 beacon 数量（离 position 最近的优先），None 表示不限
+            reach: beacon 离 position 超过该距离（米）时视为不可能收到而剔除，None 表示不检查
+
+        Returns:
+            与 indices 对应的布尔数组，True 表示保留
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        keep = np.ones(len(indices), dtype=bool)
+        if position is None or len(indices) == 0:
+            return keep
+
+        if reach is not None:
+            keep &= np.isin(indices, self.tree.query_ball_point(position, reach))
+        if max_anchors is not None and keep.sum() > max_anchors:
+            keep &= np.isin(indices, self._nearest_among(indices[keep], position, max_anchors))
+        return keep
+
+    def _nearest_among(self, candidates: np.ndarray, position: np.ndarray, k: int) -> np.ndarray:
+        """
+        返回 candidates 中离 position 最近的 k 个 beacon 编号
+
+        按 KD 树的近邻顺序逐步扩大查询数量，直到其中包含 k 个候选 beacon，
+        不需要计算全部候选的距离
+        """
+        total = len(self.anchors)
+        count = min(2 * k, total)
+        while True:
+            nearest, _ = self.nearest(position, count)
+            found = nearest[np.isin(nearest, candidates)]
+            if len(found) >= k or count == total:
+                return found[:k]
+            count = min(2 * count, total)
+
+
+class GridLocator:
+    """
+    网格似然定位
+
+    把房间离散为体素网格，启动时一次性计算所有体素到各 beacon 的距离，
+    每次定位用一次数组广播计算整个网格上的似然，取最大值或后验均值。
+    耗时只取决于体素数量，不会陷入局部最优，对多峰（如 beacon 共面时的镜像解）更稳健。
+    可选在粗网格结果附近用细网格再计算一次，以较少的内存得到较高的精度。
+    """
+
+    ESTIMATES = ('argmax', 'mean')
+
+    def __init__(self, anchors: np.ndarray, room_size, resolution: float = 0.5,
+                 fine_resolution: Optional[float] = None, sigma: float = 1.0,
+                 origin=(0.0, 0.0, 0.0)):
+        """
+        初始化网格
+
+        Args:
+            anchors: 全部 beacon 位置 (N, 3)
+            room_size: 房间尺寸 [宽度, 深度, 高度]
+            resolution: 粗网格体素边长（米）
+            fine_resolution: 细网格体素边长（米），None 表示不做细化
+            sigma: 距离误差尺度（米），似然为 exp(-sum(w * (r - d)^2) / (2 sigma^2))，
+                   w = 1/(d+0.5) 与 least_squares_3d 的权重一致
+            origin: 房间原点
+        """
+        if resolution <= 0:
+            raise ValueError("resolution 必须大于 0")
+        if fine_resolution is not None and not 0 < fine_resolution < resolution:
+            raise ValueError("fine_resolution 必须大于 0 且小于 resolution")
+
+        self.anchors = np.array(anchors, dtype=np.float64).reshape(-1, 3)
+        self.origin = np.array(origin, dtype=np.float64)
+        self.room_size = np.array(room_size, dtype=np.float64)
+        self.resolution = resolution
+        self.fine_resolution = fine_resolution
+        self.sigma = sigma
+
+        self.points = self._grid(self.origin, self.origin + self.room_size, resolution)
+        # 体素到 beacon 的距离张量 (G, N)，float32 节省内存
+        self.ranges = self._ranges(self.points, self.anchors).astype(np.float32)
+
+    @staticmethod
+    def _grid(lower: np.ndarray, upper: np.ndarray, resolution: float) -> np.ndarray:
+        """lower 与 upper 之间的体素中心 (G, 3)"""
+        axes = []
+        for low, high in zip(lower, upper):
+            count = max(int(np.floor((high - low) / resolution + 1e-9)), 1)
+            axes.append(low + (np.arange(count) + 0.5) * ((high - low) / count))
+        return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+
+    @staticmethod
+    def _ranges(points: np.ndarray, anchors: np.ndarray) -> np.ndarray:
+        diff = points[:, None, :] - anchors[None, :, :]
+        return np.sqrt(np.einsum('gij,gij->gi', diff, diff))
+
+    def _log_likelihood(self, ranges: np.ndarray, distances: np.ndarray) -> np.ndarray:
+        weights = Position3D.range_weights(distances) / (2.0 * self.sigma * self.sigma)
+        residuals = ranges - distances
+        return -((residuals * residuals) @ weights)
+
+    def _estimate(self, points: np.ndarray, log_likelihood: np.ndarray, estimate: str) -> np.ndarray:
+        if estimate == 'argmax':
+            return points[np.argmax(log_likelihood)]
+        weights = np.exp(log_likelihood - log_likelihood.max())
+        return weights @ points / weights.sum()
+
+    def log_likelihood(self, distances: np.ndarray, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        计算粗网格上每个体素的对数似然
+
+        Args:
+            distances: 测量距离，与 indices 对应
+            indices: 测量对应的 beacon 编号，None 表示全部 beacon 依次对应
+
+        Returns:
+            对数似然 (G,)，与 points 一一对应
+        """
+        distances = np.asarray(distances, dtype=np.float32)
+        ranges = self.ranges if indices is None else self.ranges[:, np.asarray(indices)]
+        return self._log_likelihood(ranges, distances)
+
+    def locate(self, distances: np.ndarray, indices: Optional[np.ndarray] = None,
+               estimate: str = 'argmax') -> Optional[np.ndarray]:
+        """
+        网格似然定位
+
+        Args:
+            distances: 测量距离，与 indices 对应
+            indices: 测量对应的 beacon 编号，None 表示全部 beacon 依次对应
+            estimate: 'argmax' 取似然最大的体素，'mean' 取后验均值
+
+        Returns:
+            估算位置 [x, y, z]，没有测量时返回 None
+        """
+        if estimate not in self.ESTIMATES:
+            raise ValueError(f"未知的估计方式: {estimate}")
+        if len(distances) == 0:
+            return None
+
+        position = self._estimate(self.points, self.log_likelihood(distances, indices), estimate)
+        if self.fine_resolution is None:
+            return position
+
+        # 在粗网格结果周围 ±resolution 的范围内用细网格重新计算
+        lower = np.maximum(position - self.resolution, self.origin)
+        upper = np.minimum(position + self.resolution, self.origin + self.room_size)
+        points = self._grid(lower, upper, self.fine_resolution)
+        anchors = self.anchors if indices is None else self.anchors[np.asarray(indices)]
+        ranges = self._ranges(points, anchors)
+        log_likelihood = self._log_likelihood(ranges, np.asarray(distances, dtype=np.float64))
+        return self._estimate(points, log_likelihood, estimate)
+
+
+class ParticleFilter3D:
+    """
+    基于距离测量的粒子滤波跟踪器
+
+    直接使用各 beacon 的距离测量更新粒子权重，不需要先三边测量，
+    每收到一个 beacon 的距离就可以更新一次。粒子的传播、加权和系统重采样都是数组运算，
+    粒子被限制在房间范围内。
+    """
+
+    def __init__(self, anchors: np.ndarray, room_size, num_particles: int = 5000,
+                 process_noise: float = 0.5, range_sigma: float = 1.5,
+                 resample_threshold: float = 0.5, origin=(0.0, 0.0, 0.0),
+                 seed: Optional[int] = None):
+        """
+        初始化粒子滤波器
+
+        Args:
+            anchors: 全部 beacon 位置 (N, 3)
+            room_size: 房间尺寸 [宽度, 深度, 高度]
+            num_particles: 粒子数量
+            process_noise: 运动噪声（米/sqrt(秒)），传播 dt 秒时每轴的标准差为 process_noise * sqrt(dt)
+            range_sigma: 距离误差尺度（米），似然与 GridLocator 相同
+            resample_threshold: 有效粒子数低于 resample_threshold * num_particles 时重采样
+            origin: 房间原点
+            seed: 随机数种子
+        """
+        if num_particles <= 0:
+            raise ValueError("num_particles 必须大于 0")
+
+        self.anchors = np.array(anchors, dtype=np.float64).reshape(-1, 3)
+        self.lower = np.array(origin, dtype=np.float64)
+        self.upper = self.lower + np.array(room_size, dtype=np.float64)
+        self.num_particles = num_particles
+        self.process_noise = process_noise
+        self.range_sigma = range_sigma
+        self.resample_threshold = resample_threshold
+        self.random = np.random.default_rng(seed)
+
+        self.particles = np.empty((num_particles, 3))
+        self.weights = np.full(num_particles, 1.0 / num_particles)
+        self.estimated_position: Optional[np.ndarray] = None
+        self.initialize()
+
+    def initialize(self, position: Optional[np.ndarray] = None, spread: float = 1.0):
+        """
+        重新撒布粒子
+
+        Args:
+            position: 初始位置，None 表示在整个房间内均匀分布
+            spread: 给定初始位置时粒子分布的标准差（米）
+        """
+        if position is None:
+            self.particles[:] = self.random.uniform(self.lower, self.upper, self.particles.shape)
+            self.estimated_position = None
+        else:
+            self.particles[:] = self.random.normal(position, spread, self.particles.shape)
+            np.clip(self.particles, self.lower, self.upper, out=self.particles)
+            self.estimated_position = np.array(position, dtype=np.float64)
+        self.weights.fill(1.0 / self.num_particles)
+
+    def propagate(self, dt: float):
+        """
+        运动模型：随机游走，传播后限制在房间范围内
+
+        Args:
+            dt: 距上次传播的时间（秒）
+        """
+        if dt <= 0:
+            return
+        noise = self.random.standard_normal(self.particles.shape)
+        noise *= self.process_noise * np.sqrt(dt)
+        self.particles += noise
+        np.clip(self.particles, self.lower, self.upper, out=self.particles)
+
+    def update(self, distances, indices=None) -> np.ndarray:
+        """
+        用一个或多个 beacon 的距离测量更新粒子权重
+
+        Args:
+            distances: 测量距离，与 indices 对应
+            indices: 测量对应的 beacon 编号，None 表示全部 beacon 依次对应
+
+        Returns:
+            更新后的估算位置
+        """
+        distances = np.atleast_1d(np.asarray(distances, dtype=np.float64))
+        anchors = self.anchors if indices is None else self.anchors[np.atleast_1d(indices)]
+
+        diff = self.particles[:, None, :] - anchors[None, :, :]
+        residuals = np.sqrt(np.einsum('pij,pij->pi', diff, diff)) - distances
+        weights = Position3D.range_weights(distances) / (2.0 * self.range_sigma * self.range_sigma)
+        log_likelihood = -((residuals * residuals) @ weights)
+
+        # 在对数域中归一化，避免所有权重下溢为 0
+        log_likelihood -= log_likelihood.max()
+        self.weights *= np.exp(log_likelihood)
+        total = self.weights.sum()
+        if total <= 0 or not np.isfinite(total):
+            self.weights.fill(1.0 / self.num_particles)
+        else:
+            self.weights /= total
+
+        if self.effective_particles() < self.resample_threshold * self.num_particles:
+            self.resample()
+
+        self.estimated_position = self.weights @ self.particles
+        return self.estimated_position
+
+    def update_range(self, index: int, distance: float) -> np.ndarray:
+        """单个 beacon 的距离测量更新（收到一包就可以调用一次）"""
+        return self.update([distance], [index])
+
+    def effective_particles(self) -> float:
+        """有效粒子数 1 / sum(w^2)"""
+        return 1.0 / float(self.weights @ self.weights)
+
+    def resample(self):
+        """系统重采样"""
+        positions = (self.random.random() + np.arange(self.num_particles)) / self.num_particles
+        cumulative = np.cumsum(self.weights)
+        cumulative[-1] = 1.0
+        indices = np.searchsorted(cumulative, positions)
+        self.particles[:] = self.particles[indices]
+        self.weights.fill(1.0 / self.num_particles)
+
+    def predict(self) -> Optional[np.ndarray]:
+        """
+        当前估算位置（与 KalmanFilter3D.predict 接口一致），尚无测量时返回 None
+        """
+        if self.estimated_position is None:
+            return None
+        return self.estimated_position.copy()
+
+    def spread(self) -> np.ndarray:
+        """粒子分布的加权标准差 [sx, sy, sz]，可作为定位不确定度"""
+        mean = self.weights @ self.particles
+        centered = self.particles - mean
+        return np.sqrt(self.weights @ (centered * centered))
+
+
+class KalmanFilter3D:
+    """简单的 3D 卡尔曼滤波器，用于平滑位置估算"""
+
+    def __init__(self, process_variance: float = 1e-3, measurement_variance: float = 0.1):
+        """
+        初始化卡尔曼滤波器
+
+        Args:
+            process_variance: 过程噪声方差
+            measurement_variance: 测量噪声方差
+        """
+        self.process_variance = process_variance
+        self.measurement_variance = measurement_variance
+        self.estimated_position = None
+        self.estimation_error = np.eye(3)
+
+    def predict(self, dt: float = 0.0) -> Optional[np.ndarray]:
+        """
+        预测下一次测量时的位置（静态模型：即当前估算位置），可用作求解器的热启动初始值
+
+        Args:
+            dt: 距上次更新的时间（秒），静态模型忽略，与 ConstantVelocityKalmanFilter3D 接口一致
+
+        Returns:
+            预测位置，尚无估算时返回 None
+        """
+        if self.estimated_position is None:
+            return None
+        return self.estimated_position.copy()
+
+    def update(self, measured_position: np.ndarray, dt: Optional[float] = None) -> np.ndarray:
+        """
+        更新滤波器
+
+        Args:
+            measured_position: 测量得到的位置
+            dt: 距上次更新的时间（秒），静态模型忽略
+
+        Returns:
+            滤波后的位置
+        """
+        if self.estimated_position is None:
+            # 第一次测量，直接使用测量值
+            self.estimated_position = measured_position.copy()
+            return self.estimated_position
+
+        # 预测步骤
+        predicted_position = self.estimated_position
+        predicted_error = self.estimation_error + self.process_variance * np.eye(3)
+
+        # 更新步骤
+        measurement_cov = self.measurement_variance * np.eye(3)
+        kalman_gain = predicted_error @ np.linalg.inv(predicted_error + measurement_cov)
+        self.estimated_position = predicted_position + kalman_gain @ (measured_position - predicted_position)
+        self.estimation_error = (np.eye(3) - kalman_gain) @ predicted_error
+
+        return self.estimated_position
+
+
+class ConstantVelocityKalmanFilter3D:
+    """
+    匀速模型卡尔曼滤波器（状态 [x, y, z, vx, vy, vz]）
+
+    过程噪声为白噪声加速度模型，测量为位置。三个轴的过程噪声和测量噪声相同且互不耦合，
+    6×6 协方差等于每轴 2×2 协方差 [[pp, pv], [pv, vv]] 与单位阵的 Kronecker 积，
+    因此只保存这 3 个数；新息协方差是标量，增益不需要矩阵求逆。
+    状态在预分配的缓冲区中原地更新，每次更新不分配新数组。
+    """
+
+    def __init__(self, process_noise: float = 0.5, measurement_variance: float = 1.5,
+                 initial_velocity_variance: float = 1.0, max_dt: float = 5.0):
+        """
+        初始化滤波器
+
+        Args:
+            process_noise: 加速度噪声谱密度 q（米²/秒³）
+            measurement_variance: 位置测量噪声方差（米²）
+            initial_velocity_variance: 首次测量后速度的初始方差（米²/秒²）
+            max_dt: 单次预测的最大时间步（秒），长时间无测量时避免速度外推过远
+        """
+        self.process_noise = process_noise
+        self.measurement_variance = measurement_variance
+        self.initial_velocity_variance = initial_velocity_variance
+        self.max_dt = max_dt
+
+        self.state = np.zeros(6)
+        self.position = self.state[:3]
+        self.velocity = self.state[3:]
+        self.covariance = np.zeros(3)  # 每轴 [pp, pv, vv]
+        self.initialized = False
+        self._scratch = np.empty(3)
+        self._step = np.empty(3)
+
+    @property
+    def estimated_position(self) -> Optional[np.ndarray]:
+        """当前估算位置（内部缓冲区的视图），尚无测量时为 None"""
+        return self.position if self.initialized else None
+
+    def reset(self):
+        """清除状态，下一次测量重新初始化"""
+        self.state.fill(0.0)
+        self.covariance.fill(0.0)
+        self.initialized = False
+
+    def propagate(self, dt: float):
+        """
+        时间更新：按匀速模型原地外推 dt 秒
+
+        Args:
+            dt: 时间步（秒）
+        """
+        if not self.initialized or dt <= 0:
+            return
+        dt = min(dt, self.max_dt)
+        pp, pv, vv = self.covariance
+        q = self.process_noise
+        self.covariance[0] = pp + dt * (2.0 * pv + dt * vv) + q * dt ** 3 / 3.0
+        self.covariance[1] = pv + dt * vv + q * dt * dt / 2.0
+        self.covariance[2] = vv + q * dt
+
+        np.multiply(self.velocity, dt, out=self._scratch)
+        self.position += self._scratch
+
+    def predict(self, dt: float = 0.0) -> Optional[np.ndarray]:
+        """
+        预测 dt 秒后的位置（不改变状态），可用作求解器的热启动初始值
+
+        Args:
+            dt: 距上次更新的时间（秒）
+
+        Returns:
+            预测位置，尚无测量时返回 None
+        """
+        if not self.initialized:
+            return None
+        return self.position + min(max(dt, 0.0), self.max_dt) * self.velocity
+
+    def update(self, measured_position: np.ndarray, dt: Optional[float] = None) -> np.ndarray:
+        """
+        先外推 dt 秒再用位置测量更新
+
+        Args:
+            measured_position: 测量得到的位置
+            dt: 距上次更新的时间（秒），None 表示不外推
+
+        Returns:
+            滤波后的位置（内部缓冲区的视图，需要保留时请复制）
+        """
+        if not self.initialized:
+            # 第一次测量，直接使用测量值，速度为 0
+            self.position[:] = measured_position
+            self.velocity.fill(0.0)
+            self.covariance[:] = (self.measurement_variance, 0.0, self.initial_velocity_variance)
+            self.initialized = True
+            return self.position
+
+        if dt is not None:
+            self.propagate(dt)
+
+        pp, pv, vv = self.covariance
+        innovation_variance = pp + self.measurement_variance
+        position_gain = pp / innovation_variance
+        velocity_gain = pv / innovation_variance
+
+        innovation = np.subtract(measured_position, self.position, out=self._scratch)
+        np.multiply(innovation, velocity_gain, out=self._step)
+        self.velocity += self._step
+        innovation *= position_gain
+        self.position += innovation
+
+        self.covariance[0] = (1.0 - position_gain) * pp
+        self.covariance[1] = (1.0 - position_gain) * pv
+        self.covariance[2] = vv - velocity_gain * pv
+        return self.position
+
+
+class BatchConstantVelocityKalmanFilter:
+    """
+    多标签批量匀速模型卡尔曼滤波器
+
+    与 ConstantVelocityKalmanFilter3D 的模型相同，T 个标签的状态保存在一个 (T, 6) 数组中，
+    每轴协方差保存在 (T, 3) 数组中，一次调用更新全部标签。
+    所有中间结果写入预分配的缓冲区，更新过程不分配与标签数成比例的数组。
+    """
+
+    def __init__(self, num_tags: int, process_noise: float = 0.5, measurement_variance: float = 1.5,
+                 initial_velocity_variance: float = 1.0, max_dt: float = 5.0):
+        """
+        初始化批量滤波器
+
+        Args:
+            num_tags: 标签数量
+            process_noise: 加速度噪声谱密度 q（米²/秒³）
+            measurement_variance: 位置测量噪声方差（米²）
+            initial_velocity_variance: 首次测量后速度的初始方差（米²/秒²）
+            max_dt: 单次预测的最大时间步（秒）
+        """
+        self.num_tags = num_tags
+        self.process_noise = process_noise
+        self.measurement_variance = measurement_variance
+        self.initial_velocity_variance = initial_velocity_variance
+        self.max_dt = max_dt
+
+        self.states = np.zeros((num_tags, 6))
+        self.positions = self.states[:, :3]
+        self.velocities = self.states[:, 3:]
+        self.covariances = np.zeros((num_tags, 3))  # 每个标签每轴 [pp, pv, vv]
+        self.initialized = np.zeros(num_tags, dtype=bool)
+
+        # 预分配缓冲区
+        self._dt = np.empty(num_tags)
+        self._a = np.empty(num_tags)
+        self._b = np.empty(num_tags)
+        self._vector = np.empty((num_tags, 3))
+        self._step = np.empty((num_tags, 3))
+        self._measured = np.empty(num_tags, dtype=bool)
+        self._unmeasured = np.empty(num_tags, dtype=bool)
+        self._first = np.empty(num_tags, dtype=bool)
+
+    def reset(self, tags=None):
+        """
+        清除标签状态
+
+        Args:
+            tags: 标签编号或布尔掩码，None 表示全部
+        """
+        tags = slice(None) if tags is None else tags
+        self.states[tags] = 0.0
+        self.covariances[tags] = 0.0
+        self.initialized[tags] = False
+
+    def propagate(self, dt):
+        """
+        时间更新：全部已初始化的标签原地外推
+
+        Args:
+            dt: 时间步（秒），标量或 (T,) 数组
+        """
+        dt_ = self._dt
+        dt_[:] = dt
+        np.clip(dt_, 0.0, self.max_dt, out=dt_)
+        dt_ *= self.initialized
+
+        pp = self.covariances[:, 0]
+        pv = self.covariances[:, 1]
+        vv = self.covariances[:, 2]
+        a, b, q = self._a, self._b, self.process_noise
+
+        # pp += dt * (2 pv + dt vv) + q dt^3 / 3
+        np.multiply(dt_, vv, out=a)
+        a += pv
+        a += pv
+        a *= dt_
+        pp += a
+        np.multiply(dt_, dt_, out=b)
+        b *= dt_
+        b *= q / 3.0
+        pp += b
+        # pv += dt vv + q dt^2 / 2
+        np.multiply(dt_, vv, out=a)
+        pv += a
+        np.multiply(dt_, dt_, out=b)
+        b *= q / 2.0
+        pv += b
+        # vv += q dt
+        np.multiply(dt_, q, out=a)
+        vv += a
+
+        np.multiply(self.velocities, dt_[:, None], out=self._vector)
+        self.positions += self._vector
+
+    def update(self, measurements: np.ndarray, dt=None, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        先外推 dt 秒，再用各标签的位置测量更新
+
+        Args:
+            measurements: 位置测量 (T, 3)，未测量标签的行被忽略
+            dt: 时间步（秒），标量或 (T,) 数组，None 表示不外推
+            mask: (T,) 布尔数组，True 表示该标签本次有测量，None 表示全部有测量
+
+        Returns:
+            全部标签的滤波后位置 (T, 3)（内部缓冲区的视图）
+        """
+        measured = self._measured
+        if mask is None:
+            measured.fill(True)
+        else:
+            measured[:] = mask
+
+        if dt is not None:
+            self.propagate(dt)
+
+        # 首次测量的标签直接使用测量值
+        first = np.logical_and(measured, np.logical_not(self.initialized, out=self._first), out=self._first)
+        np.logical_and(measured, self.initialized, out=measured)
+
+        pp = self.covariances[:, 0]
+        pv = self.covariances[:, 1]
+        vv = self.covariances[:, 2]
+        position_gain, velocity_gain = self._a, self._b
+
+        # 增益 = [pp, pv] / (pp + R)，未测量标签的增益为 0
+        np.add(pp, self.measurement_variance, out=velocity_gain)
+        np.divide(pp, velocity_gain, out=position_gain)
+        np.divide(pv, velocity_gain, out=velocity_gain)
+        position_gain *= measured
+        velocity_gain *= measured
+
+        # 未测量标签的测量可能是 NaN，新息置 0 而不是乘以 0 增益
+        unmeasured = np.logical_not(measured, out=self._unmeasured)
+        innovation = np.subtract(measurements, self.positions, out=self._vector)
+        np.copyto(innovation, 0.0, where=unmeasured[:, None])
+        np.multiply(innovation, velocity_gain[:, None], out=self._step)
+        self.velocities += self._step
+        innovation *= position_gain[:, None]
+        self.positions += innovation
+
+        # 协方差：vv -= kv pv，pv *= 1 - kp，pp *= 1 - kp
+        np.multiply(velocity_gain, pv, out=velocity_gain)
+        vv -= velocity_gain
+        np.subtract(1.0, position_gain, out=position_gain)
+        pv *= position_gain
+        pp *= position_gain
+
+        if first.any():
+            np.copyto(self.positions, measurements, where=first[:, None])
+            np.copyto(self.velocities, 0.0, where=first[:, None])
+            np.copyto(pp, self.measurement_variance, where=first)
+            np.copyto(pv, 0.0, where=first)
+            np.copyto(vv, self.initial_velocity_variance, where=first)
+            np.logical_or(self.initialized, first, out=self.initialized)
+
+        return self.positions
+
+
+class RangeExtendedKalmanFilter3D:
+    """
+    距离域扩展卡尔曼滤波器（状态 [x, y, z, vx, vy, vz]，匀速模型）
+
+    每个 beacon 的一次距离（或 RSSI）测量作为一个标量观测立即更新，不需要先三边测量，
+    只看到 1~2 个 beacon 时也能持续跟踪（不可观测的方向由运动模型和先验维持）。
+    观测雅可比只有位置部分的 3 个非零元素，新息协方差是标量。
+
+    beacon 共面时，标签离平面较近处距离对 z 几乎不敏感：z 实际上不可观测，会在平面两侧的镜像解之间游走，
+    落到镜像一侧时被房间边界截住（通常停在地面）。此时 spread() 的 z 分量保持在上限附近，
+    使用者应据此判断 z 不可信；需要 z 时应让 beacon 分布在不同高度。
+    """
+
+    def __init__(self, anchors: np.ndarray, process_noise: float = 0.5, range_sigma: float = 0.3,
+                 rssi_sigma: float = 4.0, room_size=None, origin=(0.0, 0.0, 0.0),
+                 initial_velocity_variance: float = 1.0, max_dt: float = 5.0):
+        """
+        初始化滤波器
+
+        Args:
+            anchors: 全部 beacon 位置 (N, 3)
+            process_noise: 加速度噪声谱密度 q（米²/秒³）
+            range_sigma: 距离测量的相对误差，标准差为 range_sigma * (d + 0.5)（与 range_weights 一致）
+            rssi_sigma: RSSI 测量标准差（dB）
+            room_size: 房间尺寸 [宽度, 深度, 高度]，给定时位置限制在房间范围内
+            origin: 房间原点
+            initial_velocity_variance: 初始速度方差（米²/秒²）
+            max_dt: 单次预测的最大时间步（秒）
+        """
+        self.anchors = np.array(anchors, dtype=np.float64).reshape(-1, 3)
+        self.process_noise = process_noise
+        self.range_sigma = range_sigma
+        self.rssi_sigma = rssi_sigma
+        self.initial_velocity_variance = initial_velocity_variance
+        self.max_dt = max_dt
+
+        if room_size is not None:
+            self.lower = np.array(origin, dtype=np.float64)
+            self.upper = self.lower + np.array(room_size, dtype=np.float64)
+        else:
+            self.lower = self.upper = None
+
+        self.state = np.zeros(6)
+        self.position = self.state[:3]
+        self.velocity = self.state[3:]
+        self.covariance = np.zeros((6, 6))
+        self.initialized = False
+        self.initialize()
+
+    def initialize(self, position: Optional[np.ndarray] = None, variance: Optional[float] = None):
+        """
+        设置初始状态
+
+        Args:
+            position: 初始位置，None 表示房间中心（未给定房间时为 beacon 中心）
+            variance: 初始位置方差（米²），None 表示按房间（或 beacon 分布）大小取值
+        """
+        if self.lower is not None:
+            center, extent = (self.lower + self.upper) / 2, self.upper - self.lower
+        else:
+            center = self.anchors.mean(axis=0)
+            extent = np.ptp(self.anchors, axis=0) + 1.0
+        if variance is None:
+            variance = float(np.max(extent) / 2) ** 2
+        self.max_variance = variance
+
+        self.position[:] = center if position is None else position
+        self.velocity.fill(0.0)
+        self.covariance.fill(0.0)
+        self.covariance[:3, :3] = np.eye(3) * variance
+        self.covariance[3:, 3:] = np.eye(3) * self.initial_velocity_variance
+        self.initialized = position is not None
+
+    @property
+    def estimated_position(self) -> Optional[np.ndarray]:
+        """当前估算位置（内部缓冲区的视图），尚无测量时为 None"""
+        return self.position if self.initialized else None
+
+    def propagate(self, dt: float):
+        """
+        时间更新：按匀速模型原地外推 dt 秒
+
+        Args:
+            dt: 时间步（秒）
+        """
+        if dt <= 0:
+            return
+        dt = min(dt, self.max_dt)
+        q = self.process_noise
+        P = self.covariance
+        pp, pv, vp, vv = P[:3, :3], P[:3, 3:], P[3:, :3], P[3:, 3:]
+
+        # P = F P F^T + Q，F = [[I, dt I], [0, I]]
+        pp += dt * (pv + vp) + dt * dt * vv
+        pv += dt * vv
+        vp += dt * vv
+        diagonal = np.arange(3)
+        pp[diagonal, diagonal] += q * dt ** 3 / 3.0
+        pv[diagonal, diagonal] += q * dt * dt / 2.0
+        vp[diagonal, diagonal] += q * dt * dt / 2.0
+        vv[diagonal, diagonal] += q * dt
+
+        # 不可观测方向（例如 beacon 共面时的 z）的方差不超过初始方差：
+        # 对相应行列做对称缩放，协方差保持半正定
+        variances = pp[diagonal, diagonal]
+        if np.any(variances > self.max_variance):
+            scale = np.ones(6)
+            scale[:3] = np.sqrt(np.minimum(1.0, self.max_variance / variances))
+            P *= np.outer(scale, scale)
+
+        self.position += dt * self.velocity
+        self._clamp()
+
+    def predict(self, dt: float = 0.0) -> Optional[np.ndarray]:
+        """
+        预测 dt 秒后的位置（不改变状态）
+
+        Args:
+            dt: 距上次更新的时间（秒）
+
+        Returns:
+            预测位置，尚无测量时返回 None
+        """
+        if not self.initialized:
+            return None
+        return self.position + min(max(dt, 0.0), self.max_dt) * self.velocity
+
+    def update_range(self, index: int, distance: float) -> np.ndarray:
+        """
+        用第 index 个 beacon 的一次距离测量更新
+
+        Args:
+            index: beacon 编号
+            distance: 测量距离（米）
+
+        Returns:
+            更新后的位置（内部缓冲区的视图）
+        """
+        direction, predicted = self._direction(index)
+        if direction is not None:
+            sigma = self.range_sigma * (distance + 0.5)
+            self._correct(direction, distance - predicted, sigma * sigma)
+        return self.position
+
+    def update_rssi(self, index: int, rssi: float, tx_power: float,
+                    environment_factor: float) -> np.ndarray:
+        """
+        用第 index 个 beacon 的一次 RSSI 测量更新（路径损耗模型作为观测方程，噪声在 dB 域近似高斯）
+
+        Args:
+            index: beacon 编号
+            rssi: 接收信号强度（dBm）
+            tx_power: 1 米处信号强度（dBm）
+            environment_factor: 环境衰减因子 n
+
+        Returns:
+            更新后的位置（内部缓冲区的视图）
+        """
+        direction, predicted = self._direction(index)
+        if direction is not None:
+            distance = max(predicted, 0.1)
+            slope = -10.0 * environment_factor / (np.log(10.0) * distance)
+            predicted_rssi = tx_power - 10.0 * environment_factor * np.log10(distance)
+            self._correct(direction * slope, rssi - predicted_rssi, self.rssi_sigma * self.rssi_sigma)
+        return self.position
+
+    def spread(self) -> np.ndarray:
+        """位置标准差 [sx, sy, sz]"""
+        return np.sqrt(np.diag(self.covariance)[:3])
+
+    def _direction(self, index: int):
+        """返回 (当前位置指向 beacon 的反方向单位向量, 预测距离)，与 beacon 重合时返回 (None, 0)"""
+        diff = self.position - self.anchors[index]
+        predicted = float(np.sqrt(diff @ diff))
+        if predicted < 1e-6:
+            return None, 0.0
+        return diff / predicted, predicted
+
+    def _correct(self, jacobian: np.ndarray, innovation: float, variance: float):
+        """
+        标量观测更新
+
+        Args:
+            jacobian: 观测对位置的梯度 (3,)（对速度的梯度为 0）
+            innovation: 测量值减预测值
+            variance: 观测噪声方差
+        """
+        ph = self.covariance[:, :3] @ jacobian
+        innovation_variance = float(jacobian @ ph[:3]) + variance
+        gain = ph / innovation_variance
+        self.state += gain * innovation
+        self.covariance -= np.outer(gain, ph)
+        self.initialized = True
+        self._clamp()
+
+    def _clamp(self):
+        """位置限制在房间范围内，被边界截住的轴上朝外的速度置零（否则外推会持续把位置推向边界）"""
+        if self.lower is not None:
+            below = self.position < self.lower
+            above = self.position > self.upper
+            np.clip(self.position, self.lower, self.upper, out=self.position)
+            self.velocity[(below & (self.velocity < 0)) | (above & (self.velocity > 0))] = 0.0
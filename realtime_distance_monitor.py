@@ -3,9 +3,9 @@ Real-time iBeacon Distance Monitor
 Distance monitoring tool with real-time chart visualization
 """
 import asyncio
-import math
-from bleak import BleakScanner
-from ibeacon_parser import IBeaconParser
+from ibeacon_parser import IBeaconParseCache
+from ibeacon_scanner import DistanceEstimator
+from advertisement_source import create_source, add_source_arguments, source_spec_from_args
 from typing import Optional, List
 from datetime import datetime
 import matplotlib.pyplot as plt
@@ -21,15 +21,20 @@ matplotlib.rcParams['axes.unicode_minus'] = False
 class RealtimeDistanceMonitor:
     """Real-time Distance Monitor (with visualization)"""
 
-    def __init__(self, environment_factor: float = 3.0, history_size: int = 50):
+    def __init__(self, environment_factor: float = 3.0, history_size: int = 50,
+                 source: Optional[dict] = None):
         """
         Initialize monitor
 
         Args:
             environment_factor: Environment attenuation factor
             history_size: Number of historical data points to keep
+            source: Advertisement source spec (see advertisement_source.create_source),
+                    None means the Bluetooth adapter
         """
         self.environment_factor = environment_factor
+        self.distance_estimator = DistanceEstimator(environment_factor)
+        self.source = source
         self.history_size = history_size
 
         # Data storage
@@ -40,20 +45,15 @@ class RealtimeDistanceMonitor:
         # Target beacon
         self.target_beacon = None
         self.beacon_info = {}
+        self.parse_cache = IBeaconParseCache()  # Parse cache for repeated payloads
 
         # Visualization
         self.fig = None
         self.axes = None
 
     def calculate_distance(self, rssi: int, tx_power: int) -> float:
-        """Calculate distance"""
-        if rssi == 0:
-            return -1.0
-
-        ratio = (tx_power - rssi) / (10.0 * self.environment_factor)
-        distance = math.pow(10, ratio)
-
-        return distance
+        """Calculate distance (table lookup via DistanceEstimator)"""
+        return self.distance_estimator.estimate_distance(rssi, tx_power, self.environment_factor)
 
     def setup_plot(self):
         """Setup visualization charts"""
@@ -160,49 +160,59 @@ class RealtimeDistanceMonitor:
             plt.ion()  # Interactive mode
             plt.show()
 
+        # Convert target UUID once instead of formatting the UUID string per packet
+        target_uuid_bytes = bytes.fromhex(target_uuid.replace('-', '')) if target_uuid else None
+
+        # Result of the current scan (written by the detection callback)
+        current_beacon = None
+
+        def detection_callback(device, advertisement_data):
+            nonlocal current_beacon
+
+            beacon_data = self.parse_cache.parse(
+                advertisement_data.manufacturer_data,
+                advertisement_data.rssi,
+                advertisement_data.service_data
+            )
+
+            if beacon_data:
+                # Check target matching
+                if target_uuid_bytes and beacon_data.uuid_bytes != target_uuid_bytes:
+                    return
+                if target_major is not None and beacon_data.major != target_major:
+                    return
+                if target_minor is not None and beacon_data.minor != target_minor:
+                    return
+
+                # Lock target
+                if not self.target_beacon:
+                    self.target_beacon = beacon_data.key
+                    self.beacon_info = {
+                        'uuid': beacon_data.uuid,
+                        'major': beacon_data.major,
+                        'minor': beacon_data.minor,
+                        'tx_power': beacon_data.tx_power
+                    }
+                    print(f"\nTarget iBeacon locked:")
+                    print(f"  UUID: {beacon_data.uuid}")
+                    print(f"  Major: {beacon_data.major}")
+                    print(f"  Minor: {beacon_data.minor}")
+                    print(f"  TxPower: {beacon_data.tx_power} dBm\n")
+
+                if self.target_beacon == beacon_data.key:
+                    current_beacon = beacon_data
+
+        # Create the source once so replay sources continue across scans
+        scanner = create_source(self.source, detection_callback=detection_callback)
+
         try:
-            while True:
+            # Replay/synthetic sources are finite: stop once every record has been delivered
+            while not scanner.finished:
                 current_beacon = None
 
-                def detection_callback(device, advertisement_data):
-                    nonlocal current_beacon
-
-                    beacon_data = IBeaconParser.parse(
-                        advertisement_data.manufacturer_data,
-                        advertisement_data.rssi
-                    )
-
-                    if beacon_data:
-                        # Check target matching
-                        if target_uuid and beacon_data.uuid != target_uuid:
-                            return
-                        if target_major is not None and beacon_data.major != target_major:
-                            return
-                        if target_minor is not None and beacon_data.minor != target_minor:
-                            return
-
-                        # Lock target
-                        if not self.target_beacon:
-                            self.target_beacon = (beacon_data.uuid, beacon_data.major, beacon_data.minor)
-                            self.beacon_info = {
-                                'uuid': beacon_data.uuid,
-                                'major': beacon_data.major,
-                                'minor': beacon_data.minor,
-                                'tx_power': beacon_data.tx_power
-                            }
-                            print(f"\nTarget iBeacon locked:")
-                            print(f"  UUID: {beacon_data.uuid}")
-                            print(f"  Major: {beacon_data.major}")
-                            print(f"  Minor: {beacon_data.minor}")
-                            print(f"  TxPower: {beacon_data.tx_power} dBm\n")
-
-                        if self.target_beacon == (beacon_data.uuid, beacon_data.major, beacon_data.minor):
-                            current_beacon = beacon_data
-
                 # Scan
-                scanner = BleakScanner(detection_callback=detection_callback)
                 await scanner.start()
-                await asyncio.sleep(scan_interval)
+                await scanner.sleep(scan_interval)
                 await scanner.stop()
 
                 # Process data
@@ -235,6 +245,8 @@ class RealtimeDistanceMonitor:
                 plt.ioff()
                 print("\nChart window remains open, close it to exit...")
                 plt.show()
+        finally:
+            await scanner.close()
 
 
 async def main():
@@ -251,11 +263,15 @@ async def main():
                        help='Scan interval in seconds (default: 3.0)')
     parser.add_argument('--no-plot', action='store_true',
                        help='Disable chart display')
+    add_source_arguments(parser)
 
     args = parser.parse_args()
 
     print(args)
-    monitor = RealtimeDistanceMonitor(environment_factor=args.env_factor)
+    monitor = RealtimeDistanceMonitor(
+        environment_factor=args.env_factor,
+        source=source_spec_from_args(args)
+    )
 
     await monitor.monitor(
         target_uuid=args.uuid,
@@ -3,8 +3,8 @@
 支持扫描附近的所有蓝牙设备，并可按名称前缀过滤
 """
 import asyncio
-from bleak import BleakScanner
-from ibeacon_parser import IBeaconParser
+from ibeacon_parser import IBeaconParseCache
+from advertisement_source import create_source, add_source_arguments, source_spec_from_args
 import argparse
 from datetime import datetime
 import json
@@ -13,7 +13,7 @@ import json
 class BluetoothBeaconScanner:
     """蓝牙信标扫描器"""
 
-    def __init__(self, name_prefix=None, duration=10.0, show_all=False):
+    def __init__(self, name_prefix=None, duration=10.0, show_all=False, source=None):
         """
         初始化扫描器
 
@@ -21,11 +21,14 @@ class BluetoothBeaconScanner:
             name_prefix: 设备名称前缀过滤（如 "Beacon"）
             duration: 扫描持续时间（秒）
             show_all: 是否显示所有蓝牙设备（包括非iBeacon）
+            source: 广播数据源配置（见 advertisement_source.create_source），None 表示蓝牙适配器
         """
         self.name_prefix = name_prefix
         self.duration = duration
         self.show_all = show_all
+        self.source = source
         self.devices = {}
+        self.parse_cache = IBeaconParseCache()
 
     def _match_prefix(self, name):
         """
@@ -89,9 +92,10 @@ class BluetoothBeaconScanner:
                 return
 
             # 尝试解析 iBeacon 数据
-            beacon_data = IBeaconParser.parse(
+            beacon_data = self.parse_cache.parse(
                 advertisement_data.manufacturer_data,
-                advertisement_data.rssi
+                advertisement_data.rssi,
+                advertisement_data.service_data
             )
 
             # 如果不是 iBeacon 且只显示 iBeacon，则跳过
@@ -110,10 +114,10 @@ class BluetoothBeaconScanner:
             }
 
         # 执行扫描
-        scanner = BleakScanner(detection_callback=detection_callback)
+        scanner = create_source(self.source, detection_callback=detection_callback)
         await scanner.start()
-        await asyncio.sleep(self.duration)
-        await scanner.stop()
+        await scanner.sleep(self.duration)
+        await scanner.close()
 
         print(f"\n✓ 扫描完成！共发现 {len(self.devices)} 个设备")
         print()
@@ -317,13 +321,16 @@ async def main():
         help='导出为 beacon_config.json 格式'
     )
 
+    add_source_arguments(parser)
+
     args = parser.parse_args()
 
     # 创建扫描器
     scanner = BluetoothBeaconScanner(
         name_prefix=args.prefix,
         duration=args.duration,
-        show_all=args.all
+        show_all=args.all,
+        source=source_spec_from_args(args)
     )
 
     try:
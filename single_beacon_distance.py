@@ -3,9 +3,9 @@
 实时扫描单个 iBeacon 并计算距离
 """
 import asyncio
-import math
-from bleak import BleakScanner
-from ibeacon_parser import IBeaconParser
+from ibeacon_parser import IBeaconParseCache
+from ibeacon_scanner import DistanceEstimator
+from advertisement_source import create_source, add_source_arguments, source_spec_from_args
 from typing import Optional
 from datetime import datetime
 
@@ -13,24 +13,27 @@ from datetime import datetime
 class SingleBeaconDistance:
     """单个 iBeacon 距离计算器"""
 
-    def __init__(self, environment_factor: float = 2.5):
+    def __init__(self, environment_factor: float = 2.5, source: Optional[dict] = None):
         """
         初始化距离计算器
 
         Args:
             environment_factor: 环境衰减因子 (室内: 2.5-3.5, 开放空间: 2.0-2.5)
+            source: 广播数据源配置（见 advertisement_source.create_source），None 表示蓝牙适配器
         """
         self.environment_factor = environment_factor
+        self.distance_estimator = DistanceEstimator(environment_factor)
+        self.source = source
         self.target_beacon = None  # 目标 beacon 标识
         self.last_distance = None
         self.distance_history = []  # 历史距离记录
+        self.parse_cache = IBeaconParseCache()  # 重复广播负载的解析缓存
 
     def calculate_distance(self, rssi: int, tx_power: int) -> float:
         """
         根据 RSSI 和 TxPower 计算距离
 
-        使用改进的路径损耗模型：d = 10 ^ ((TxPower - RSSI) / (10 * n))
-        并进行分段校准以提高精度
+        使用路径损耗模型：d = 10 ^ ((TxPower - RSSI) / (10 * n))，由 DistanceEstimator 查表计算
 
         Args:
             rssi: 接收信号强度指示 (dBm)
@@ -39,14 +42,7 @@ class SingleBeaconDistance:
         Returns:
             估算距离 (米)
         """
-        if rssi == 0:
-            return -1.0
-
-        # 基础路径损耗模型
-        ratio = (tx_power - rssi) / (10.0 * self.environment_factor)
-        distance = math.pow(10, ratio)
-
-        return distance
+        return self.distance_estimator.estimate_distance(rssi, tx_power, self.environment_factor)
 
     def get_distance_category(self, distance: float) -> str:
         """
@@ -123,9 +119,51 @@ class SingleBeaconDistance:
 
         beacon_found = False
         scan_count = 0
+        # 预先转换目标 UUID，避免每个广播包都格式化 UUID 字符串
+        target_uuid_bytes = bytes.fromhex(target_uuid.replace('-', '')) if target_uuid else None
+
+        # 本次扫描结果（由检测回调写入）
+        current_beacon = None
+
+        def detection_callback(device, advertisement_data):
+            nonlocal current_beacon, beacon_found
+
+            # 解析 iBeacon
+            beacon_data = self.parse_cache.parse(
+                advertisement_data.manufacturer_data,
+                advertisement_data.rssi,
+                advertisement_data.service_data
+            )
+
+            if beacon_data:
+                # 检查是否匹配目标 beacon
+                if target_uuid_bytes and beacon_data.uuid_bytes != target_uuid_bytes:
+                    return
+                if target_major is not None and beacon_data.major != target_major:
+                    return
+                if target_minor is not None and beacon_data.minor != target_minor:
+                    return
+                print(f"检测到 iBeacon: {beacon_data.uuid}")
+                # 如果没有指定目标，使用第一个检测到的
+                if not self.target_beacon:
+                    self.target_beacon = beacon_data.key
+                    print(f"\n✓ 锁定目标 iBeacon:")
+                    print(f"  UUID: {beacon_data.uuid}")
+                    print(f"  Major: {beacon_data.major}")
+                    print(f"  Minor: {beacon_data.minor}")
+                    print()
+
+                # 检查是否是我们的目标 beacon
+                if self.target_beacon == beacon_data.key:
+                    current_beacon = beacon_data
+                    beacon_found = True
+
+        # 数据源只创建一次，回放数据源可跨多次扫描连续回放
+        scanner = create_source(self.source, detection_callback=detection_callback)
 
         try:
-            while True:
+            # 回放/合成数据源全部送达后结束
+            while not scanner.finished:
                 scan_count += 1
                 print(f"\n[扫描 #{scan_count}] {datetime.now().strftime('%H:%M:%S')}")
                 print("-" * 70)
@@ -133,42 +171,9 @@ class SingleBeaconDistance:
                 # 临时存储本次扫描结果
                 current_beacon = None
 
-                def detection_callback(device, advertisement_data):
-                    nonlocal current_beacon, beacon_found
-
-                    # 解析 iBeacon
-                    beacon_data = IBeaconParser.parse(
-                        advertisement_data.manufacturer_data,
-                        advertisement_data.rssi
-                    )
-
-                    if beacon_data:
-                        # 检查是否匹配目标 beacon
-                        if target_uuid and beacon_data.uuid != target_uuid:
-                            return
-                        if target_major is not None and beacon_data.major != target_major:
-                            return
-                        if target_minor is not None and beacon_data.minor != target_minor:
-                            return
-                        print(f"检测到 iBeacon: {beacon_data.uuid}")
-                        # 如果没有指定目标，使用第一个检测到的
-                        if not self.target_beacon:
-                            self.target_beacon = (beacon_data.uuid, beacon_data.major, beacon_data.minor)
-                            print(f"\n✓ 锁定目标 iBeacon:")
-                            print(f"  UUID: {beacon_data.uuid}")
-                            print(f"  Major: {beacon_data.major}")
-                            print(f"  Minor: {beacon_data.minor}")
-                            print()
-
-                        # 检查是否是我们的目标 beacon
-                        if self.target_beacon == (beacon_data.uuid, beacon_data.major, beacon_data.minor):
-                            current_beacon = beacon_data
-                            beacon_found = True
-
                 # 执行扫描
-                scanner = BleakScanner(detection_callback=detection_callback)
                 await scanner.start()
-                await asyncio.sleep(duration)
+                await scanner.sleep(duration)
                 await scanner.stop()
 
                 # 处理扫描结果
@@ -215,6 +220,8 @@ class SingleBeaconDistance:
 
         except KeyboardInterrupt:
             print("\n\n程序已停止")
+        finally:
+            await scanner.close()
 
 
 async def main():
@@ -231,11 +238,15 @@ async def main():
                        help='扫描持续时间/秒 (默认: 2.0)')
     parser.add_argument('--continuous', action='store_true',
                        help='持续扫描模式')
+    add_source_arguments(parser)
 
     args = parser.parse_args()
 
     # 创建距离计算器
-    calculator = SingleBeaconDistance(environment_factor=args.env_factor)
+    calculator = SingleBeaconDistance(
+        environment_factor=args.env_factor,
+        source=source_spec_from_args(args)
+    )
 
     # 开始扫描
     await calculator.scan_single_beacon(
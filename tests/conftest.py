@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 测试直接导入仓库根目录下的模块；可视化使用无界面后端
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MPLBACKEND', 'Agg')
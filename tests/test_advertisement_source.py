@@ -0,0 +1,68 @@
+"""广播数据源测试"""
+import asyncio
+import json
+
+from advertisement_source import Advertisement, CaptureRecorder, SourceDevice, create_source
+
+BEACONS = [
+    {'uuid': 'FDA50693-A4E2-4FB1-AFCF-C6EB07647825', 'major': 1, 'minor': i,
+     'position': position, 'name': f'B{i}'}
+    for i, position in enumerate([[0, 0, 0], [10, 0, 0], [0, 10, 0]])
+]
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_recorder_lines_reach_the_file_before_close(tmp_path):
+    path = tmp_path / 'capture.jsonl'
+    with CaptureRecorder(str(path)) as recorder:
+        recorder.write(SourceDevice('AA:BB'), Advertisement(rssi=-60, manufacturer_data={76: b'\x02\x15'}))
+        # 进程在此时被中断也不会丢失已记录的广播
+        assert _lines(path)[0]['rssi'] == -60
+    assert recorder._file.closed
+
+
+def test_recording_source_close_closes_capture(tmp_path):
+    path = tmp_path / 'capture.jsonl'
+
+    async def run():
+        source = create_source({'type': 'synthetic', 'beacons': BEACONS, 'speed': 0,
+                                'duration': 1.0, 'seed': 1, 'record': str(path)},
+                               lambda device, advertisement: None)
+        await source.start()
+        await source.sleep(0.5)
+        await source.stop()
+        assert not source.recorder._file.closed
+        await source.close()
+        return source
+
+    source = asyncio.run(run())
+    assert source.recorder._file.closed
+    lines = _lines(path)
+    assert lines and all(line['t'] <= 0.5 for line in lines)
+
+
+def test_replay_start_stop_cycles_deliver_every_record_once(tmp_path):
+    path = tmp_path / 'capture.jsonl'
+    path.write_text(''.join(json.dumps({'t': i * 0.1, 'address': 'AA:BB', 'rssi': -40 - i}) + '\n'
+                            for i in range(20)), encoding='utf-8')
+
+    async def run():
+        received = []
+        source = create_source({'type': 'replay', 'path': str(path), 'speed': 0},
+                               lambda device, advertisement: received.append(advertisement.rssi))
+        cycles = 0
+        while not source.finished:
+            # 每个窗口在数据源等待消费者推进时间时被 stop() 打断
+            await source.start()
+            await source.sleep(0.35)
+            await source.stop()
+            cycles += 1
+        await source.close()
+        return received, cycles
+
+    received, cycles = asyncio.run(run())
+    assert cycles > 1
+    assert received == [-40 - i for i in range(20)]
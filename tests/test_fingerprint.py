@@ -0,0 +1,111 @@
+"""指纹地图与 k 近邻指纹定位测试"""
+import numpy as np
+import pytest
+
+from fingerprint import MISSING_RSSI, FingerprintLocator, RadioMap
+from ibeacon_parser import IBeaconData
+
+BEACONS = [
+    {'uuid': 'FDA50693-A4E2-4FB1-AFCF-C6EB07647825', 'major': 1, 'minor': i,
+     'position': position, 'name': f'B{i}'}
+    for i, position in enumerate([[0, 0, 0.5], [10, 0, 2.5], [0, 8, 2.5], [10, 8, 0.5]])
+]
+KEYS = [IBeaconData.make_key(b['uuid'], b['major'], b['minor']) for b in BEACONS]
+
+
+def _rssi(position):
+    """路径损耗模型下各 beacon 的 RSSI"""
+    distances = np.linalg.norm(np.array([b['position'] for b in BEACONS]) - position, axis=1)
+    return -59 - 25 * np.log10(np.maximum(distances, 0.1))
+
+
+@pytest.fixture
+def radio_map():
+    """1 米间距网格上的参考点，最后一个 beacon 在 x > 8 的参考点处收不到"""
+    radio_map = RadioMap(BEACONS)
+    for x in range(11):
+        for y in range(9):
+            position = np.array([x, y, 1.2])
+            rssi = dict(zip(KEYS, _rssi(position)))
+            if x > 8:
+                del rssi[KEYS[3]]
+            radio_map.add(position, rssi)
+    return radio_map
+
+
+def test_radio_map_round_trip_memory_mapped(tmp_path, radio_map):
+    path = str(tmp_path / 'site')
+    radio_map.save(path)
+
+    loaded = RadioMap.load(path + '.npy')
+    assert isinstance(loaded.records, np.memmap)
+    assert not loaded.records.flags.writeable
+    assert loaded.beacons == [{key: b[key] for key in ('uuid', 'major', 'minor', 'name')} for b in BEACONS]
+    assert loaded.keys == KEYS
+    assert len(loaded) == len(radio_map) == 99
+    np.testing.assert_array_equal(loaded.positions, radio_map.positions)
+    np.testing.assert_array_equal(loaded.rssi, radio_map.rssi)
+    assert (loaded.rssi[-9:, 3] == MISSING_RSSI).all()
+
+    # 继续采集：以可写方式打开，追加后再保存
+    reopened = RadioMap.open(path, BEACONS)
+    assert not isinstance(reopened.records, np.memmap)
+    reopened.add([5.5, 4.5, 1.2], dict(zip(KEYS, _rssi([5.5, 4.5, 1.2]))))
+    reopened.save(path)
+    assert len(RadioMap.load(path, mmap=False)) == 100
+
+
+def test_radio_map_load_rejects_mismatched_beacon_list(tmp_path, radio_map):
+    path = str(tmp_path / 'site')
+    radio_map.save(path)
+    RadioMap(BEACONS[:3]).save(str(tmp_path / 'other'))
+    (tmp_path / 'site.json').write_bytes((tmp_path / 'other.json').read_bytes())
+
+    with pytest.raises(ValueError):
+        RadioMap.load(path)
+
+
+def test_fingerprint_locator_matches_brute_force_knn(radio_map):
+    locator = FingerprintLocator(radio_map, k=4)
+    rng = np.random.default_rng(9)
+    queries = np.array([_rssi(p) for p in rng.uniform([0, 0, 1.2], [10, 8, 1.2], size=(20, 3))])
+    queries += rng.normal(0.0, 1.0, queries.shape)
+
+    rssi = radio_map.rssi.astype(np.float64)
+    expected = []
+    for query in queries:
+        distances = np.linalg.norm(rssi - query, axis=1)
+        nearest = np.argsort(distances)[:4]
+        weights = 1.0 / (distances[nearest] + 1e-6)
+        expected.append(weights @ radio_map.positions[nearest] / weights.sum())
+
+    np.testing.assert_allclose(locator.locate(queries), expected, rtol=1e-5)
+    np.testing.assert_allclose(locator.locate(queries[0]), expected[0], rtol=1e-5)
+
+
+def test_fingerprint_locator_recovers_reference_points(radio_map):
+    locator = FingerprintLocator(radio_map, k=4)
+    # 恰好落在参考点上时该点权重占绝对优势；k=1 时直接返回最近的参考点
+    for index in (0, 40, 98):
+        np.testing.assert_allclose(locator.locate(radio_map.rssi[index]), radio_map.positions[index], atol=1e-3)
+        np.testing.assert_array_equal(locator.locate(radio_map.rssi[index], k=1), radio_map.positions[index])
+
+    # 参考点之间的位置落在相邻参考点围成的范围内
+    position = locator.locate(_rssi([4.5, 3.5, 1.2]).astype(np.float32))
+    np.testing.assert_allclose(position, [4.5, 3.5, 1.2], atol=0.6)
+
+
+def test_fingerprint_locator_locate_scan(radio_map):
+    locator = FingerprintLocator(radio_map, k=4)
+    rssi = _rssi([9.6, 2.0, 1.2])
+    # 收不到第 4 个 beacon，另有一个不在地图中的 beacon
+    scan = {key: {'rssi': value} for key, value in zip(KEYS[:3], rssi[:3])}
+    scan[IBeaconData.make_key(BEACONS[0]['uuid'], 9, 9)] = {'rssi': -40.0}
+
+    vector = radio_map.vector({key: data['rssi'] for key, data in scan.items()})
+    np.testing.assert_allclose(locator.locate_scan(scan), locator.locate(vector))
+    assert locator.locate_scan(scan)[0] > 8
+    assert locator.locate_scan({IBeaconData.make_key(BEACONS[0]['uuid'], 9, 9): {'rssi': -40.0}}) is None
+
+    with pytest.raises(ValueError):
+        FingerprintLocator(RadioMap(BEACONS))
@@ -0,0 +1,134 @@
+"""beacon 帧解析测试"""
+import numpy as np
+import pytest
+
+from ibeacon_parser import (IBEACON_DTYPE, BeaconFrameRegistry, EddystoneUIDParser, IBeaconParseCache,
+                            IBeaconParser)
+
+# 按规范逐字节构造的广播负载
+# iBeacon: 0x02 0x15 + UUID(16) + Major(2, 大端) + Minor(2, 大端) + TxPower(1, 有符号)
+IBEACON_FRAME = bytes.fromhex('0215' 'fda50693a4e24fb1afcfc6eb07647825' '0001' '0102' 'c5')
+# AltBeacon: 0xBE 0xAC + Beacon ID(20) + Reference RSSI(1) + 保留(1)
+ALTBEACON_FRAME = bytes.fromhex('beac' '2f234454cf6d4a0fadf2f4911ba9ffa6' '0007' '0309' 'bf' '00')
+# Eddystone-UID: 帧类型 0x00 + 0 米处 TxPower(1) + Namespace(10) + Instance(6) + 保留(2)
+EDDYSTONE_UID_FRAME = bytes.fromhex('00' 'ee' 'edd1ebeac04e5defa017' '0badc0ffee01' '0000')
+
+RADIUS_NETWORKS_ID = 0x0118
+# Apple 的其他广播（如 Nearby Info：类型 0x10、长度 0x05）
+APPLE_NEARBY_FRAME = bytes.fromhex('1005' '0b1c' '7a8bcd')
+# Eddystone-TLM（帧类型 0x20）和其他服务（心率 0x180D）的服务数据
+EDDYSTONE_TLM_FRAME = bytes.fromhex('20' '00' '0bb8' '1900' '00000010' '00000020')
+HEART_RATE_SERVICE = '0000180d-0000-1000-8000-00805f9b34fb'
+
+
+@pytest.fixture
+def registry():
+    return BeaconFrameRegistry.default()
+
+
+def test_registry_decodes_ibeacon_frame(registry):
+    beacon = registry.parse({IBeaconParser.APPLE_COMPANY_ID: IBEACON_FRAME}, -67)
+    assert beacon.frame == 'ibeacon'
+    assert beacon.uuid == 'FDA50693-A4E2-4FB1-AFCF-C6EB07647825'
+    assert (beacon.major, beacon.minor, beacon.tx_power, beacon.rssi) == (1, 258, -59, -67)
+    assert beacon == IBeaconParser.parse({IBeaconParser.APPLE_COMPANY_ID: IBEACON_FRAME}, -67)
+
+
+def test_registry_decodes_altbeacon_frame_under_any_company_id(registry):
+    for company_id in (RADIUS_NETWORKS_ID, IBeaconParser.APPLE_COMPANY_ID):
+        beacon = registry.parse({company_id: ALTBEACON_FRAME}, -70)
+        assert beacon.frame == 'altbeacon'
+        assert beacon.uuid == '2F234454-CF6D-4A0F-ADF2-F4911BA9FFA6'
+        assert (beacon.major, beacon.minor, beacon.tx_power, beacon.rssi) == (7, 777, -65, -70)
+
+
+def test_registry_decodes_eddystone_uid_frame(registry):
+    beacon = registry.parse({}, -72, {EddystoneUIDParser.SERVICE_UUID: EDDYSTONE_UID_FRAME})
+    assert beacon.frame == 'eddystone_uid'
+    # Namespace + Instance 合并为 uuid
+    assert beacon.uuid_bytes == bytes.fromhex('edd1ebeac04e5defa0170badc0ffee01')
+    assert (beacon.major, beacon.minor, beacon.rssi) == (0, 0, -72)
+    # 0 米处 -18 dBm 换算到 1 米
+    assert beacon.tx_power == -18 - EddystoneUIDParser.TX_POWER_1M_OFFSET
+
+
+def test_registry_rejects_non_matching_apple_frame(registry):
+    assert registry.match({IBeaconParser.APPLE_COMPANY_ID: APPLE_NEARBY_FRAME}) is None
+    assert registry.parse({IBeaconParser.APPLE_COMPANY_ID: APPLE_NEARBY_FRAME}, -60) is None
+    assert IBeaconParser.parse({IBeaconParser.APPLE_COMPANY_ID: APPLE_NEARBY_FRAME}, -60) is None
+
+
+def test_registry_rejects_non_eddystone_service_data(registry):
+    # 其他服务的数据即使以 0x00 开头也不匹配，Eddystone 的非 UID 帧同样不匹配
+    assert registry.parse({}, -60, {HEART_RATE_SERVICE: EDDYSTONE_UID_FRAME}) is None
+    assert registry.parse({}, -60, {EddystoneUIDParser.SERVICE_UUID: EDDYSTONE_TLM_FRAME}) is None
+
+
+@pytest.mark.parametrize('manufacturer_data, service_data', [
+    ({IBeaconParser.APPLE_COMPANY_ID: IBEACON_FRAME[:-1]}, None),
+    ({RADIUS_NETWORKS_ID: ALTBEACON_FRAME[:-2]}, None),
+    ({}, {EddystoneUIDParser.SERVICE_UUID: EDDYSTONE_UID_FRAME[:-3]}),
+])
+def test_registry_rejects_truncated_frames(registry, manufacturer_data, service_data):
+    assert registry.parse(manufacturer_data, -60, service_data) is None
+
+
+def test_parse_cache_skips_rejected_frames():
+    cache = IBeaconParseCache()
+    assert cache.parse({IBeaconParser.APPLE_COMPANY_ID: APPLE_NEARBY_FRAME}, -60) is None
+    assert cache.parse({}, -60, {HEART_RATE_SERVICE: EDDYSTONE_UID_FRAME}) is None
+    assert cache.stats()['hits'] == cache.stats()['misses'] == 0
+
+    first = cache.parse({RADIUS_NETWORKS_ID: ALTBEACON_FRAME}, -70)
+    second = cache.parse({RADIUS_NETWORKS_ID: ALTBEACON_FRAME}, -75)
+    assert second.key == first.key and second.rssi == -75
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def _ibeacon_frame(uuid, major, minor, tx_power):
+    return b'\x02\x15' + uuid + major.to_bytes(2, 'big') + minor.to_bytes(2, 'big') + tx_power.to_bytes(1, 'big', signed=True)
+
+
+def test_parse_batch_matches_scalar_parser_record_for_record():
+    rng = np.random.default_rng(11)
+    buffer = bytearray()
+    offsets, rssi = [], []
+    for i in range(200):
+        kind = rng.integers(0, 4)
+        if kind == 0:
+            payload = APPLE_NEARBY_FRAME + bytes(20)  # 非 iBeacon 的 Apple 广播
+        elif kind == 1:
+            payload = b'\x02\x16' + IBEACON_FRAME[2:]  # 长度字节不对
+        else:
+            payload = _ibeacon_frame(rng.bytes(16), int(rng.integers(0, 1 << 16)),
+                                     int(rng.integers(0, 1 << 16)), int(rng.integers(-128, 128)))
+        offsets.append(len(buffer))
+        rssi.append(int(rng.integers(-110, -20)))
+        buffer += payload + rng.bytes(int(rng.integers(0, 4)))  # 记录之间可能有填充
+    # 越界的偏移：末尾不足 23 字节的 iBeacon、负偏移、超出缓冲区
+    offsets += [len(buffer), -1, len(buffer) + 100]
+    rssi += [-50, -50, -50]
+    buffer += IBEACON_FRAME[:-1]
+
+    expected = []
+    for offset, value in zip(offsets, rssi):
+        payload = bytes(buffer[offset:offset + IBeaconParser.IBEACON_PAYLOAD_SIZE]) if offset >= 0 else b''
+        beacon = IBeaconParser.parse({IBeaconParser.APPLE_COMPANY_ID: payload}, value)
+        if beacon is not None:
+            expected.append(beacon)
+
+    for source in (bytes(buffer), buffer, memoryview(buffer)):
+        records = IBeaconParser.parse_batch(source, offsets, rssi)
+        assert records.dtype == IBEACON_DTYPE
+        assert len(records) == len(expected) > 50
+        for record, beacon in zip(records, expected):
+            assert bytes(record['uuid']) == beacon.uuid_bytes
+            assert (int(record['major']), int(record['minor'])) == (beacon.major, beacon.minor)
+            assert (int(record['tx_power']), int(record['rssi'])) == (beacon.tx_power, beacon.rssi)
+
+
+def test_parse_batch_empty_and_mismatched_input():
+    assert len(IBeaconParser.parse_batch(APPLE_NEARBY_FRAME, [0], [-60])) == 0
+    assert len(IBeaconParser.parse_batch(b'', [], [])) == 0
+    with pytest.raises(ValueError):
+        IBeaconParser.parse_batch(IBEACON_FRAME, [0], [-60, -61])
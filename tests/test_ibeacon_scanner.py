@@ -0,0 +1,113 @@
+"""扫描器与逐包事件流测试"""
+import asyncio
+import math
+
+import numpy as np
+import pytest
+
+from ibeacon_scanner import AdvertisementStream, DistanceEstimator, IBeaconScanner
+
+BEACONS = [
+    {'uuid': 'FDA50693-A4E2-4FB1-AFCF-C6EB07647825', 'major': 1, 'minor': i,
+     'position': position, 'name': f'B{i}'}
+    for i, position in enumerate([[0, 0, 0], [10, 0, 0], [0, 10, 0]])
+]
+
+
+def _synthetic(speed=0.0, duration=2.0):
+    return {'type': 'synthetic', 'beacons': BEACONS, 'speed': speed,
+            'duration': duration, 'seed': 3}
+
+
+@pytest.mark.parametrize('overflow', AdvertisementStream.OVERFLOW_POLICIES)
+def test_stream_ends_when_finite_source_finishes(overflow):
+    async def run():
+        scanner = IBeaconScanner(source=_synthetic())
+        timestamps = []
+        async with scanner.stream(maxsize=4096, overflow=overflow) as events:
+            async for event in events:
+                timestamps.append(event['timestamp'])
+        return scanner, timestamps
+
+    scanner, timestamps = asyncio.run(asyncio.wait_for(run(), timeout=10))
+    assert scanner.finished
+    assert len(timestamps) > 0
+    assert max(timestamps) <= 2.0
+
+
+def test_stream_ends_when_scanner_stops():
+    async def run():
+        scanner = IBeaconScanner(source=_synthetic(speed=1.0, duration=None))
+        events = scanner.stream()
+        received = []
+
+        async def consume():
+            async for event in events:
+                received.append(event)
+
+        consumer = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.3)
+        await scanner.stop()
+        await consumer
+        await events.aclose()
+        return received
+
+    assert len(asyncio.run(asyncio.wait_for(run(), timeout=10))) > 0
+
+
+def test_fast_source_paces_stream_consumer():
+    async def run():
+        scanner = IBeaconScanner(source=_synthetic(duration=5.0))
+        events = []
+        # coalesce 只在消费者跟不上时合并；尽可能快的数据源等待消费者，不应丢弃或合并
+        async with scanner.stream(maxsize=len(BEACONS), overflow='coalesce') as stream:
+            async for event in stream:
+                events.append(event)
+        return events, stream.stats()
+
+    events, stats = asyncio.run(asyncio.wait_for(run(), timeout=10))
+    assert stats['dropped'] == 0 and stats['coalesced'] == 0
+    assert len(events) == stats['received'] > 100
+
+
+def _path_loss(rssi, tx_power, n):
+    """原先的闭式公式"""
+    if rssi == 0:
+        return -1.0
+    return math.pow(10, (tx_power - rssi) / (10.0 * n))
+
+
+# 覆盖 int8 全范围（含 rssi 为 0 的无效值）以及超出查找表、需要按公式计算的取值
+RSSI_VALUES = list(range(-128, 128, 7)) + [-128, 0, 127, -129, 128, -300, 200]
+TX_VALUES = [-128, -100, -59, -40, 0, 127, -129, 128]
+
+
+@pytest.mark.parametrize('n', [2.0, 2.5, 3.3])
+def test_distance_table_matches_formula(n):
+    estimator = DistanceEstimator(environment_factor=2.5)
+    for tx_power in TX_VALUES:
+        for rssi in RSSI_VALUES:
+            expected = _path_loss(rssi, tx_power, n)
+            assert estimator.estimate_distance(rssi, tx_power, n) == pytest.approx(expected, rel=1e-12)
+            # 非整数 RSSI 按公式计算
+            assert estimator.estimate_distance(rssi + 0.5, tx_power, n) == pytest.approx(
+                _path_loss(rssi + 0.5, tx_power, n), rel=1e-12)
+
+    estimator.environment_factor = n
+    rssi = np.array(RSSI_VALUES)
+    int8_rssi = rssi[(rssi >= -128) & (rssi <= 127)].astype(np.int8)
+    for tx_power in TX_VALUES:
+        # 含超出 int8 的取值时整个数组按公式计算，int8 数组走查找表
+        np.testing.assert_allclose(estimator.estimate_array(rssi, tx_power),
+                                   [_path_loss(r, tx_power, n) for r in rssi], rtol=1e-12)
+        np.testing.assert_allclose(estimator.estimate_array(rssi.astype(np.float64), tx_power),
+                                   [_path_loss(r, tx_power, n) for r in rssi], rtol=1e-12)
+        if -128 <= tx_power <= 127:
+            np.testing.assert_allclose(estimator.estimate_array(int8_rssi, np.int8(tx_power)),
+                                       [_path_loss(int(r), tx_power, n) for r in int8_rssi], rtol=1e-12)
+
+def test_estimate_distance_keeps_class_level_call():
+    # 原先的静态方法调用方式：使用默认实例（n 默认 2.5）
+    assert DistanceEstimator.estimate_distance(-65, -59) == pytest.approx(_path_loss(-65, -59, 2.5))
+    assert DistanceEstimator.estimate_distance(-65, -59, 3.0) == pytest.approx(_path_loss(-65, -59, 3.0))
+    assert DistanceEstimator(3.0).estimate_distance(-65, -59) == pytest.approx(_path_loss(-65, -59, 3.0))
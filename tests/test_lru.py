@@ -0,0 +1,57 @@
+"""LRU 缓存基类及其子类的统计测试"""
+import numpy as np
+import pytest
+
+from ibeacon_parser import IBeaconParseCache, IBeaconParser
+from lru import LRUCache
+from positioning_3d import AnchorSubsetCache, SolveCache
+
+
+class _Cache(LRUCache):
+    def get(self, key):
+        return self._lookup(key)
+
+    def put(self, key, value):
+        self._store(key, value)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = _Cache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 3, 'misses': 1,
+                             'evictions': 1, 'hit_rate': 0.75}
+    cache.clear()
+    assert len(cache) == 0 and cache.hits == cache.misses == cache.evictions == 0
+
+
+@pytest.mark.parametrize('cache_type', [IBeaconParseCache, SolveCache,
+                                        lambda maxsize: AnchorSubsetCache(np.eye(3), maxsize)])
+def test_caches_reject_non_positive_maxsize(cache_type):
+    with pytest.raises(ValueError):
+        cache_type(maxsize=0)
+
+
+def test_parse_cache_counts_hits():
+    payload = IBeaconParser.PREFIX + bytes(16) + bytes([0, 1, 0, 2, 0xC5])
+    cache = IBeaconParseCache(maxsize=4)
+    first = cache.parse({IBeaconParser.APPLE_COMPANY_ID: payload}, -60)
+    second = cache.parse({IBeaconParser.APPLE_COMPANY_ID: payload}, -70)
+
+    assert (first.major, first.minor, second.rssi) == (1, 2, -70)
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_solve_cache_expired_entry_counts_as_miss():
+    now = [0.0]
+    cache = SolveCache(ttl=1.0, clock=lambda: now[0])
+    cache.put(0b111, [3.0, 4.0, 5.0], np.zeros(3))
+    now[0] = 2.0
+
+    assert cache.get(0b111, [3.0, 4.0, 5.0]) is None
+    assert cache.stats()['expirations'] == 1 and cache.misses == 1 and len(cache) == 0
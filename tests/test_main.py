@@ -0,0 +1,130 @@
+"""定位主流程测试（_process_scan_results）"""
+import asyncio
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from ibeacon_parser import IBeaconData
+from main import IBeaconPositioningSystem
+
+CONFIG_PATH = Path(__file__).resolve().parent.parent / 'beacon_config.json'
+
+with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+    BEACON_CONFIG = json.load(f)
+
+
+@pytest.fixture
+def make_system(tmp_path):
+    systems = []
+
+    def make(**overrides):
+        config_file = tmp_path / f'config{len(systems)}.json'
+        config_file.write_text(json.dumps(dict(BEACON_CONFIG, **overrides)), encoding='utf-8')
+        system = IBeaconPositioningSystem(str(config_file))
+        systems.append(system)
+        return system
+
+    yield make
+    for system in systems:
+        system.visualizer.close()
+
+
+def _scan(tag, beacons=None):
+    """按标签位置生成理想距离的扫描结果"""
+    result = {}
+    for beacon in beacons if beacons is not None else BEACON_CONFIG['beacons']:
+        key = IBeaconData.make_key(beacon['uuid'], beacon['major'], beacon['minor'])
+        result[key] = {
+            'distance': float(np.linalg.norm(np.subtract(beacon['position'], tag))),
+            'rssi': -70.0,
+            'stats': {'count': 10, 'rate': 10.0}
+        }
+    return result
+
+
+def test_two_beacons_without_time_budget_cannot_locate(make_system):
+    system = make_system(min_beacons_required=2)
+    system._process_scan_results(_scan([5.0, 5.0, 1.0], BEACON_CONFIG['beacons'][:2]))
+    assert system.current_position is None
+
+
+def test_full_layout_locates(make_system):
+    system = make_system()
+    system._process_scan_results(_scan([5.0, 5.0, 1.0]))
+    assert system.current_position is not None
+    assert system.current_quality is not None
+    np.testing.assert_allclose(system.current_position[:2], [5.0, 5.0], atol=0.2)
+
+
+def test_two_beacons_with_time_budget_use_weighted_position(make_system, monkeypatch):
+    system = make_system(min_beacons_required=2, time_budget=0.005)
+    methods = []
+    solve_with_deadline = system.position_calculator.solve_with_deadline
+
+    def record(*args, **kwargs):
+        result = solve_with_deadline(*args, **kwargs)
+        methods.append(result.method)
+        return result
+
+    monkeypatch.setattr(system.position_calculator, 'solve_with_deadline', record)
+    beacons = BEACON_CONFIG['beacons'][:2]
+    system._process_scan_results(_scan([2.0, 5.0, 1.0], beacons))
+
+    assert methods == ['weighted']
+    assert system.current_position is not None
+    # 两个 beacon 都在 x = 0 上，加权平均也在这条线上
+    assert system.current_position[0] == pytest.approx(0.0)
+    assert 0.0 < system.current_position[1] < 10.0
+
+
+@pytest.mark.parametrize('extra_beacons, expected', [(0, 'range'), (1, 'ransac')])
+def test_auto_outlier_rejection_uses_ransac_only_with_redundant_beacons(make_system, monkeypatch,
+                                                                        extra_beacons, expected):
+    beacons = BEACON_CONFIG['beacons'] + [
+        dict(BEACON_CONFIG['beacons'][0], minor=20000 + i, position=[7.5, 5.0, 3.0], name=f'Extra{i}')
+        for i in range(extra_beacons)
+    ]
+    system = make_system(beacons=beacons)
+    used = []
+
+    def spy(name, method):
+        original = getattr(system.position_calculator, method)
+
+        def wrapper(*args, **kwargs):
+            used.append(name)
+            return original(*args, **kwargs)
+        monkeypatch.setattr(system.position_calculator, method, wrapper)
+
+    spy('ransac', 'ransac_filter')
+    spy('range', 'filter_outliers')
+
+    system._process_scan_results(_scan([5.0, 5.0, 1.0], beacons))
+    assert used == [expected]
+    assert system.current_position is not None
+
+
+@pytest.mark.parametrize('solver', ['nelder_mead', 'gauss_newton'])
+def test_solve_cache_hits_across_warm_started_fixes(make_system, monkeypatch, solver):
+    system = make_system(solver=solver, warm_start=True, source={
+        'type': 'synthetic', 'speed': 0, 'duration': 20.0, 'seed': 1,
+        'rssi_noise': 0.0, 'position': [5.0, 4.0, 1.2]
+    })
+    warm = []
+    warm_start_3d = system.position_calculator.warm_start_3d
+
+    def record(beacons, prediction, **kwargs):
+        result = warm_start_3d(beacons, prediction, **kwargs)
+        if prediction is not None:
+            warm.append(result)
+        return result
+
+    monkeypatch.setattr(system.position_calculator, 'warm_start_3d', record)
+    asyncio.run(asyncio.wait_for(system.run(), timeout=60))
+
+    stats = system.solve_cache.stats()
+    assert warm
+    # 静止且无噪声：只有缓存过期或距离量化值变化时才需要求解
+    assert stats['hits'] > 2 * stats['misses']
+    assert stats['size'] >= 1
@@ -0,0 +1,447 @@
+"""定位算法与缓存测试"""
+import numpy as np
+import pytest
+
+from positioning_3d import (AnchorIndex, BatchConstantVelocityKalmanFilter, ConstantVelocityKalmanFilter3D,
+                            GridLocator, KalmanFilter3D, ParticleFilter3D, Position3D, RangeExtendedKalmanFilter3D, SolveCache, SolveResult,
+                            StrategyResult)
+
+
+def _strategy(position, converged=True, truncated=False):
+    return StrategyResult(np.asarray(position, dtype=np.float64), 'gauss_newton', 3, 0.1,
+                          converged, truncated, 0.001)
+
+
+def test_solve_cache_stores_converged_results():
+    cache = SolveCache(clock=lambda: 0.0)
+    calls = []
+
+    def solver():
+        calls.append(1)
+        return _strategy([1.0, 2.0, 0.5])
+
+    for _ in range(3):
+        np.testing.assert_allclose(cache.solve(0b111, [3.0, 4.0, 5.0], solver), [1.0, 2.0, 0.5])
+    assert len(calls) == 1
+    assert cache.hits == 2
+
+
+def test_solve_cache_skips_truncated_results():
+    cache = SolveCache(clock=lambda: 0.0)
+    results = [_strategy([9.0, 9.0, 9.0], converged=False, truncated=True),
+               _strategy([1.0, 2.0, 0.5])]
+    positions = [cache.solve(0b111, [3.0, 4.0, 5.0], lambda: results.pop(0)) for _ in range(3)]
+
+    # 截断的结果只用于当次定位，下一次扫描重新求解
+    np.testing.assert_allclose(positions, [[9.0, 9.0, 9.0], [1.0, 2.0, 0.5], [1.0, 2.0, 0.5]])
+    assert not results
+    assert len(cache) == 1 and cache.hits == 1
+
+
+def test_solve_cache_keeps_results_that_used_their_iteration_budget():
+    cache = SolveCache(clock=lambda: 0.0)
+    cache.solve(0b111, [3.0, 4.0, 5.0], lambda: SolveResult(np.array([8.0, 8.0, 8.0]), 5, 0.01, False))
+    np.testing.assert_allclose(cache.get(0b111, [3.0, 4.0, 5.0]), [8.0, 8.0, 8.0])
+
+
+def test_solve_cache_skips_none():
+    cache = SolveCache(clock=lambda: 0.0)
+    assert cache.solve(0b11, [3.0, 4.0], lambda: None) is None
+    assert len(cache) == 0
+
+
+# 共面 beacon（与 beacon_config.json 相同的布局）和非共面 beacon
+COPLANAR = np.array([[0.0, 10.0, 0.5], [0.0, 0.0, 0.5], [15.0, 0.0, 0.5], [15.0, 10.0, 0.5]])
+SPATIAL = np.array([[0.0, 10.0, 0.5], [0.0, 0.0, 2.5], [15.0, 0.0, 0.5], [15.0, 10.0, 3.0],
+                    [7.5, 5.0, 4.0]])
+
+
+def _beacons(anchors, tag):
+    return [(anchor, float(np.linalg.norm(anchor - tag))) for anchor in anchors]
+
+
+@pytest.mark.parametrize('solver', Position3D.SOLVERS)
+@pytest.mark.parametrize('anchors', [COPLANAR, SPATIAL], ids=['coplanar', 'spatial'])
+def test_warm_start_at_true_position_converges(solver, anchors):
+    tag = np.array([5.0, 4.0, 1.2])
+    result = Position3D.warm_start_3d(_beacons(anchors, tag), tag, solver=solver, return_result=True)
+
+    assert result.converged
+    assert result.iterations <= Position3D.WARM_MAX_ITERATIONS[solver]
+    np.testing.assert_allclose(result.position, tag, atol=1e-3)
+
+
+@pytest.mark.parametrize('max_anchors, reach', [(8, 25.0), (8, None), (None, 25.0), (200, 25.0)])
+def test_anchor_index_selects_nearest_detected_anchors_within_reach(max_anchors, reach):
+    rng = np.random.default_rng(4)
+    anchors = rng.uniform([0, 0, 0], [200, 150, 10], size=(2000, 3))
+    index = AnchorIndex(anchors)
+    detected = rng.choice(len(anchors), size=300, replace=False)
+    position = np.array([90.0, 70.0, 1.5])
+
+    keep = index.select(detected, position, max_anchors=max_anchors, reach=reach)
+
+    ranges = np.linalg.norm(anchors[detected] - position, axis=1)
+    expected = detected[ranges <= reach] if reach is not None else detected
+    expected = expected[np.argsort(np.linalg.norm(anchors[expected] - position, axis=1))][:max_anchors]
+    assert set(detected[keep]) == set(expected)
+    assert index.select(detected, None, max_anchors=max_anchors, reach=reach).all()
+
+
+@pytest.mark.parametrize('anchors', [COPLANAR, SPATIAL], ids=['coplanar', 'spatial'])
+@pytest.mark.parametrize('offset', [None, [2.0, -1.0, 0.5]], ids=['linear', 'offset'])
+def test_gauss_newton_recovers_position(anchors, offset):
+    tag = np.array([5.0, 4.0, 1.2])
+    beacons = _beacons(anchors, tag)
+    distances = np.array([d for _, d in beacons])
+    guess = Position3D.linear_least_squares_3d(beacons)
+    if offset is not None:
+        guess = guess + offset
+
+    # 共面时线性解落在 beacon 平面上（法向鞍点），求解器需要离开平面
+    result = Position3D.gauss_newton_3d(anchors, distances, guess)
+
+    assert result.converged
+    assert result.iterations <= Position3D.MAX_ITERATIONS['gauss_newton']
+    np.testing.assert_allclose(result.position, tag, atol=1e-3)
+
+
+@pytest.mark.parametrize('anchors', [COPLANAR, SPATIAL], ids=['coplanar', 'spatial'])
+def test_gauss_newton_matches_nelder_mead_on_noisy_ranges(anchors):
+    rng = np.random.default_rng(0)
+    tag = np.array([5.0, 4.0, 1.2])
+    for _ in range(5):
+        beacons = [(anchor, distance + rng.normal(0.0, 0.3)) for anchor, distance in _beacons(anchors, tag)]
+        gauss_newton = Position3D.least_squares_3d(beacons, solver='gauss_newton', return_result=True)
+        nelder_mead = Position3D.least_squares_3d(beacons, solver='nelder_mead', return_result=True)
+
+        assert gauss_newton.converged
+        assert gauss_newton.cost <= nelder_mead.cost * (1 + 1e-6) + 1e-12
+        np.testing.assert_allclose(gauss_newton.position, nelder_mead.position, atol=1e-3)
+
+
+# 8 个 beacon，高度各不相同；各标签随机只看到其中一部分
+MIXED = np.vstack([SPATIAL, [[7.5, 0.0, 1.0], [0.0, 5.0, 3.5], [15.0, 5.0, 2.0]]])
+
+
+def _batch_scene(anchors, noise, seed, num_tags=300):
+    rng = np.random.default_rng(seed)
+    tags = rng.uniform([1.0, 1.0, 0.8], [14.0, 9.0, 2.5], size=(num_tags, 3))
+    distances = np.linalg.norm(tags[:, None] - anchors[None], axis=2)
+    distances += rng.normal(0.0, noise, distances.shape)
+    mask = rng.random(distances.shape) > 0.3
+    return tags, distances, mask
+
+
+@pytest.mark.parametrize('anchors', [COPLANAR, MIXED], ids=['coplanar', 'mixed'])
+def test_batch_solve_recovers_positions(anchors):
+    tags, distances, mask = _batch_scene(anchors, 0.0, seed=2)
+    result = Position3D.batch_solve(distances, mask, anchors)
+
+    counts = mask.sum(axis=1)
+    np.testing.assert_array_equal(result.valid, counts >= 3)
+    assert np.isnan(result.positions[~result.valid]).all()
+    assert result.converged[result.valid].all()
+    # 只看到 3 个 beacon 时有两个精确解（关于三点平面镜像），只检查误差
+    np.testing.assert_allclose(result.cost[result.valid], 0.0, atol=1e-9)
+    unique = counts >= 4 if anchors is MIXED else counts >= 3
+    np.testing.assert_allclose(result.positions[unique], tags[unique], atol=1e-3)
+
+
+@pytest.mark.parametrize('anchors', [COPLANAR, MIXED], ids=['coplanar', 'mixed'])
+def test_batch_solve_matches_single_tag_solver(anchors):
+    _, distances, mask = _batch_scene(anchors, 0.5, seed=3)
+    result = Position3D.batch_solve(distances, mask, anchors, max_iterations=200)
+
+    for tag in np.flatnonzero(result.valid):
+        beacons = list(zip(anchors[mask[tag]], distances[tag][mask[tag]]))
+        single = Position3D.least_squares_3d(beacons, solver='gauss_newton', return_result=True,
+                                             max_iterations=200)
+        assert result.converged[tag] == single.converged
+        assert result.cost[tag] == pytest.approx(single.cost, rel=1e-6, abs=1e-9)
+        np.testing.assert_allclose(result.positions[tag], single.position, atol=1e-3)
+
+
+def test_linear_fast_path_recovers_position():
+    tag = np.array([5.0, 4.0, 1.2])
+    beacons = _beacons(SPATIAL, tag)
+    linear, condition = Position3D.linear_least_squares_3d(beacons, return_condition=True)
+    assert condition <= Position3D.LINEAR_MAX_CONDITION
+    np.testing.assert_allclose(linear, tag, atol=1e-9)
+
+    result = Position3D.least_squares_3d(beacons, linear_fast_path=True, return_result=True)
+    assert result.iterations == 0 and result.converged
+    np.testing.assert_allclose(result.position, linear)
+    assert Position3D.solve_with_deadline(beacons, time_budget=1.0).method == 'linear'
+    warm = Position3D.warm_start_3d(beacons, tag + 0.3, linear_fast_path=True, return_result=True)
+    assert warm.iterations == 0
+
+
+# beacon 高度只差几厘米：满秩但病态（条件数约 260）
+NEARLY_FLAT = COPLANAR + [[0.0, 0.0, 0.0], [0.0, 0.0, 0.05], [0.0, 0.0, 0.0], [0.0, 0.0, 0.1]]
+
+
+@pytest.mark.parametrize('anchors, max_condition', [
+    (NEARLY_FLAT, None), (COPLANAR, None), (SPATIAL, 5.0)
+], ids=['ill-conditioned', 'rank-deficient', 'lowered-threshold'])
+@pytest.mark.parametrize('solver', Position3D.SOLVERS)
+def test_linear_fast_path_falls_back_above_max_condition(monkeypatch, anchors, max_condition, solver):
+    if max_condition is not None:
+        monkeypatch.setattr(Position3D, 'LINEAR_MAX_CONDITION', max_condition)
+    rng = np.random.default_rng(5)
+    tag = np.array([5.0, 4.0, 1.2])
+    beacons = [(anchor, distance + rng.normal(0.0, 0.2)) for anchor, distance in _beacons(anchors, tag)]
+    _, condition = Position3D.linear_least_squares_3d(beacons, return_condition=True)
+    assert condition > Position3D.LINEAR_MAX_CONDITION
+
+    fast = Position3D.least_squares_3d(beacons, linear_fast_path=True, solver=solver, return_result=True)
+    iterative = Position3D.least_squares_3d(beacons, solver=solver, return_result=True)
+    assert fast.iterations > 0
+    np.testing.assert_allclose(fast.position, iterative.position)
+    assert Position3D.solve_with_deadline(beacons, time_budget=1.0, solver=solver).method == solver
+
+
+def test_batch_cv_filter_matches_single_tag_filters():
+    rng = np.random.default_rng(6)
+    num_tags = 6
+    batch = BatchConstantVelocityKalmanFilter(num_tags)
+    singles = [ConstantVelocityKalmanFilter3D() for _ in range(num_tags)]
+
+    for step in range(60):
+        measurements = rng.uniform(0.0, 10.0, size=(num_tags, 3))
+        # 各标签测量时刻不同（有的标签很晚才第一次被测量），时间步包含 0 和超过 max_dt 的值
+        mask = rng.random(num_tags) < (0.2 if step < 10 else 0.7)
+        measurements[~mask] = np.nan
+        dt = None if step % 7 == 0 else rng.choice([0.0, 0.1, 0.5, 8.0], size=num_tags)
+
+        batch.update(measurements, dt=dt, mask=mask)
+        for tag, single in enumerate(singles):
+            tag_dt = None if dt is None else float(dt[tag])
+            if mask[tag]:
+                single.update(measurements[tag], dt=tag_dt)
+            elif tag_dt is not None:
+                single.propagate(tag_dt)
+
+        for tag, single in enumerate(singles):
+            assert batch.initialized[tag] == single.initialized
+            np.testing.assert_allclose(batch.states[tag], single.state, rtol=1e-12, atol=1e-12)
+            np.testing.assert_allclose(batch.covariances[tag], single.covariance, rtol=1e-12, atol=1e-12)
+
+
+def test_cv_filter_tracks_moving_target_without_lag():
+    rng = np.random.default_rng(7)
+    dt = 0.1
+    velocity = np.array([1.0, -0.5, 0.0])
+    cv = ConstantVelocityKalmanFilter3D()
+    static = KalmanFilter3D()
+    cv_errors, static_errors = [], []
+
+    for step in range(300):
+        truth = np.array([2.0, 8.0, 1.2]) + velocity * step * dt
+        measurement = truth + rng.normal(0.0, 0.5, 3)
+        cv_position = cv.update(measurement, dt=dt).copy()
+        static_position = static.update(measurement, dt=dt)
+        if step >= 100:
+            cv_errors.append(cv_position - truth)
+            static_errors.append(static_position - truth)
+
+    # 稳态下匀速模型的沿运动方向偏差接近 0，速度估算接近真实值；静态模型持续滞后
+    direction = velocity / np.linalg.norm(velocity)
+    assert abs(np.mean(np.array(cv_errors) @ direction)) < 0.1
+    np.testing.assert_allclose(cv.velocity, velocity, atol=0.2)
+    assert np.mean(np.array(static_errors) @ direction) < -1.0
+
+
+ROOM = [15.0, 10.0, 5.5]
+
+
+def _run_range_ekf(anchors, tag, steps, noise, seed, rssi=False):
+    """逐个 beacon 轮流更新，返回滤波器和每一步的位置"""
+    rng = np.random.default_rng(seed)
+    ekf = RangeExtendedKalmanFilter3D(anchors, room_size=ROOM)
+    positions = []
+    for step in range(steps):
+        ekf.propagate(0.1)
+        index = step % len(anchors)
+        distance = float(np.linalg.norm(anchors[index] - tag))
+        if rssi:
+            ekf.update_rssi(index, -59 - 25 * np.log10(distance) + rng.normal(0.0, noise), -59, 2.5)
+        else:
+            ekf.update_range(index, distance + rng.normal(0.0, noise))
+        assert np.isfinite(ekf.state).all() and np.isfinite(ekf.covariance).all()
+        assert (ekf.position >= ekf.lower).all() and (ekf.position <= ekf.upper).all()
+        assert (ekf.spread() <= np.sqrt(ekf.max_variance) + 1e-9).all()
+        positions.append(ekf.position.copy())
+    return ekf, np.array(positions)
+
+
+@pytest.mark.parametrize('count', [1, 2])
+@pytest.mark.parametrize('rssi', [False, True], ids=['range', 'rssi'])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_range_ekf_stays_bounded_with_one_or_two_anchors(count, rssi, seed):
+    anchors = SPATIAL[:count]
+    tag = np.array([5.0, 4.0, 1.2])
+    ekf, positions = _run_range_ekf(anchors, tag, 2000, 1.0 if rssi else 0.1, seed=seed, rssi=rssi)
+
+    # 只能确定到各 beacon 的距离：位置沿不可观测方向游走（碰到房间边界时停住，不会贴在边界上），
+    # 但始终保持在对应的球面（圆）附近
+    ranges = np.linalg.norm(positions[500:, None] - anchors[None], axis=2)
+    np.testing.assert_allclose(ranges.mean(axis=0), np.linalg.norm(anchors - tag, axis=1), atol=0.15)
+    assert np.linalg.eigvalsh(ekf.covariance).min() > -1e-9
+
+
+def test_range_ekf_z_unobservable_with_coplanar_anchors():
+    # beacon 共面且标签离平面较近时，距离对 z 几乎不敏感：z 在平面两侧（镜像解）之间游走，
+    # 落到镜像一侧时被房间下界截住；水平位置仍然准确，z 的标准差保持在上限附近，提示该方向不可信
+    tag = np.array([5.0, 4.0, 1.2])
+    ekf, positions = _run_range_ekf(COPLANAR, tag, 2000, 0.1, seed=0)
+
+    np.testing.assert_allclose(positions[1000:, :2].mean(axis=0), tag[:2], atol=0.1)
+    z = positions[1000:, 2]
+    assert z.min() == ekf.lower[2]
+    assert z.max() - z.min() > 1.0
+    spread = ekf.spread()
+    assert spread[2] > 0.9 * np.sqrt(ekf.max_variance)
+    assert spread[2] > 4 * spread[:2].max()
+
+    # 同样的布局下离平面足够远的标签 z 可以恢复
+    high = np.array([5.0, 4.0, 3.0])
+    ekf, _ = _run_range_ekf(COPLANAR, high, 2000, 0.1, seed=0)
+    np.testing.assert_allclose(ekf.position, high, atol=0.15)
+
+
+@pytest.mark.parametrize('anchors', [COPLANAR, SPATIAL], ids=['coplanar', 'spatial'])
+@pytest.mark.parametrize('fine_resolution', [None, 0.1])
+def test_grid_locator_recovers_position(anchors, fine_resolution):
+    # 共面时镜像解（z = -0.2）在房间外，网格上只有一个峰
+    tag = np.array([5.3, 4.1, 1.2])
+    distances = np.linalg.norm(anchors - tag, axis=1)
+    grid = GridLocator(anchors, ROOM, resolution=0.5, fine_resolution=fine_resolution, sigma=0.3)
+
+    # argmax 的误差不超过体素半对角线
+    half_diagonal = (fine_resolution or grid.resolution) * np.sqrt(3) / 2
+    assert np.linalg.norm(grid.locate(distances) - tag) <= half_diagonal + 1e-6
+
+    sharp = GridLocator(anchors, ROOM, resolution=0.5, fine_resolution=0.05, sigma=0.05)
+    np.testing.assert_allclose(sharp.locate(distances, estimate='mean'), tag, atol=0.2)
+
+
+@pytest.mark.parametrize('anchors', [COPLANAR, SPATIAL], ids=['coplanar', 'spatial'])
+def test_grid_locator_matches_least_squares_on_noisy_ranges(anchors):
+    rng = np.random.default_rng(10)
+    tag = np.array([5.3, 4.1, 1.2])
+    grid = GridLocator(anchors, ROOM, resolution=0.5, fine_resolution=0.05)
+    for _ in range(5):
+        beacons = [(anchor, distance + rng.normal(0.0, 0.3)) for anchor, distance in _beacons(anchors, tag)]
+        distances = np.array([distance for _, distance in beacons])
+        # 目标函数相同（权重 1/(d+0.5)），网格最优点与连续最优点相差不超过一个细网格体素
+        np.testing.assert_allclose(grid.locate(distances), Position3D.least_squares_3d(beacons), atol=0.05)
+
+
+def test_grid_locator_uses_subset_of_anchors():
+    tag = np.array([5.3, 4.1, 1.2])
+    indices = np.array([4, 0, 2, 3])
+    distances = np.linalg.norm(SPATIAL[indices] - tag, axis=1)
+    grid = GridLocator(SPATIAL, ROOM, resolution=0.5, fine_resolution=0.1)
+    subset = GridLocator(SPATIAL[indices], ROOM, resolution=0.5, fine_resolution=0.1)
+
+    np.testing.assert_allclose(grid.locate(distances, indices), subset.locate(distances))
+    # 距离张量为 float32
+    np.testing.assert_allclose(grid.log_likelihood(distances, indices), subset.log_likelihood(distances), rtol=1e-5)
+    assert grid.locate([], []) is None
+    with pytest.raises(ValueError):
+        grid.locate(distances, indices, estimate='median')
+
+
+@pytest.mark.parametrize('resolution, fine_resolution', [(0.0, None), (0.5, 0.5), (0.5, 0.0)])
+def test_grid_locator_rejects_invalid_resolution(resolution, fine_resolution):
+    with pytest.raises(ValueError):
+        GridLocator(SPATIAL, ROOM, resolution=resolution, fine_resolution=fine_resolution)
+
+
+@pytest.mark.parametrize('anchors', [COPLANAR, SPATIAL], ids=['coplanar', 'spatial'])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_particle_filter_converges_from_uniform_prior(anchors, seed):
+    rng = np.random.default_rng(seed)
+    tag = np.array([5.3, 4.1, 1.2])
+    tracker = ParticleFilter3D(anchors, ROOM, range_sigma=0.3, process_noise=0.1, seed=seed)
+    assert tracker.predict() is None
+    initial_spread = tracker.spread()
+
+    # 每收到一个 beacon 的距离更新一次
+    for step in range(300):
+        tracker.propagate(0.1)
+        index = step % len(anchors)
+        tracker.update_range(index, np.linalg.norm(anchors[index] - tag) + rng.normal(0.0, 0.3))
+
+    np.testing.assert_allclose(tracker.predict()[:2], tag[:2], atol=0.2)
+    # 共面 beacon 对 z 的约束较弱
+    assert abs(tracker.predict()[2] - tag[2]) < (0.5 if anchors is COPLANAR else 0.2)
+    assert (tracker.spread() < initial_spread / 2).all()
+    assert ((tracker.particles >= tracker.lower) & (tracker.particles <= tracker.upper)).all()
+    assert tracker.weights.sum() == pytest.approx(1.0)
+
+
+def test_particle_filter_follows_moving_target():
+    rng = np.random.default_rng(1)
+    tracker = ParticleFilter3D(SPATIAL, ROOM, range_sigma=0.3, process_noise=0.5, seed=1)
+    errors = []
+    for step in range(600):
+        truth = np.array([3.0 + 0.15 * step * 0.1, 4.1, 1.2])
+        tracker.propagate(0.1)
+        # 批量更新：一次使用全部 beacon 的距离
+        tracker.update(np.linalg.norm(SPATIAL - truth, axis=1) + rng.normal(0.0, 0.3, len(SPATIAL)))
+        if step >= 200:
+            errors.append(tracker.predict() - truth)
+
+    assert np.sqrt(np.mean(np.square(errors))) < 0.2
+    assert abs(np.mean(np.array(errors)[:, 0])) < 0.15
+
+
+def test_particle_filter_initialize_around_position():
+    tracker = ParticleFilter3D(SPATIAL, ROOM, num_particles=2000, seed=3)
+    tracker.initialize([5.0, 4.0, 0.2], spread=0.5)
+    np.testing.assert_allclose(tracker.predict(), [5.0, 4.0, 0.2])
+    # 靠近地面的粒子被限制在房间内
+    assert tracker.particles[:, 2].min() == 0.0
+    np.testing.assert_allclose(tracker.spread()[:2], 0.5, atol=0.05)
+    with pytest.raises(ValueError):
+        ParticleFilter3D(SPATIAL, ROOM, num_particles=0)
+
+
+# 5 个同一高度的 beacon（共面时最小子集为 3 个）
+COPLANAR_5 = np.vstack([COPLANAR, [[7.5, 5.0, 0.5]]])
+
+
+@pytest.mark.parametrize('anchors', [MIXED, COPLANAR_5], ids=['mixed', 'coplanar'])
+def test_ransac_rejects_injected_outlier(anchors):
+    rng = np.random.default_rng(12)
+    tag = np.array([5.3, 4.1, 1.2])
+    for outlier in range(len(anchors)):
+        beacons = [(anchor, distance + rng.normal(0.0, 0.05)) for anchor, distance in _beacons(anchors, tag)]
+        # 多径：RSSI 偏高，距离偏小
+        beacons[outlier] = (beacons[outlier][0], beacons[outlier][1] * 0.4)
+
+        selection = Position3D.ransac_filter(beacons, return_result=True, time_budget=1.0, seed=0)
+        expected = np.ones(len(anchors), dtype=bool)
+        expected[outlier] = False
+        np.testing.assert_array_equal(selection.inliers, expected)
+
+        filtered, keep = Position3D.ransac_filter(beacons, return_mask=True, time_budget=1.0, seed=0)
+        assert keep == expected.tolist()
+        # 共面时 z 可观测性弱，只比较水平误差
+        robust = np.linalg.norm(Position3D.least_squares_3d(filtered)[:2] - tag[:2])
+        naive = np.linalg.norm(Position3D.least_squares_3d(beacons)[:2] - tag[:2])
+        assert robust < 0.2
+        assert naive > 3 * robust
+
+
+def test_ransac_keeps_all_without_redundancy_and_drops_invalid_ranges():
+    tag = np.array([5.3, 4.1, 1.2])
+    beacons = _beacons(SPATIAL[:4], tag)
+    selection = Position3D.ransac_filter(beacons, return_result=True)
+    assert selection.inliers.all() and selection.hypotheses == 0 and selection.position is None
+
+    beacons = _beacons(SPATIAL, tag) + [(np.zeros(3), 0.0), (np.ones(3), np.nan), (np.ones(3), 80.0)]
+    _, keep = Position3D.ransac_filter(beacons, return_mask=True, time_budget=1.0)
+    assert keep == [True] * len(SPATIAL) + [False] * 3
@@ -0,0 +1,72 @@
+"""抓包回放端到端测试：以尽可能快的速度回放录制的会话并经过 main.py 的定位流程"""
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from advertisement_source import create_source
+from main import IBeaconPositioningSystem
+
+CONFIG_PATH = Path(__file__).resolve().parent.parent / 'beacon_config.json'
+
+with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+    BEACON_CONFIG = json.load(f)
+
+
+async def _record_session(path, duration=10.0):
+    """用合成数据源录制一段抓包文件，返回录制的广播数"""
+    packets = []
+    source = create_source({
+        'type': 'synthetic',
+        'beacons': BEACON_CONFIG['beacons'],
+        'position': [7.0, 5.0, 1.2],
+        'speed': 0,
+        'duration': duration,
+        'seed': 7,
+        'record': str(path)
+    }, lambda device, advertisement: packets.append(advertisement))
+    await source.start()
+    while not source.finished:
+        await asyncio.sleep(0)
+    await source.close()
+    return len(packets)
+
+
+@pytest.mark.parametrize('adaptive', [True, False])
+def test_fast_replay_spreads_session_over_scan_windows(tmp_path, adaptive):
+    capture = tmp_path / 'session.jsonl'
+    assert asyncio.run(_record_session(capture)) > 300
+
+    config = dict(BEACON_CONFIG, source={'type': 'replay', 'path': str(capture), 'speed': 0})
+    if not adaptive:
+        config['adaptive_scan'] = None
+    config_file = tmp_path / 'config.json'
+    config_file.write_text(json.dumps(config), encoding='utf-8')
+
+    system = IBeaconPositioningSystem(str(config_file))
+    scans = []
+    fixes = []
+    process = system._process_scan_results
+    update = system._update_position
+
+    def record_scan(beacons):
+        scans.append(len(beacons))
+        process(beacons)
+
+    def record_fix(raw_position, *args, **kwargs):
+        if raw_position is not None:
+            fixes.append(raw_position)
+        update(raw_position, *args, **kwargs)
+
+    system._process_scan_results = record_scan
+    system._update_position = record_fix
+    try:
+        asyncio.run(asyncio.wait_for(system.run(), timeout=30))
+    finally:
+        system.visualizer.close()
+
+    assert len(scans) >= 5
+    # 最后一个窗口可能只有回放结束前的少量数据
+    assert all(count == len(BEACON_CONFIG['beacons']) for count in scans[:-1])
+    assert len(fixes) >= 5